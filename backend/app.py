@@ -1,8 +1,40 @@
+import logging
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from backend.routers import main
+from backend.routers import crawl, jobs, main, metrics, status
+from backend.services import driver_pool, fetcher, parse, results, workers
+from backend.services import jobs as job_queue
+from backend.services.resources import get_resources
 
-app = FastAPI()
+# Levelled logging for the services; LOG_LEVEL=DEBUG also logs payload sizes and LLM responses.
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+
+# Shared resources, created once at startup (in this order) rather than at import or on the
+# first request, and released in reverse order on shutdown.
+resources = get_resources()
+resources.add("user_agents", fetcher.load_user_agents)
+resources.add("http_client", fetcher.open_client, fetcher.close_client)
+# Without GROQ_API_KEY the app still starts; parsing fails with a clear error until it is set.
+resources.add("llm_client", parse.get_model, required=False)
+resources.add("encoder", parse.get_encoding, required=False)
+resources.add("driver_pool", driver_pool.start_pool, driver_pool.shutdown_pool)
+# Spawn the CPU worker processes (if CPU_WORKERS is set) before the first request needs them
+resources.add("cpu_pool", workers.get_cpu_pool, workers.shutdown_cpu_pool)
+resources.add("output_modules", results.load_output_modules, background=True, required=False)
+resources.add("job_workers", job_queue.start_workers, job_queue.stop_workers)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await resources.start()
+    yield
+    await resources.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS Configuration
 app.add_middleware(
@@ -18,6 +50,10 @@ app.add_middleware(
 
 # Include routers
 app.include_router(main.router)
+app.include_router(status.router)
+app.include_router(jobs.router)
+app.include_router(metrics.router)
+app.include_router(crawl.router)
 
 @app.get("/")
 def read_root():
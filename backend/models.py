@@ -1,13 +1,30 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from typing import Literal
 
 class ScrapeRequest(BaseModel):
     urls: List[str]
     parse_description: str
     output_format: Literal["csv", "json", "excel", "xml"]  # Validate output format
+    dedup_columns: Optional[List[str]] = None  # Columns identifying a row for duplicate removal (default: the whole row)
 
 class ScrapeResponse(BaseModel):
     status: str
     data: str  # Processed data in the requested format
-    message: str
\ No newline at end of file
+    message: str
+    usage: Optional[dict] = None  # LLM calls and token usage of this request
+    trace: Optional[dict] = None  # Per-stage timing of this request, when asked for with ?trace=true
+
+class CrawlRequest(BaseModel):
+    seeds: List[str]  # Start URLs of the crawl
+    parse_description: str
+    output_format: Literal["csv", "json", "excel", "xml"]
+    link_pattern: Optional[str] = None  # Regex of the links to follow besides pagination (e.g. "/product/")
+    follow_pagination: bool = True  # Follow rel="next" and "Next" links (they don't count as a depth level)
+    max_depth: Optional[int] = None  # Link hops from the seeds (default CRAWL_MAX_DEPTH)
+    max_pages: Optional[int] = None  # Pages crawled in total (default CRAWL_MAX_PAGES, capped by CRAWL_PAGE_LIMIT)
+    same_domain: bool = True  # Only follow links on the seeds' hosts
+    dedup_columns: Optional[List[str]] = None
+
+class CrawlResponse(ScrapeResponse):
+    pages: List[dict] = []  # url, depth, status and rows of every page crawled, in crawl order
@@ -0,0 +1,73 @@
+from fastapi import APIRouter, HTTPException
+from backend.models import CrawlRequest, CrawlResponse
+from backend.routers.main import build_output, output_response, result_message
+from backend.services.crawler import CRAWL_MAX_DEPTH, CRAWL_MAX_PAGES, crawl
+from backend.services.llm_dispatcher import TokenUsage
+from backend.services.metrics import finish_trace, get_metrics, start_trace
+from backend.services.results import SpilledOutput
+import asyncio
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.post("/crawl/", response_model=CrawlResponse, response_model_exclude_none=True)
+async def crawl_and_parse(request: CrawlRequest, trace: bool = False):
+    """
+    Crawl from the seed URLs (pagination, and links matching link_pattern up to max_depth,
+    at most max_pages pages) and scrape & parse every page crawled, like /scrape_and_parse/.
+    The response lists the pages crawled with their status and row count.
+    """
+    request_trace = start_trace(f"crawl of {len(request.seeds)} seed(s)")
+    get_metrics().inc("scraper_requests_total", endpoint="crawl")
+    try:
+        logger.info(f"Received crawl request: {request}")
+        if not request.seeds:
+            raise HTTPException(status_code=400, detail="At least one seed URL is required.")
+
+        usage = TokenUsage()
+        pages, tables = await crawl(
+            request.seeds,
+            request.parse_description,
+            link_pattern=request.link_pattern,
+            follow_pagination=request.follow_pagination,
+            max_depth=CRAWL_MAX_DEPTH if request.max_depth is None else request.max_depth,
+            max_pages=CRAWL_MAX_PAGES if request.max_pages is None else request.max_pages,
+            same_domain=request.same_domain,
+            usage=usage,
+        )
+        all_tables = [table for table in tables if table is not None]
+        if usage.failed_chunks:
+            logger.warning(f"{usage.failed_chunks} chunk(s) failed after retries; their rows are missing")
+
+        output = await asyncio.to_thread(build_output, all_tables, request.output_format, request.dedup_columns, usage)
+
+        trace_output = request_trace.as_dict() if trace else None
+        if request.output_format == "excel" or isinstance(output["data"], SpilledOutput):
+            content = {
+                "status": "success",
+                **output,
+                "message": result_message(request.output_format, usage),
+                "usage": usage.as_dict(),
+                "pages": pages,
+            }
+            if trace_output is not None:
+                content["trace"] = trace_output
+            return output_response(content)
+
+        return CrawlResponse(
+            status="success",
+            data=output["data"],
+            message=result_message(request.output_format, usage),
+            usage=usage.as_dict(),
+            trace=trace_output,
+            pages=pages,
+        )
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error processing crawl request: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        finish_trace(request_trace)
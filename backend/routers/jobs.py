@@ -0,0 +1,77 @@
+from fastapi import APIRouter, HTTPException
+from backend.models import ScrapeRequest, ScrapeResponse
+from backend.routers.main import build_output, output_response
+from backend.services.jobs import get_job_store, submit
+from backend.services.results import SpilledOutput
+import asyncio
+
+router = APIRouter()
+
+async def get_job_or_404(job_id):
+    job = await asyncio.to_thread(get_job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@router.post("/jobs/")
+async def create_job(request: ScrapeRequest):
+    # Queue the scrape & parse job and return immediately with its id
+    job_id = await submit(request.model_dump())
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await get_job_or_404(job_id)
+    urls = await asyncio.to_thread(get_job_store().urls, job_id)
+    progress = {"total": len(urls)}
+    for entry in urls:
+        progress[entry["status"]] = progress.get(entry["status"], 0) + 1
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "progress": progress,
+        "usage": job["usage"],
+        "error": job["error"],
+    }
+
+@router.get("/jobs/{job_id}/results")
+async def job_results(job_id: str):
+    # Partial results: the rows of every URL finished so far
+    job = await get_job_or_404(job_id)
+    results = []
+    for entry in await asyncio.to_thread(get_job_store().urls, job_id):
+        table = entry["table"]
+        results.append({
+            "index": entry["index"],
+            "url": entry["url"],
+            "status": entry["status"],
+            "header": table.columns if table is not None else [],
+            "rows": table.rows if table is not None else [],
+        })
+    return {"job_id": job_id, "status": job["status"], "results": results}
+
+@router.get("/jobs/{job_id}/download", response_model=ScrapeResponse)
+async def job_download(job_id: str):
+    job = await get_job_or_404(job_id)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}; results are not final yet.")
+
+    output_format = job["request"]["output_format"]
+    entries = await asyncio.to_thread(get_job_store().urls, job_id)
+    all_tables = [entry["table"] for entry in entries if entry["table"] is not None]
+    output = await asyncio.to_thread(build_output, all_tables, output_format, job["request"].get("dedup_columns"))
+    if output_format == "excel" or isinstance(output["data"], SpilledOutput):
+        return output_response(
+            {
+                "status": "success",
+                **output,
+                "message": "Excel data generated successfully." if output_format == "excel" else "Data processed successfully.",
+                "usage": job["usage"]
+            }
+        )
+    return ScrapeResponse(
+        status="success",
+        data=output["data"],
+        message="Data processed successfully.",
+        usage=job["usage"]
+    )
@@ -1,141 +1,144 @@
 from fastapi import APIRouter, HTTPException
 from backend.models import ScrapeRequest, ScrapeResponse
-from backend.services.scrape import scrape_website, extract_body_content, clean_body_content
-from backend.services.parse import parse_with_groq, clean_csv_data, split_dom_content_token_aware
-import pandas as pd
-import io
-import xml.etree.ElementTree as ET
-import xml.sax.saxutils as saxutils
+from backend.services.pipeline import run_pipeline
+from backend.services.dedup import ROW_DEDUP_ENABLED
+from backend.services.llm_dispatcher import TokenUsage
+from backend.services.metrics import count_event, finish_trace, get_metrics, stage_timer, start_trace
+from backend.services.results import OUTPUT_FORMATS, ResultTable, SpilledOutput, json_chunks, merge_and_render, output_size
+from backend.services.workers import cpu_call, offload
+import asyncio
+import json
 import logging
-import base64
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-from fastapi.responses import JSONResponse
-
-@router.post("/scrape_and_parse/", response_model=ScrapeResponse)
-async def scrape_and_parse(request: ScrapeRequest):
-    try:
-        logger.info(f"Received request: {request}")
+from fastapi.responses import JSONResponse, StreamingResponse
+
+def build_output(all_tables, output_format, dedup_columns=None, usage=None):
+    """
+    Merge the per-URL result tables (in URL order) and convert them to the requested output format.
+    With ROW_DEDUP_ENABLED, rows repeating an earlier row's dedup_columns (or the whole row)
+    are removed, and counted in usage if given.
+    Large results are merged and rendered in a CPU worker process when there is a pool.
+    Returns a dict with "data" (and "preview" for Excel); "data" is a SpilledOutput
+    for results of RESULT_SPILL_ROWS rows or more (send it with output_response).
+    """
+    if not all_tables:
+        raise HTTPException(
+            status_code=400,
+            detail="No valid data extracted from provided URLs."
+        )
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(
+            status_code=400, detail="Invalid output format."
+        )
 
-        # Validate output format
-        if request.output_format not in ["csv", "json", "excel", "xml"]:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid output format. Allowed values: csv, json, excel, xml."
+    def count_removed(removed):
+        if removed:
+            logger.info(f"Removed {removed} duplicate row(s)")
+            count_event("rows_deduplicated", removed)
+            if usage is not None:
+                usage.duplicate_rows += removed
+
+    if offload(rows=sum(url_table.row_count for url_table in all_tables)):
+        # 2-3. Merge and convert in one hand-off: only the rows and the output cross processes
+        with stage_timer("merge") as span:
+            output, span["rows"], removed = cpu_call(
+                merge_and_render, [url_table.to_records() for url_table in all_tables],
+                output_format, dedup_columns, ROW_DEDUP_ENABLED,
             )
-
-        all_csvs = []
-
-        # 1. Scrape & parse each URL into CSV
-        for url in request.urls:
-            i = request.urls.index(url) + 1
-            logger.info(f"Processing URL: {url}")
-            dom_content = scrape_website(url)
-            if not dom_content:
-                logger.warning(f"Failed to scrape website: {url}")
-                continue  # Skip if scraping fails
-
-            body_content = extract_body_content(dom_content)
-            cleaned_content = clean_body_content(body_content)
-
-            dom_chunks = split_dom_content_token_aware(cleaned_content, max_tokens=500)
-            print(f"Parsing Website {i}: {url}")
-            parsed_csv = parse_with_groq(dom_chunks, request.parse_description)
-            if not parsed_csv:
-                logger.warning(f"No relevant information found for URL: {url}")
-                continue
-
-            cleaned_csv = clean_csv_data(parsed_csv)
-            if cleaned_csv.strip():
-                all_csvs.append(cleaned_csv)
-
-        if not all_csvs:
+            span["bytes"] = output_size(output["data"]) if output else 0
+        count_removed(removed)
+        if output is None:
             raise HTTPException(
                 status_code=400,
-                detail="No valid data extracted from provided URLs."
+                detail="All CSV chunks were invalid or mismatched column counts."
             )
+        return output
+
+    # 2. Append every URL's rows to a single table, matching columns by name
+    with stage_timer("merge") as span:
+        table = ResultTable()
+        for url_table in all_tables:
+            table.extend(url_table)
+        if ROW_DEDUP_ENABLED:
+            count_removed(table.drop_duplicate_rows(dedup_columns))
+        span["rows"] = table.row_count
+
+    if table.row_count == 0:
+        raise HTTPException(
+            status_code=400,
+            detail="All CSV chunks were invalid or mismatched column counts."
+        )
 
-        # 2. Combine all CSV strings into a single DataFrame
-        master_df = None
-
-        for csv_str in all_csvs:
-            csv_str = csv_str.strip()
-            if not csv_str:
-                continue
-            try:
-                # Parse this CSV chunk into a DataFrame
-                df_chunk = pd.read_csv(io.StringIO(csv_str))
-            except pd.errors.ParserError as e:
-                logger.warning(f"Skipping invalid CSV chunk due to parsing error: {e}")
-                continue
-
-            # If this is the first valid DataFrame, store it as master
-            if master_df is None:
-                master_df = df_chunk
-            else:
-                # Check if column counts match
-                if len(df_chunk.columns) == len(master_df.columns):
-                    # Force rename columns to match master columns
-                    df_chunk.columns = master_df.columns
-                    master_df = pd.concat([master_df, df_chunk], ignore_index=True)
-                else:
-                    logger.warning(
-                        f"Skipping chunk due to column count mismatch. "
-                        f"Expected {len(master_df.columns)}, got {len(df_chunk.columns)}"
-                    )
-
-        if master_df is None or master_df.empty:
+    # 3. Convert the unified table to the desired output format
+    with stage_timer("render") as span:
+        output = table.render(output_format)
+        span["bytes"] = output_size(output["data"])
+    return output
+
+def output_response(content):
+    """
+    JSON response for a result: a spilled "data" is streamed into the body from its
+    file rather than built into one string.
+    """
+    if isinstance(content.get("data"), SpilledOutput):
+        return StreamingResponse(json_chunks(content), media_type="application/json")
+    return JSONResponse(content=content)
+
+def result_message(output_format, usage):
+    if usage.failed_chunks:
+        return f"Data processed, but {usage.failed_chunks} chunk(s) failed after retries."
+    if output_format == "excel":
+        return "Excel data generated successfully."
+    return "Data processed successfully."
+
+@router.post("/scrape_and_parse/", response_model=ScrapeResponse, response_model_exclude_none=True)
+async def scrape_and_parse(request: ScrapeRequest, trace: bool = False):
+    """
+    With ?trace=true the response also carries the request's per-stage timing (see metrics.Trace).
+    """
+    request_trace = start_trace(f"{len(request.urls)} URL(s)")
+    get_metrics().inc("scraper_requests_total", endpoint="batch")
+    try:
+        logger.info(f"Received request: {request}")
+
+        # Validate output format
+        if request.output_format not in OUTPUT_FORMATS:
             raise HTTPException(
                 status_code=400,
-                detail="All CSV chunks were invalid or mismatched column counts."
+                detail="Invalid output format. Allowed values: csv, json, excel, xml."
             )
 
-        # 3. Convert the unified DataFrame to the desired output format
-        if request.output_format == "csv":
-            data = master_df.to_csv(index=False)
-        elif request.output_format == "json":
-            data = master_df.to_json(orient="records", indent=4)
-        elif request.output_format == "excel":
-            excel_file = io.BytesIO()
-            with pd.ExcelWriter(excel_file, engine="openpyxl") as writer:
-                master_df.to_excel(writer, index=False)
-            excel_file.seek(0)
-            encoded_excel = base64.b64encode(excel_file.getvalue()).decode("utf-8")
-            html_table = master_df.to_html(
-                index=False,
-                escape=False,
-                classes="table table-bordered table-striped"
-            )
-            return JSONResponse(
-                content={
-                    "status": "success",
-                    "data": encoded_excel,
-                    "preview": html_table,
-                    "message": "Excel data generated successfully."
-                }
-            )
-        elif request.output_format == "xml":
-            root = ET.Element("data")
-            for _, row in master_df.iterrows():
-                item = ET.SubElement(root, "item")
-                for key, value in row.items():
-                    sanitized_key = (
-                        key.replace(" ", "_").replace("(", "").replace(")", "")
-                    )
-                    sanitized_value = saxutils.escape(str(value))
-                    ET.SubElement(item, sanitized_key).text = sanitized_value
-            data = ET.tostring(root, encoding="unicode", method="xml")
-        else:
-            raise HTTPException(
-                status_code=400, detail="Invalid output format."
-            )
+        # 1. Scrape & parse every URL into CSV through the concurrent pipeline
+        usage = TokenUsage()
+        results = await run_pipeline(request.urls, request.parse_description, usage=usage)
+        all_tables = [table for table in results if table is not None]
+        if usage.failed_chunks:
+            logger.warning(f"{usage.failed_chunks} chunk(s) failed after retries; their rows are missing")
+
+        # 2-3. Merge and convert off the event loop
+        output = await asyncio.to_thread(build_output, all_tables, request.output_format, request.dedup_columns, usage)
+
+        trace_output = request_trace.as_dict() if trace else None
+        if request.output_format == "excel" or isinstance(output["data"], SpilledOutput):
+            content = {
+                "status": "success",
+                **output,
+                "message": result_message(request.output_format, usage),
+                "usage": usage.as_dict()
+            }
+            if trace_output is not None:
+                content["trace"] = trace_output
+            return output_response(content)
 
         return ScrapeResponse(
             status="success",
-            data=data,
-            message="Data processed successfully."
+            data=output["data"],
+            message=result_message(request.output_format, usage),
+            usage=usage.as_dict(),
+            trace=trace_output
         )
 
     except HTTPException as e:
@@ -143,3 +146,68 @@ async def scrape_and_parse(request: ScrapeRequest):
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        finish_trace(request_trace)
+
+@router.post("/scrape_and_parse/stream")
+async def scrape_and_parse_stream(request: ScrapeRequest, trace: bool = False):
+    """
+    Same job as /scrape_and_parse/, streamed as NDJSON (one JSON event per line):
+      - {"event": "url_started", "index", "url"}
+      - {"event": "rows", "index", "url", "header", "rows"} as soon as each chunk is parsed and cleaned
+      - {"event": "url_done", "index", "url", "status", "rows"}
+      - {"event": "result", "status", "data", "message", "usage"[, "preview"]} with the same
+        data the batch endpoint returns (where the chunks' columns are merged by name),
+        or {"event": "error", "status_code", "detail"}.
+    With ?trace=true the final event also carries the request's per-stage timing.
+    """
+    logger.info(f"Received streaming request: {request}")
+    queue = asyncio.Queue()
+    usage = TokenUsage()
+
+    async def produce():
+        request_trace = start_trace(f"{len(request.urls)} URL(s), streamed")
+        get_metrics().inc("scraper_requests_total", endpoint="stream")
+        try:
+            results = await run_pipeline(
+                request.urls, request.parse_description, usage=usage, on_event=queue.put_nowait
+            )
+            all_tables = [table for table in results if table is not None]
+            output = await asyncio.to_thread(build_output, all_tables, request.output_format, request.dedup_columns, usage)
+            final = {
+                "event": "result",
+                "status": "success",
+                **output,
+                "message": result_message(request.output_format, usage),
+                "usage": usage.as_dict(),
+            }
+        except HTTPException as e:
+            final = {"event": "error", "status_code": e.status_code, "detail": e.detail}
+        except Exception as e:
+            logger.error(f"Error processing streaming request: {str(e)}")
+            final = {"event": "error", "status_code": 500, "detail": str(e)}
+        if trace:
+            final["trace"] = request_trace.as_dict()
+        finish_trace(request_trace)
+        queue.put_nowait(final)
+        queue.put_nowait(None)
+
+    async def stream():
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                if isinstance(event.get("data"), SpilledOutput):
+                    for piece in json_chunks(event):
+                        yield piece
+                    yield "\n"
+                    continue
+                yield json.dumps(event) + "\n"
+        finally:
+            # Stop the pipeline if the client disconnects early
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -0,0 +1,38 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from backend.services.crawler import get_robots_cache
+from backend.services.driver_pool import get_pool
+from backend.services.llm_cache import get_llm_cache
+from backend.services.llm_dispatcher import get_dispatcher
+from backend.services.metrics import get_metrics, stats_exposition
+from backend.services.page_cache import get_page_cache
+from backend.services.render_detect import get_render_memory
+from backend.services.resources import get_resources
+from backend.services.selector_templates import get_template_store
+
+router = APIRouter()
+
+# Components whose stats() (the /status/* payloads) are exported as gauges.
+COMPONENTS = {
+    "driver_pool": get_pool,
+    "llm_cache": get_llm_cache,
+    "llm_dispatcher": get_dispatcher,
+    "page_cache": get_page_cache,
+    "render": get_render_memory,
+    "resources": get_resources,
+    "robots": get_robots_cache,
+    "selector_templates": get_template_store,
+}
+
+def render_metrics():
+    parts = [get_metrics().render()]
+    for component, get_component in COMPONENTS.items():
+        instance = get_component()
+        if instance is not None:
+            parts.append(stats_exposition(component, instance.stats()))
+    return "".join(parts)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Stage timings, bytes and tokens, LLM latency histograms and cache/fallback counters, for Prometheus
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
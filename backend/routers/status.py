@@ -0,0 +1,58 @@
+from fastapi import APIRouter
+from backend.services.crawler import get_robots_cache
+from backend.services.driver_pool import get_pool
+from backend.services.llm_cache import get_llm_cache
+from backend.services.llm_dispatcher import get_dispatcher
+from backend.services.page_cache import get_page_cache
+from backend.services.render_detect import get_render_memory
+from backend.services.resources import get_resources
+from backend.services.selector_templates import get_template_store
+
+router = APIRouter()
+
+# The cache and template store stats run SQLite queries (and the getters may create the
+# database), so their endpoints are plain functions: FastAPI runs them in its threadpool.
+
+@router.get("/status/driver_pool")
+async def driver_pool_status():
+    # Occupancy and lease wait times, used to size DRIVER_POOL_SIZE
+    return get_pool().stats()
+
+@router.get("/status/llm_cache")
+def llm_cache_status():
+    # Hit/miss counters of the LLM response cache
+    cache = get_llm_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+@router.get("/status/llm_dispatcher")
+async def llm_dispatcher_status():
+    # Rate budget usage, current concurrency and retry counters of the shared LLM queue
+    return get_dispatcher().stats()
+
+@router.get("/status/page_cache")
+def page_cache_status():
+    # Fresh hits, 304s and content changes seen by the page cache
+    cache = get_page_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+@router.get("/status/render")
+async def render_status():
+    # Per-domain static/browser decisions and how often Selenium was used and actually helped
+    return get_render_memory().stats()
+
+@router.get("/status/resources")
+async def resources_status():
+    # State and startup time of the shared resources started by the app's lifespan
+    return get_resources().stats()
+
+@router.get("/status/robots")
+async def robots_status():
+    # robots.txt files cached for the crawler, and the URLs they disallowed
+    robots = get_robots_cache()
+    return robots.stats() if robots is not None else {"enabled": False}
+
+@router.get("/status/selector_templates")
+def selector_templates_status():
+    # Learned templates per domain, with pages they extracted and pages sent back to the LLM
+    store = get_template_store()
+    return store.stats() if store is not None else {"enabled": False}
@@ -0,0 +1,28 @@
+"""
+Run the API in several worker processes sharing one port:
+
+    WEB_WORKERS=4 python -m backend.serve
+
+Every worker handles requests on its own event loop. The page cache, LLM cache,
+selector templates and job store are the shared SQLite files (see
+workers.connect_sqlite), the Groq rate budgets are split between the workers, and
+each background job is run by one worker. The same setup under gunicorn:
+
+    WEB_WORKERS=4 SERVER_INSTANCE_ID=$(uuidgen) gunicorn backend.app:app -k uvicorn.workers.UvicornWorker -w 4
+"""
+import os
+import uuid
+
+import uvicorn
+
+HOST = os.getenv("HOST", "127.0.0.1")
+PORT = int(os.getenv("PORT", "8000"))
+
+def main():
+    # Read by every worker process (they inherit the environment), so they agree on which jobs are theirs.
+    os.environ.setdefault("SERVER_INSTANCE_ID", uuid.uuid4().hex)
+    from backend.services.workers import WEB_WORKERS
+    uvicorn.run("backend.app:app", host=HOST, port=PORT, workers=WEB_WORKERS)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+import asyncio
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from itertools import count
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+import lxml.html
+
+from backend.services.dedup import new_chunk_deduplicator
+from backend.services.fetcher import fetch
+from backend.services.metrics import count_event, get_metrics, stage_timer
+from backend.services.pipeline import process_url
+
+logger = logging.getLogger(__name__)
+
+# Pages crawled per request when the request doesn't say, and the most a request may ask for.
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "50"))
+CRAWL_PAGE_LIMIT = int(os.getenv("CRAWL_PAGE_LIMIT", "500"))
+# Link hops followed from the seeds (pagination links don't count as a hop).
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "2"))
+# Politeness: pages of one domain fetched at the same time, and the minimum
+# seconds between two fetches of a domain (raised by a robots.txt Crawl-delay).
+CRAWL_DOMAIN_CONCURRENCY = int(os.getenv("CRAWL_DOMAIN_CONCURRENCY", "2"))
+CRAWL_DOMAIN_DELAY = float(os.getenv("CRAWL_DOMAIN_DELAY", "0.5"))
+CRAWL_RESPECT_ROBOTS = os.getenv("CRAWL_RESPECT_ROBOTS", "1") == "1"
+ROBOTS_CACHE_TTL = float(os.getenv("ROBOTS_CACHE_TTL", "3600"))
+# The user agent matched against robots.txt groups (requests themselves use the random pool).
+CRAWL_ROBOTS_AGENT = os.getenv("CRAWL_ROBOTS_AGENT", "*")
+
+# Anchors that lead to the next page of a listing, besides rel="next".
+NEXT_LINK_PATTERN = re.compile(r"^\W*(next|next page|older|older posts|more results)\W*$|^\s*[›»→>]+\s*$", re.IGNORECASE)
+
+def normalize_url(url):
+    """
+    The form of a URL used by the seen set: no fragment, lower-case scheme and
+    host, no default port, "/" for an empty path.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not (scheme == "http" and port == 80 or scheme == "https" and port == 443):
+        host = f"{host}:{port}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+def url_domain(url):
+    return urlsplit(url).netloc.lower()
+
+### LINK EXTRACTION
+
+def _is_next_link(anchor):
+    if "next" in (anchor.get("rel") or "").lower().split():
+        return True
+    label = anchor.get("aria-label") or anchor.get("title") or anchor.text_content()
+    if NEXT_LINK_PATTERN.search(label or ""):
+        return True
+    # <li class="next"><a ...>, as in most pagers
+    classes = [anchor.get("class") or ""]
+    if anchor.getparent() is not None:
+        classes.append(anchor.getparent().get("class") or "")
+    return "next" in " ".join(classes).lower().split()
+
+def extract_links(raw_html, base_url, link_pattern=None, follow_pagination=True):
+    """
+    Links of a page worth crawling, as (pagination links, pattern links) of
+    normalized absolute http(s) URLs:
+      - pagination: <link rel="next">, <a rel="next"> and "Next"-like anchors;
+      - pattern: anchors whose absolute URL matches link_pattern (a regex), if given.
+    """
+    try:
+        document = lxml.html.document_fromstring(raw_html)
+    except Exception:
+        return [], []
+    base = document.find(".//base[@href]")
+    if base is not None:
+        base_url = urljoin(base_url, base.get("href"))
+    pattern = re.compile(link_pattern) if link_pattern else None
+    pagination, matched = [], []
+
+    def absolute(href):
+        url = normalize_url(urljoin(base_url, href.strip()))
+        return url if url.startswith(("http://", "https://")) else None
+
+    if follow_pagination:
+        for link in document.xpath("//link[@href]"):
+            if "next" in (link.get("rel") or "").lower().split():
+                url = absolute(link.get("href"))
+                if url:
+                    pagination.append(url)
+    for anchor in document.xpath("//a[@href]"):
+        href = anchor.get("href")
+        if href.startswith(("#", "javascript:", "mailto:", "tel:")):
+            continue
+        url = absolute(href)
+        if url is None:
+            continue
+        if follow_pagination and _is_next_link(anchor):
+            pagination.append(url)
+        elif pattern is not None and pattern.search(url):
+            matched.append(url)
+    return list(dict.fromkeys(pagination)), list(dict.fromkeys(matched))
+
+### ROBOTS.TXT CACHE
+
+class RobotsCache:
+    """
+    Parsed robots.txt files by origin, fetched through the pooled client and kept
+    for ROBOTS_CACHE_TTL seconds. As in RFC 9309, a missing robots.txt (4xx)
+    allows everything, and a server error or unreachable host disallows everything.
+    """
+
+    def __init__(self, ttl=ROBOTS_CACHE_TTL, agent=CRAWL_ROBOTS_AGENT):
+        self.ttl = ttl
+        self.agent = agent
+        self._lock = threading.Lock()
+        # origin -> (RobotFileParser, fetched at)
+        self._entries = {}
+        # origin -> task fetching its robots.txt, so concurrent pages share one request
+        self._pending = {}
+        self._stats = {"fetches": 0, "hits": 0, "missing": 0, "errors": 0, "disallowed": 0}
+
+    def record(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    async def _load(self, origin):
+        parser = RobotFileParser(origin + "/robots.txt")
+        self.record("fetches")
+        try:
+            response = await fetch(origin + "/robots.txt")
+            parser.parse(response.text.splitlines())
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500:
+                logger.warning(f"robots.txt of {origin} failed ({e.response.status_code}); not crawling it")
+                self.record("errors")
+                parser.disallow_all = True
+            else:
+                self.record("missing")
+                parser.allow_all = True
+        except Exception as e:
+            logger.warning(f"Could not fetch robots.txt of {origin}; not crawling it: {e}")
+            self.record("errors")
+            parser.disallow_all = True
+        with self._lock:
+            self._entries[origin] = (parser, time.time())
+        return parser
+
+    async def get(self, url):
+        """
+        Return the RobotFileParser for url's origin, fetching robots.txt if needed.
+        """
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            entry = self._entries.get(origin)
+        if entry is not None and time.time() - entry[1] < self.ttl:
+            self.record("hits")
+            return entry[0]
+        loop = asyncio.get_running_loop()
+        task = self._pending.get(origin)
+        if task is None or task.get_loop() is not loop:
+            task = self._pending[origin] = asyncio.ensure_future(self._load(origin))
+            task.add_done_callback(lambda _: self._pending.pop(origin, None))
+        return await asyncio.shield(task)
+
+    async def check(self, url):
+        """
+        (whether url may be fetched, the Crawl-delay of its origin or None).
+        """
+        parser = await self.get(url)
+        allowed = parser.can_fetch(self.agent, url)
+        if not allowed:
+            self.record("disallowed")
+        return allowed, parser.crawl_delay(self.agent)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"origins": len(self._entries), **self._stats}
+
+_robots = RobotsCache() if CRAWL_RESPECT_ROBOTS else None
+
+def get_robots_cache():
+    """
+    Return the process-wide robots.txt cache, or None when CRAWL_RESPECT_ROBOTS is off.
+    """
+    return _robots
+
+### FRONTIER
+
+class Frontier:
+    """
+    URLs waiting to be crawled, queued per domain (shallowest first, then in the
+    order found, so a listing's pages come before the links found on them) and
+    handed out round-robin across domains, so one large site doesn't hold up
+    the others. A domain gets a URL only while it has fewer than `concurrency`
+    fetches in flight and its delay since the last fetch started has passed;
+    reserve() then spaces the actual fetches of the URLs handed out.
+    Every URL ever queued is in `seen`, so no page is fetched twice.
+    """
+
+    def __init__(self, concurrency=CRAWL_DOMAIN_CONCURRENCY, delay=CRAWL_DOMAIN_DELAY):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.seen = set()
+        # domain -> heap of (depth, sequence, url)
+        self._queues = {}
+        self._sequence = count()
+        self._order = deque()
+        self._active = {}
+        self._next_fetch = {}
+        self._delays = {}
+
+    def add(self, url, depth):
+        """
+        Queue url at depth unless it was seen before; returns True if it was queued.
+        """
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        domain = url_domain(url)
+        if domain not in self._queues:
+            self._queues[domain] = []
+            self._order.append(domain)
+        heapq.heappush(self._queues[domain], (depth, next(self._sequence), url))
+        return True
+
+    def set_delay(self, domain, seconds):
+        self._delays[domain] = max(self.delay, seconds or 0)
+
+    def pop(self, now):
+        """
+        The next (url, depth) whose domain may be fetched now, or None and the
+        seconds until a queued domain may be fetched (None if nothing can start
+        until a fetch in flight finishes).
+        """
+        wait = None
+        for _ in range(len(self._order)):
+            domain = self._order[0]
+            self._order.rotate(-1)
+            queue = self._queues[domain]
+            if not queue or self._active.get(domain, 0) >= self.concurrency:
+                continue
+            ready_at = self._next_fetch.get(domain, 0)
+            if ready_at > now:
+                wait = ready_at - now if wait is None else min(wait, ready_at - now)
+                continue
+            self._active[domain] = self._active.get(domain, 0) + 1
+            depth, _, url = heapq.heappop(queue)
+            return (url, depth), None
+        return None, wait
+
+    def reserve(self, domain, now):
+        """
+        Book the domain's next fetch at least its delay after the previous one,
+        and return the seconds to wait before fetching.
+        """
+        start = max(now, self._next_fetch.get(domain, 0))
+        self._next_fetch[domain] = start + self._delays.get(domain, self.delay)
+        return start - now
+
+    def release(self, domain):
+        """
+        Free a fetch slot of the domain.
+        """
+        self._active[domain] -= 1
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+### CRAWL
+
+async def crawl(seeds, parse_description, link_pattern=None, follow_pagination=True, max_depth=CRAWL_MAX_DEPTH,
+                max_pages=CRAWL_MAX_PAGES, same_domain=True, usage=None, on_event=None):
+    """
+    Crawl from the seed URLs and run every page reached through the pipeline
+    (process_url), sharing one chunk deduplicator across the pages.
+
+    A page's links are read from its raw HTML as soon as it is fetched, so the
+    crawl moves on while the page is still being parsed. Pagination links keep the
+    depth of their page; links matching link_pattern are one level deeper and are
+    followed up to max_depth. With same_domain, only links on the seeds' hosts are
+    followed. At most max_pages pages are fetched (capped by CRAWL_PAGE_LIMIT).
+
+    Returns (pages, tables): one {"url", "depth", "status", "rows"} dict per page
+    in crawl order, and the matching ResultTables (None for pages without rows).
+    """
+    max_pages = max(1, min(max_pages, CRAWL_PAGE_LIMIT))
+    robots = get_robots_cache()
+    frontier = Frontier(CRAWL_DOMAIN_CONCURRENCY, CRAWL_DOMAIN_DELAY)
+    seed_urls = [normalize_url(seed) for seed in seeds]
+    seed_domains = {url_domain(url) for url in seed_urls}
+    for url in seed_urls:
+        frontier.add(url, 0)
+    dedup = new_chunk_deduplicator()
+    pages, tables = [], []
+    tasks = set()
+    wake = asyncio.Event()
+
+    async def queue_links(page_url, depth, raw_html):
+        with stage_timer("links") as span:
+            pagination, matched = await asyncio.to_thread(
+                extract_links, raw_html, page_url, link_pattern, follow_pagination
+            )
+            span["links"] = len(pagination) + len(matched)
+        candidates = [(url, depth) for url in pagination]
+        if depth < max_depth:
+            candidates += [(url, depth + 1) for url in matched]
+        queued = sum(
+            frontier.add(url, link_depth)
+            for url, link_depth in candidates
+            if not same_domain or url_domain(url) in seed_domains
+        )
+        if queued:
+            count_event("crawl_links_queued", queued)
+        wake.set()
+
+    async def crawl_page(index, url, depth):
+        page = pages[index - 1]
+        domain = url_domain(url)
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                frontier.release(domain)
+                wake.set()
+
+        def on_html(raw_html):
+            release()
+            task = asyncio.create_task(queue_links(url, depth, raw_html))
+            tasks.add(task)
+            task.add_done_callback(done)
+
+        def on_page_event(event):
+            if event["event"] == "url_done":
+                page["status"] = event["status"]
+                page["rows"] = event["rows"]
+            if on_event is not None:
+                on_event({**event, "depth": depth})
+
+        try:
+            if robots is not None:
+                allowed, delay = await robots.check(url)
+                if not allowed:
+                    logger.info(f"robots.txt disallows {url}")
+                    count_event("robots_disallowed")
+                    page["status"] = "robots_disallowed"
+                    return None
+                frontier.set_delay(domain, delay)
+            wait = frontier.reserve(domain, time.monotonic())
+            if wait:
+                await asyncio.sleep(wait)
+            return await process_url(
+                index, url, parse_description, usage, on_page_event, dedup=dedup, on_html=on_html
+            )
+        except Exception as e:
+            logger.error(f"Error processing URL {url}: {e}")
+            get_metrics().inc("scraper_urls_total", status="error")
+            page["status"] = "error"
+            return None
+        finally:
+            release()
+
+    def done(task):
+        tasks.discard(task)
+        wake.set()
+
+    def finished(index):
+        def store(task):
+            if not task.cancelled():
+                tables[index - 1] = task.result()
+        return store
+
+    try:
+        while True:
+            wake.clear()
+            wait = None
+            while len(pages) < max_pages:
+                item, wait = frontier.pop(time.monotonic())
+                if item is None:
+                    break
+                url, depth = item
+                pages.append({"url": url, "depth": depth, "status": "queued", "rows": 0})
+                tables.append(None)
+                task = asyncio.create_task(crawl_page(len(pages), url, depth))
+                task.add_done_callback(finished(len(pages)))
+                tasks.add(task)
+                task.add_done_callback(done)
+            if not tasks and (len(pages) >= max_pages or not len(frontier)):
+                break
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        for task in list(tasks):
+            task.cancel()
+
+    if len(frontier):
+        logger.info(f"Crawl stopped at {max_pages} pages with {len(frontier)} URL(s) left in the frontier")
+    logger.info(f"Crawled {len(pages)} page(s) from {len(seeds)} seed(s)")
+    return pages, tables
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import re
+import threading
+from array import array
+from typing import NamedTuple, Optional
+
+CHUNK_DEDUP_ENABLED = os.getenv("CHUNK_DEDUP_ENABLED", "1") == "1"
+# Chunks whose SimHash fingerprints differ in at most this many of 64 bits are near-duplicates.
+# Must stay below SIMHASH_BANDS for the band index to find every match.
+CHUNK_DEDUP_MAX_DISTANCE = int(os.getenv("CHUNK_DEDUP_MAX_DISTANCE", "3"))
+# A near-duplicate is only skipped if it has at most this many shingles (word triples) the
+# earlier chunk lacks: enough for a changed page number or date, less than one more record.
+CHUNK_DEDUP_MAX_NEW_SHINGLES = int(os.getenv("CHUNK_DEDUP_MAX_NEW_SHINGLES", "4"))
+# Chunks with fewer words are only skipped when identical: SimHash of a few words is too coarse.
+CHUNK_DEDUP_MIN_WORDS = int(os.getenv("CHUNK_DEDUP_MIN_WORDS", "20"))
+ROW_DEDUP_ENABLED = os.getenv("ROW_DEDUP_ENABLED", "1") == "1"
+
+SIMHASH_BITS = 64
+# Fingerprints are split into this many bands; two fingerprints within
+# CHUNK_DEDUP_MAX_DISTANCE bits of each other share at least one band exactly.
+SIMHASH_BANDS = 4
+SHINGLE_WORDS = 3
+
+WORD_PATTERN = re.compile(r"\w+")
+
+def _hash64(text):
+    # Python's hash() is salted per process; fingerprints must be stable across workers.
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+def chunk_words(text):
+    """
+    Lower-cased words of a chunk, ignoring markup so the same text in different tags matches.
+    """
+    return WORD_PATTERN.findall(re.sub(r"<[^>]+>", " ", text).lower())
+
+def shingle_hashes(words):
+    """
+    Hashes of the distinct shingles (SHINGLE_WORDS consecutive words) of a word list.
+    """
+    if len(words) < SHINGLE_WORDS:
+        return {_hash64(" ".join(words))}
+    return {_hash64(" ".join(words[i:i + SHINGLE_WORDS])) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def simhash(hashes):
+    """
+    64-bit SimHash of a set of shingle hashes. Each distinct shingle counts once: in a
+    listing, the shingles repeated by every record ("99 in stock") would otherwise
+    outweigh the values and make all pages look alike.
+    """
+    weights = [0] * SIMHASH_BITS
+    for value in hashes:
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+class ChunkPrint(NamedTuple):
+    # Hash of the chunk's words, for exact duplicates.
+    exact: int
+    # Shingle hashes and SimHash, or None for chunks shorter than CHUNK_DEDUP_MIN_WORDS.
+    hashes: Optional[set]
+    simhash: Optional[int]
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+class ChunkDeduplicator:
+    """
+    Remembers the chunks sent to the LLM within one request or job, and flags
+    chunks that are identical or nearly identical (by SimHash) to one sent for an
+    earlier page: repeated sidebars, "featured" carousels, and pages served at
+    several URLs. Chunks are only compared with other pages' chunks, never with
+    their own page's.
+
+    Fingerprints are indexed by band, so a lookup only compares against the
+    fingerprints sharing a band instead of every chunk seen so far. A SimHash match
+    is then confirmed on the shingles themselves: a chunk that is mostly a repeated
+    sidebar but also holds a few new records is similar by SimHash, yet must still
+    be sent. Thread-safe: chunking runs in worker threads.
+    """
+
+    def __init__(self, max_distance=CHUNK_DEDUP_MAX_DISTANCE, max_new_shingles=CHUNK_DEDUP_MAX_NEW_SHINGLES,
+                 min_words=CHUNK_DEDUP_MIN_WORDS):
+        if max_distance >= SIMHASH_BANDS:
+            raise ValueError(f"max_distance must be smaller than {SIMHASH_BANDS}")
+        self.max_distance = max_distance
+        self.max_new_shingles = max_new_shingles
+        self.min_words = min_words
+        self._lock = threading.Lock()
+        self._exact = set()
+        self._bands = [{} for _ in range(SIMHASH_BANDS)]
+        # Fingerprint and shingle hashes (a compact array) of every chunk kept.
+        self._chunks = []
+        self.checked = 0
+        self.duplicates = 0
+
+    def _band_keys(self, fingerprint):
+        width = SIMHASH_BITS // SIMHASH_BANDS
+        mask = (1 << width) - 1
+        return [fingerprint >> (band * width) & mask for band in range(SIMHASH_BANDS)]
+
+    def fingerprint(self, chunk):
+        """
+        The ChunkPrint of a chunk, for is_duplicate and remember.
+        """
+        words = chunk_words(chunk)
+        hashes = shingle_hashes(words) if len(words) >= self.min_words else None
+        return ChunkPrint(_hash64(" ".join(words)), hashes, simhash(hashes) if hashes else None)
+
+    def is_duplicate(self, chunk_print):
+        """
+        True if the chunk duplicates one remembered so far. Nothing is remembered here:
+        the caller remembers a page's chunks once the whole page is checked, so records
+        of one page that look alike (the same card in another size) never hide each other.
+        """
+        with self._lock:
+            self.checked += 1
+            duplicate = chunk_print.exact in self._exact
+            if not duplicate and chunk_print.simhash is not None:
+                keys = self._band_keys(chunk_print.simhash)
+                candidates = {index for band, key in enumerate(keys) for index in self._bands[band].get(key, ())}
+                duplicate = any(
+                    hamming_distance(chunk_print.simhash, self._chunks[index][0]) <= self.max_distance
+                    and len(chunk_print.hashes.difference(self._chunks[index][1])) <= self.max_new_shingles
+                    for index in candidates
+                )
+            if duplicate:
+                self.duplicates += 1
+            return duplicate
+
+    def remember(self, chunk_prints):
+        """
+        Remember chunks sent to the LLM, so later pages skip their duplicates.
+        """
+        with self._lock:
+            for chunk_print in chunk_prints:
+                if chunk_print.exact in self._exact:
+                    continue
+                self._exact.add(chunk_print.exact)
+                if chunk_print.simhash is not None:
+                    index = len(self._chunks)
+                    self._chunks.append((chunk_print.simhash, array("Q", chunk_print.hashes)))
+                    for band, key in enumerate(self._band_keys(chunk_print.simhash)):
+                        self._bands[band].setdefault(key, []).append(index)
+
+    def filter(self, chunks):
+        """
+        Split the chunks of one page into (new chunks, duplicates of earlier pages),
+        then remember the new ones.
+        """
+        kept, duplicates, prints = [], [], []
+        for chunk in chunks:
+            chunk_print = self.fingerprint(chunk)
+            if self.is_duplicate(chunk_print):
+                duplicates.append(chunk)
+            else:
+                kept.append(chunk)
+                prints.append(chunk_print)
+        self.remember(prints)
+        return kept, duplicates
+
+def new_chunk_deduplicator():
+    """
+    A deduplicator for one request or job, or None when CHUNK_DEDUP_ENABLED is off.
+    """
+    return ChunkDeduplicator() if CHUNK_DEDUP_ENABLED else None
@@ -0,0 +1,280 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from backend.services.fetcher import random_user_agent
+
+logger = logging.getLogger(__name__)
+
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", "2"))
+# Number of drivers started at app startup; the rest are started on first use.
+DRIVER_POOL_WARM = int(os.getenv("DRIVER_POOL_WARM", "0"))
+# Recycle a driver after this many pages to keep Chrome's memory in check.
+DRIVER_MAX_PAGES = int(os.getenv("DRIVER_MAX_PAGES", "50"))
+DRIVER_LEASE_TIMEOUT = float(os.getenv("DRIVER_LEASE_TIMEOUT", "120"))
+
+def build_chrome_options():
+    """
+    Headless Chrome options tuned for fast page loads.
+    """
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    # Run in headless mode
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--disable-infobars")
+    chrome_options.add_argument("--disable-plugins-discovery")
+    # Disable images to speed up loading
+    chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    # Set the page load strategy to "eager" so Selenium returns once the DOM is ready
+    chrome_options.page_load_strategy = "eager"
+    # Set a random user agent
+    chrome_options.add_argument(f'user-agent={random_user_agent()}')
+    return chrome_options
+
+# Messages of a plain WebDriverException raised because the browser or its session is gone.
+DEAD_SESSION_MESSAGES = (
+    "invalid session id", "session deleted", "chrome not reachable", "disconnected", "tab crashed",
+)
+
+def session_lost(error):
+    """
+    Whether an error raised while a driver was leased means its browser session is
+    gone (the driver must be quit), rather than a page-level failure such as a
+    page-load timeout, after which the driver is reset and reused.
+    """
+    from selenium.common.exceptions import InvalidSessionIdException, WebDriverException
+
+    if isinstance(error, InvalidSessionIdException):
+        return True
+    if isinstance(error, WebDriverException):
+        # Subclasses (TimeoutException, NoSuchElementException...) are about the page.
+        if type(error) is not WebDriverException:
+            return False
+        message = (error.msg or "").lower()
+        return any(marker in message for marker in DEAD_SESSION_MESSAGES)
+    # chromedriver itself stopped answering
+    return isinstance(error, ConnectionError) or type(error).__name__ in ("MaxRetryError", "ProtocolError")
+
+class DriverPool:
+    """
+    A fixed-size pool of headless Chrome drivers that are leased per page.
+    Drivers are started lazily, reset between leases (including after a page
+    error such as a load timeout) and recycled after max_pages pages or when
+    their browser session is lost.
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_pages=DRIVER_MAX_PAGES,
+                 lease_timeout=DRIVER_LEASE_TIMEOUT, driver_factory=None):
+        self.size = size
+        self.max_pages = max_pages
+        self.lease_timeout = lease_timeout
+        self._driver_factory = driver_factory or self._create_chrome
+        self._service_path = None
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._pages = {}
+        self._closed = False
+        self._stats = {
+            "leases": 0,
+            "waiting": 0,
+            "in_use": 0,
+            "created": 0,
+            "recycled": 0,
+            "crashed": 0,
+            # Errors raised during a lease that left the browser usable (it was reset and reused).
+            "page_errors": 0,
+            "lease_timeouts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def _create_chrome(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+
+        if self._service_path is None:
+            # Resolve the chromedriver binary once instead of on every page
+            from webdriver_manager.chrome import ChromeDriverManager
+            self._service_path = ChromeDriverManager().install()
+        driver = webdriver.Chrome(service=Service(self._service_path), options=build_chrome_options())
+        # Use implicit wait to avoid fixed sleep times
+        driver.implicitly_wait(10)
+        driver.set_page_load_timeout(30)
+        return driver
+
+    def _new_driver(self):
+        driver = self._driver_factory()
+        with self._lock:
+            self._pages[id(driver)] = 0
+            self._stats["created"] += 1
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Error quitting driver: {e}")
+
+    def _reset(self, driver):
+        """
+        Clear cookies and storage and park the driver on about:blank.
+        """
+        driver.delete_all_cookies()
+        try:
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except Exception:
+            # Storage is not accessible on some pages (e.g. data: or error pages)
+            pass
+        driver.get("about:blank")
+
+    def warm(self, count):
+        """
+        Start up to count drivers ahead of time so the first requests don't pay for Chrome startup.
+        """
+        count = min(count, self.size)
+        for _ in range(count - len(self._idle)):
+            try:
+                driver = self._new_driver()
+            except Exception as e:
+                logger.warning(f"Could not start warm driver: {e}")
+                return
+            with self._lock:
+                self._idle.append(driver)
+
+    @contextmanager
+    def lease(self):
+        """
+        Lease a driver for one page. Blocks until a driver is free or lease_timeout expires.
+        """
+        if self._closed:
+            raise RuntimeError("Driver pool is closed")
+
+        start = time.monotonic()
+        with self._lock:
+            self._stats["waiting"] += 1
+        acquired = self._slots.acquire(timeout=self.lease_timeout)
+        waited = time.monotonic() - start
+        with self._lock:
+            self._stats["waiting"] -= 1
+            if not acquired:
+                self._stats["lease_timeouts"] += 1
+            else:
+                self._stats["leases"] += 1
+                self._stats["in_use"] += 1
+                self._stats["wait_seconds_total"] += waited
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        if not acquired:
+            raise TimeoutError(f"No browser available after {self.lease_timeout}s")
+
+        driver = None
+        healthy = False
+        try:
+            with self._lock:
+                driver = self._idle.pop() if self._idle else None
+            if driver is None:
+                driver = self._new_driver()
+            yield driver
+            healthy = True
+        except Exception as e:
+            healthy = not session_lost(e)
+            if healthy:
+                with self._lock:
+                    self._stats["page_errors"] += 1
+            raise
+        finally:
+            if driver is not None:
+                self._release(driver, healthy)
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def _release(self, driver, healthy):
+        with self._lock:
+            pages = self._pages.get(id(driver), 0) + 1
+            self._pages[id(driver)] = pages
+        if not healthy:
+            with self._lock:
+                self._stats["crashed"] += 1
+            self._discard(driver)
+            return
+        if pages >= self.max_pages or self._closed:
+            with self._lock:
+                self._stats["recycled"] += 1
+            self._discard(driver)
+            return
+        try:
+            self._reset(driver)
+        except Exception as e:
+            logger.warning(f"Driver reset failed, recycling it: {e}")
+            with self._lock:
+                self._stats["crashed"] += 1
+            self._discard(driver)
+            return
+        with self._lock:
+            self._idle.append(driver)
+
+    def close(self):
+        """
+        Quit every idle driver. Leased drivers are quit when they are returned.
+        """
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            self._discard(driver)
+
+    def stats(self):
+        """
+        Occupancy and wait-time metrics for sizing the pool.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self.size
+            stats["idle"] = len(self._idle)
+            stats["started"] = len(self._pages)
+        leases = stats["leases"]
+        stats["wait_seconds_avg"] = stats["wait_seconds_total"] / leases if leases else 0.0
+        stats["occupancy"] = stats["in_use"] / self.size if self.size else 0.0
+        return stats
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    Return the process-wide driver pool, creating it on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = DriverPool()
+        return _pool
+
+def start_pool():
+    """
+    Create the pool at app startup and warm DRIVER_POOL_WARM drivers.
+    """
+    pool = get_pool()
+    if DRIVER_POOL_WARM:
+        pool.warm(DRIVER_POOL_WARM)
+    return pool
+
+def shutdown_pool():
+    """
+    Close the pool on app shutdown.
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
@@ -0,0 +1,202 @@
+import asyncio
+import codecs
+import logging
+import os
+import random
+import weakref
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from backend.services.metrics import count_event
+
+logger = logging.getLogger(__name__)
+
+# Connection pool settings, shared by every request served by this process.
+MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "100"))
+MAX_CONNECTIONS_PER_HOST = int(os.getenv("FETCH_MAX_CONNECTIONS_PER_HOST", "6"))
+KEEPALIVE_EXPIRY = float(os.getenv("FETCH_KEEPALIVE_EXPIRY", "30"))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "15"))
+USER_AGENT_POOL_SIZE = int(os.getenv("USER_AGENT_POOL_SIZE", "50"))
+# Bodies are read up to this many (decompressed) bytes and the rest is dropped, so one
+# multi-megabyte page can't blow up the process's memory (0 for no limit).
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(10 * 1024 * 1024)))
+# Bytes decoded at a time while a body is streamed in.
+FETCH_READ_CHUNK = 64 * 1024
+
+_user_agents = []
+_client = None
+_client_loop = None
+_host_limits = weakref.WeakKeyDictionary()
+
+### USER-AGENT POOL
+
+def load_user_agents(size=USER_AGENT_POOL_SIZE):
+    """
+    Load a pool of random user agents once, so requests don't pay for fake_useragent's data each time.
+    """
+    global _user_agents
+    if _user_agents:
+        return _user_agents
+    try:
+        from fake_useragent import UserAgent
+        ua = UserAgent()
+        _user_agents = list({ua.random for _ in range(size)})
+    except Exception as e:
+        logger.warning(f"Could not load user agents, using a default one: {e}")
+        _user_agents = [
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+            "(KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+        ]
+    return _user_agents
+
+def random_user_agent():
+    """
+    Pick a user agent from the pool, loading the pool on first use.
+    """
+    return random.choice(load_user_agents())
+
+### POOLED ASYNC CLIENT
+
+def get_client():
+    """
+    Return the process-wide AsyncClient, creating it on the running event loop if needed.
+    Connections are kept alive and reused across requests; gzip, deflate and
+    brotli (when the brotli package is installed) responses are decoded by httpx.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=FETCH_TIMEOUT,
+            follow_redirects=True,
+        )
+        _client_loop = loop
+    return _client
+
+async def open_client():
+    """
+    Create the shared client on the app's event loop at startup.
+    """
+    return get_client()
+
+async def close_client():
+    """
+    Close the shared client and its pooled connections.
+    """
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+
+def host_limit(url):
+    """
+    Return the semaphore limiting concurrent connections to the URL's host.
+    """
+    loop = asyncio.get_running_loop()
+    limits = _host_limits.setdefault(loop, {})
+    host = urlsplit(url).netloc.lower()
+    if host not in limits:
+        limits[host] = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+    return limits[host]
+
+class FetchResponse(NamedTuple):
+    status_code: int
+    headers: httpx.Headers
+    text: str
+    # True when the body was cut at max_bytes.
+    truncated: bool
+
+async def read_text(response, max_bytes=FETCH_MAX_BYTES):
+    """
+    Read a streamed response's body and decode it as it arrives, stopping after
+    max_bytes. Returns (text, truncated). Only decoded text is accumulated: each
+    raw chunk is dropped once decoded, instead of holding the whole body twice.
+    """
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    parts = []
+    size = 0
+    truncated = False
+    async for chunk in response.aiter_bytes(FETCH_READ_CHUNK):
+        if max_bytes and size + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - size]
+            truncated = True
+        size += len(chunk)
+        parts.append(decoder.decode(chunk))
+        if truncated:
+            break
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts), truncated
+
+async def fetch(url, headers=None, max_bytes=FETCH_MAX_BYTES):
+    """
+    GET a URL through the shared pool and return a FetchResponse with the decoded body,
+    read up to max_bytes (see read_text).
+    Raises httpx.HTTPStatusError for error status codes; a 304 (the answer to
+    a conditional request) is returned as is.
+    """
+    request_headers = {"User-Agent": random_user_agent()}
+    if headers:
+        request_headers.update(headers)
+    async with host_limit(url):
+        async with get_client().stream("GET", url, headers=request_headers) as response:
+            if response.status_code != 304:
+                response.raise_for_status()
+            text, truncated = await read_text(response, max_bytes)
+    if truncated:
+        logger.warning(f"Body of {url} is over {max_bytes} bytes; only the first {max_bytes} are used")
+        count_event("fetch_truncated")
+    return FetchResponse(response.status_code, response.headers, text, truncated)
+
+### PAGE CACHE
+
+class FetchedPage(NamedTuple):
+    html: str
+    # Content hash of the page when it went through the page cache.
+    content_hash: Optional[str]
+    # True when the page is known to be the same as the last time it was fetched.
+    unchanged: bool
+
+async def fetch_page(url, cache=None):
+    """
+    Fetch a page through the page cache (see page_cache.PageCache):
+      - within the freshness window the cached body is returned without a request;
+      - otherwise the request carries If-None-Match / If-Modified-Since, and a 304
+        returns the cached body;
+      - a 200 is stored, and is marked unchanged if its content hash didn't change.
+    Returns a FetchedPage; raises the httpx error if the request failed
+    (callers decide whether a browser could do better).
+    """
+    if cache is None:
+        response = await fetch(url)
+        return FetchedPage(response.text, None, False)
+
+    entry = await asyncio.to_thread(cache.get, url)
+    if cache.is_fresh(entry):
+        cache.record("fresh_hits")
+        return FetchedPage(entry["body"], entry["content_hash"], True)
+
+    response = await fetch(url, cache.conditional_headers(entry))
+    if response.status_code == 304:
+        if entry is None:
+            # Only possible if the server ignores the request headers; fetch the page in full
+            response = await fetch(url)
+            return FetchedPage(response.text, await asyncio.to_thread(cache.put, url, response.text), False)
+        await asyncio.to_thread(cache.touch, url)
+        cache.record("not_modified")
+        return FetchedPage(entry["body"], entry["content_hash"], True)
+
+    body = response.text
+    digest = await asyncio.to_thread(
+        cache.put, url, body, response.headers.get("etag"), response.headers.get("last-modified")
+    )
+    unchanged = entry is not None and entry["content_hash"] == digest
+    cache.record("unchanged" if unchanged else "changed" if entry is not None else "misses")
+    return FetchedPage(body, digest, unchanged)
@@ -0,0 +1,282 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from backend.services.dedup import new_chunk_deduplicator
+from backend.services.llm_cache import get_llm_cache
+from backend.services.llm_dispatcher import TokenUsage
+from backend.services.metrics import finish_trace, get_metrics, start_trace
+from backend.services.pipeline import process_url
+from backend.services.results import ResultTable
+from backend.services.workers import connect_sqlite, owner_alive, worker_owner
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join("data", "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+class JobStore:
+    """
+    Local SQLite store for background jobs and their checkpoints:
+      - jobs: one row per submitted request, with its status and token usage.
+      - job_urls: the result rows of every finished URL, so a restarted job skips it.
+      - job_chunks: the LLM response for every parsed chunk, so a URL that was
+        interrupted half-way only re-parses the chunks that hadn't finished.
+
+    Several worker processes can share the store: each job is owned by the process
+    that runs it (workers.worker_owner), and only jobs whose owner is gone are resumed.
+    """
+
+    def __init__(self, path=JOBS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL, usage TEXT,"
+            " error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, owner TEXT);"
+            "CREATE TABLE IF NOT EXISTS job_urls ("
+            " job_id TEXT NOT NULL, idx INTEGER NOT NULL, url TEXT NOT NULL, status TEXT NOT NULL,"
+            " result TEXT, PRIMARY KEY (job_id, idx));"
+            "CREATE TABLE IF NOT EXISTS job_chunks ("
+            " job_id TEXT NOT NULL, key TEXT NOT NULL, response TEXT NOT NULL, PRIMARY KEY (job_id, key));"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            # Stores created before jobs had owners
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._conn.commit()
+
+    def create(self, request):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, request, usage, created_at, updated_at, owner)"
+                " VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, json.dumps(request), json.dumps(TokenUsage().as_dict()), now, now, worker_owner()),
+            )
+            self._conn.executemany(
+                "INSERT INTO job_urls (job_id, idx, url, status) VALUES (?, ?, ?, 'pending')",
+                [(job_id, i, url) for i, url in enumerate(request["urls"], start=1)],
+            )
+            self._conn.commit()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, request, usage, error, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "status": row[1],
+            "request": json.loads(row[2]),
+            "usage": json.loads(row[3]) if row[3] else None,
+            "error": row[4],
+            "created_at": row[5],
+            "updated_at": row[6],
+        }
+
+    def set_status(self, job_id, status, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def claim_abandoned(self):
+        """
+        Take over the unfinished jobs whose owner process is gone (a previous run of the
+        server, or a worker that died), oldest first, and return their ids. Each job is
+        claimed with a compare-and-set on its owner, so only one worker resumes it.
+        """
+        me = worker_owner()
+        claimed = []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, owner FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+            for job_id, owner in rows:
+                if owner == me or owner_alive(owner):
+                    continue
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET owner = ? WHERE id = ? AND owner IS ?", (me, job_id, owner)
+                )
+                self._conn.commit()
+                if cursor.rowcount:
+                    claimed.append(job_id)
+        return claimed
+
+    def urls(self, job_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, url, status, result FROM job_urls WHERE job_id = ? ORDER BY idx", (job_id,)
+            ).fetchall()
+        return [
+            {
+                "index": row[0],
+                "url": row[1],
+                "status": row[2],
+                "table": ResultTable.from_records(json.loads(row[3])) if row[3] else None,
+            }
+            for row in rows
+        ]
+
+    def finish_url(self, job_id, index, status, table, usage):
+        result = json.dumps(table.to_records()) if table is not None else None
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_urls SET status = ?, result = ? WHERE job_id = ? AND idx = ?",
+                (status, result, job_id, index),
+            )
+            self._conn.execute(
+                "UPDATE jobs SET usage = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(usage.as_dict()), time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def get_chunk(self, job_id, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM job_chunks WHERE job_id = ? AND key = ?", (job_id, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_chunk(self, job_id, key, response):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_chunks (job_id, key, response) VALUES (?, ?, ?)", (job_id, key, response)
+            )
+            self._conn.commit()
+
+class JobChunkCheckpoint:
+    """
+    Chunk cache for parse_with_groq that checkpoints into the job store,
+    in front of the shared LLM cache. Its methods block on SQLite:
+    parse_with_groq calls them in worker threads.
+    """
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.shared = get_llm_cache()
+
+    def get(self, key):
+        value = self.store.get_chunk(self.job_id, key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+        return value
+
+    def put(self, key, value):
+        self.store.put_chunk(self.job_id, key, value)
+        if self.shared is not None:
+            self.shared.put(key, value)
+
+def usage_from_dict(data):
+    usage = TokenUsage()
+    for name, value in (data or {}).items():
+        if hasattr(usage, name):
+            setattr(usage, name, value)
+    return usage
+
+async def run_job(store, job_id):
+    """
+    Run the pending URLs of a job through the pipeline, checkpointing each URL as it finishes.
+    """
+    job = await asyncio.to_thread(store.get, job_id)
+    if job is None:
+        return
+    request = job["request"]
+    usage = usage_from_dict(job["usage"])
+    checkpoint = await asyncio.to_thread(JobChunkCheckpoint, store, job_id)
+    await asyncio.to_thread(store.set_status, job_id, "running")
+    trace = start_trace(f"Job {job_id}")
+    # Near-duplicate chunks are only tracked within this run: a resumed job starts afresh.
+    dedup = new_chunk_deduplicator()
+    get_metrics().inc("scraper_requests_total", endpoint="job")
+
+    async def run_url(entry):
+        try:
+            table = await process_url(
+                entry["index"], entry["url"], request["parse_description"], usage, cache=checkpoint, dedup=dedup
+            )
+            status = "done" if table is not None else "no_data"
+        except Exception as e:
+            logger.error(f"Job {job_id}: error processing URL {entry['url']}: {e}")
+            table, status = None, "failed"
+        await asyncio.to_thread(store.finish_url, job_id, entry["index"], status, table, usage)
+
+    pending = [entry for entry in await asyncio.to_thread(store.urls, job_id) if entry["status"] == "pending"]
+    if len(pending) < len(request["urls"]):
+        logger.info(f"Resuming job {job_id}: {len(request['urls']) - len(pending)} URL(s) already done")
+    # If the worker is cancelled here the job stays "running" and is resumed on the next startup.
+    await asyncio.gather(*(run_url(entry) for entry in pending))
+    await asyncio.to_thread(store.set_status, job_id, "done")
+    finish_trace(trace)
+
+_store = None
+_queue = None
+_workers = []
+
+def get_job_store():
+    """
+    Return the process-wide job store.
+    """
+    global _store
+    if _store is None:
+        _store = JobStore()
+    return _store
+
+async def _worker(queue):
+    store = await asyncio.to_thread(get_job_store)
+    while True:
+        job_id = await queue.get()
+        try:
+            await run_job(store, job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            await asyncio.to_thread(store.set_status, job_id, "failed", str(e))
+        finally:
+            queue.task_done()
+
+async def start_workers(count=JOB_WORKERS):
+    """
+    Start the background workers and re-queue jobs left unfinished by a previous run
+    (or by a worker process that died).
+    """
+    global _queue
+    _queue = asyncio.Queue()
+    store = await asyncio.to_thread(get_job_store)
+    for job_id in await asyncio.to_thread(store.claim_abandoned):
+        _queue.put_nowait(job_id)
+    for _ in range(count):
+        _workers.append(asyncio.create_task(_worker(_queue)))
+
+async def stop_workers():
+    """
+    Cancel the workers; running jobs keep their checkpoints and resume on the next start.
+    """
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+async def submit(request):
+    """
+    Store a new job and queue it. Returns the job id.
+    """
+    if _queue is None:
+        raise RuntimeError("Job workers are not running")
+    job_id = await asyncio.to_thread(get_job_store().create, request)
+    _queue.put_nowait(job_id)
+    return job_id
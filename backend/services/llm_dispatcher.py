@@ -0,0 +1,303 @@
+import asyncio
+import email.utils
+import logging
+import os
+import random
+import time
+import weakref
+from collections import deque
+
+from backend.services.metrics import count_event, get_metrics, record_stage
+from backend.services.workers import WEB_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Budgets of the Groq account; calls are queued so neither is exceeded in any 60s window.
+# Each web worker process gets an equal share.
+GROQ_RPM = max(1, int(os.getenv("GROQ_RPM", "30")) // WEB_WORKERS)
+GROQ_TPM = max(1, int(os.getenv("GROQ_TPM", "12000")) // WEB_WORKERS)
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+# Shrink concurrency when the average latency grows past this multiple of the best latency seen.
+LLM_LATENCY_FACTOR = float(os.getenv("LLM_LATENCY_FACTOR", "2"))
+
+WINDOW_SECONDS = 60.0
+
+class TokenUsage:
+    """
+    Per-request LLM usage, filled in by the dispatcher and parse_with_groq.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.retries = 0
+        self.failed_chunks = 0
+        # Chunks the relevance filter kept away from the LLM, and their estimated call tokens.
+        self.skipped_chunks = 0
+        self.skipped_tokens = 0
+        # Near-duplicate chunks not sent to the LLM, their estimated call tokens, and duplicate rows removed.
+        self.duplicate_chunks = 0
+        self.duplicate_tokens = 0
+        self.duplicate_rows = 0
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": self.input_tokens + self.output_tokens,
+            "retries": self.retries,
+            "failed_chunks": self.failed_chunks,
+            "skipped_chunks": self.skipped_chunks,
+            "skipped_tokens": self.skipped_tokens,
+            "duplicate_chunks": self.duplicate_chunks,
+            "duplicate_tokens": self.duplicate_tokens,
+            "duplicate_rows": self.duplicate_rows,
+        }
+
+def error_status(error):
+    """
+    HTTP status code carried by an LLM client exception, if any.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+def retry_after_seconds(error):
+    """
+    Parse the Retry-After header (seconds or HTTP date) of a throttled response.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(when.timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error):
+    """
+    429s, 5xx errors, timeouts and connection failures are worth retrying.
+    """
+    status = error_status(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name
+
+class LLMDispatcher:
+    """
+    Shared queue for LLM calls from every request.
+
+    - Requests-per-minute and tokens-per-minute budgets are tracked over a sliding
+      60s window; calls wait until both have room.
+    - 429 and 5xx responses are retried with jittered exponential backoff. A
+      Retry-After header is honoured and pauses the whole dispatcher, since the
+      limit is per account.
+    - Concurrency starts at max_concurrency, halves on throttling, shrinks when
+      latency rises and grows back by one slot per window of healthy calls.
+    """
+
+    def __init__(self, rpm=GROQ_RPM, tpm=GROQ_TPM, min_concurrency=LLM_MIN_CONCURRENCY,
+                 max_concurrency=LLM_MAX_CONCURRENCY, max_retries=LLM_MAX_RETRIES,
+                 backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX,
+                 latency_factor=LLM_LATENCY_FACTOR):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.latency_factor = latency_factor
+        self.concurrency = float(max_concurrency)
+
+        self._window = deque()
+        self._window_tokens = 0
+        self._blocked_until = 0.0
+        self._in_flight = 0
+        self._queued = 0
+        self._latency_avg = None
+        self._latency_best = None
+        self._conditions = weakref.WeakKeyDictionary()
+        self._stats = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0, "input_tokens": 0, "output_tokens": 0}
+
+    def _condition(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._conditions:
+            self._conditions[loop] = asyncio.Condition()
+        return self._conditions[loop]
+
+    ### CONCURRENCY
+
+    async def _acquire_slot(self):
+        condition = self._condition()
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight < int(self.concurrency))
+            self._in_flight += 1
+
+    async def _release_slot(self):
+        condition = self._condition()
+        async with condition:
+            self._in_flight -= 1
+            condition.notify_all()
+
+    def _record_latency(self, latency):
+        self._latency_avg = latency if self._latency_avg is None else 0.8 * self._latency_avg + 0.2 * latency
+        # Let the best latency drift up slowly so one lucky call doesn't pin it forever.
+        self._latency_best = latency if self._latency_best is None else min(latency, self._latency_best * 1.01)
+        if self._latency_avg > self.latency_factor * self._latency_best:
+            self.concurrency = max(self.min_concurrency, self.concurrency * 0.9)
+        else:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+    def _on_throttled(self, retry_after):
+        self._stats["throttled"] += 1
+        self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+    ### RATE BUDGETS
+
+    def _prune(self, now):
+        while self._window and now - self._window[0][0] >= WINDOW_SECONDS:
+            self._window_tokens -= self._window.popleft()[1]
+
+    async def _reserve_budget(self, tokens):
+        """
+        Wait until a call of `tokens` tokens fits in the RPM/TPM budgets and record it.
+        """
+        while True:
+            now = time.monotonic()
+            wait = self._blocked_until - now
+            if wait <= 0:
+                self._prune(now)
+                fits_tokens = self._window_tokens + tokens <= self.tpm or not self._window
+                if len(self._window) < self.rpm and fits_tokens:
+                    entry = [now, tokens]
+                    self._window.append(entry)
+                    self._window_tokens += tokens
+                    return entry
+                wait = self._window[0][0] + WINDOW_SECONDS - now
+            await asyncio.sleep(max(wait, 0.01))
+
+    def _settle_budget(self, entry, tokens):
+        # Replace the estimate with the real token count if the entry is still in the window.
+        if self._window and entry[0] >= self._window[0][0]:
+            self._window_tokens += tokens - entry[1]
+            entry[1] = tokens
+
+    ### CALLS
+
+    def _backoff(self, attempt, retry_after):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.5)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def call(self, make_call, estimated_tokens, usage=None):
+        """
+        Run `await make_call()` within the budgets, retrying transient failures.
+        make_call must return a chat message; its usage_metadata (when present)
+        replaces estimated_tokens in the budget and in `usage`.
+        Raises the last error once retries are exhausted.
+        """
+        self._queued += 1
+        try:
+            await self._acquire_slot()
+        finally:
+            self._queued -= 1
+        try:
+            for attempt in range(self.max_retries + 1):
+                entry = await self._reserve_budget(estimated_tokens)
+                start = time.monotonic()
+                try:
+                    message = await make_call()
+                except Exception as e:
+                    latency = time.monotonic() - start
+                    metrics = get_metrics()
+                    metrics.observe("scraper_llm_call_seconds", latency, outcome="error")
+                    record_stage("llm_call", latency, error=1)
+                    if not is_retryable(e) or attempt == self.max_retries:
+                        self._stats["failures"] += 1
+                        count_event("llm_failures")
+                        raise
+                    retry_after = retry_after_seconds(e)
+                    if error_status(e) == 429:
+                        self._on_throttled(retry_after)
+                    delay = self._backoff(attempt, retry_after)
+                    logger.warning(f"LLM call failed ({e}); retry {attempt + 1} in {delay:.1f}s")
+                    self._stats["retries"] += 1
+                    count_event("llm_retries")
+                    if usage is not None:
+                        usage.retries += 1
+                    await asyncio.sleep(delay)
+                    continue
+
+                latency = time.monotonic() - start
+                self._record_latency(latency)
+                metadata = getattr(message, "usage_metadata", None) or {}
+                input_tokens = metadata.get("input_tokens", estimated_tokens)
+                output_tokens = metadata.get("output_tokens", 0)
+                metrics = get_metrics()
+                metrics.observe("scraper_llm_call_seconds", latency, outcome="ok")
+                metrics.inc("scraper_llm_tokens_total", input_tokens, kind="input")
+                metrics.inc("scraper_llm_tokens_total", output_tokens, kind="output")
+                record_stage("llm_call", latency, tokens=input_tokens + output_tokens)
+                self._settle_budget(entry, input_tokens + output_tokens)
+                self._stats["calls"] += 1
+                self._stats["input_tokens"] += input_tokens
+                self._stats["output_tokens"] += output_tokens
+                if usage is not None:
+                    usage.calls += 1
+                    usage.input_tokens += input_tokens
+                    usage.output_tokens += output_tokens
+                return message
+        finally:
+            await self._release_slot()
+
+    def stats(self):
+        """
+        Read-only snapshot of the counters and budgets. /metrics calls it from a
+        threadpool, so it computes the window from a copy instead of pruning it.
+        """
+        now = time.monotonic()
+        window = [entry for entry in tuple(self._window) if now - entry[0] < WINDOW_SECONDS]
+        stats = dict(self._stats)
+        stats.update({
+            "concurrency": round(self.concurrency, 2),
+            "in_flight": self._in_flight,
+            "queued": self._queued,
+            "window_requests": len(window),
+            "window_tokens": sum(entry[1] for entry in window),
+            "latency_avg": self._latency_avg,
+            "blocked_for": max(self._blocked_until - now, 0.0),
+        })
+        return stats
+
+_dispatcher = None
+
+def get_dispatcher():
+    """
+    Return the process-wide dispatcher shared by all requests.
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = LLMDispatcher()
+    return _dispatcher
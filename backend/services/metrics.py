@@ -0,0 +1,283 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Requests slower than this many seconds log their per-stage trace (0 disables it).
+TRACE_SLOW_SECONDS = float(os.getenv("TRACE_SLOW_SECONDS", "60"))
+# Spans kept per trace; later spans are only counted in the per-stage summary.
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "1000"))
+
+# Histogram buckets, in seconds: stages range from sub-millisecond chunking to Selenium page loads.
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    "scraper_stage_seconds": (
+        "histogram", "Time spent in each pipeline stage (fetch, selenium, clean, chunk, template, parse, merge).",
+        STAGE_BUCKETS,
+    ),
+    "scraper_stage_bytes_total": ("counter", "Bytes produced by each pipeline stage.", None),
+    "scraper_stage_cpu_seconds_total": ("counter", "CPU time of the stages that run in worker threads.", None),
+    "scraper_stage_tokens_total": ("counter", "Tokens handled by each pipeline stage (chunk: sent to the LLM, relevance: skipped).", None),
+    "scraper_llm_call_seconds": ("histogram", "Latency of single LLM calls, by outcome.", LLM_BUCKETS),
+    "scraper_llm_tokens_total": ("counter", "Tokens reported by the LLM, by kind (input, output).", None),
+    "scraper_events_total": ("counter", "Cache hits, fallbacks and failures seen by the pipeline.", None),
+    "scraper_urls_total": ("counter", "URLs processed, by final status.", None),
+    "scraper_requests_total": ("counter", "Scrape requests served, by endpoint.", None),
+}
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms, rendered in the Prometheus text format.
+    Thread-safe: stages run in worker threads.
+    """
+
+    def __init__(self, metrics=METRICS):
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._counters = {}
+        # (name, labels) -> [bucket counts..., sum, count]
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = self.metrics[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """
+        All series in the Prometheus text exposition format.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(series) for key, series in self._histograms.items()}
+        lines = []
+        for name, (kind, help_text, buckets) in self.metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (series_name, labels), value in sorted(counters.items()):
+                    if series_name == name:
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            for (series_name, labels), series in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                for bound, count in zip(buckets, series):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {series[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(series[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {series[-1]}")
+        return "\n".join(lines) + "\n"
+
+def stats_exposition(component, stats):
+    """
+    Gauges for the numeric values of a component's stats() (caches, driver pool,
+    dispatcher...): scraper_<component>_<stat>. Nested per-domain dicts are summed.
+    """
+    totals = {}
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            for stat, number in value.items():
+                if isinstance(number, (int, float)) and not isinstance(number, bool):
+                    totals[stat] = totals.get(stat, 0) + number
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            totals[key] = value
+    lines = []
+    for stat, value in totals.items():
+        name = f"scraper_{component}_{stat}"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+_registry = MetricsRegistry()
+
+def get_metrics():
+    """
+    Return the process-wide metrics registry.
+    """
+    return _registry
+
+### PER-REQUEST TRACES
+
+class Trace:
+    """
+    Where one request spent its time: a span per stage run (with the URL it ran
+    for) and a per-stage summary. Stages of concurrent URLs overlap, so the stage
+    totals can add up to more than the request's wall time.
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []
+        self.stages = {}
+        self.events = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, started, seconds, url=None, **fields):
+        with self._lock:
+            summary = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0})
+            summary["count"] += 1
+            summary["seconds"] += seconds
+            for field, value in fields.items():
+                summary[field] = summary.get(field, 0) + value
+            if len(self.spans) < TRACE_MAX_SPANS:
+                span = {"stage": stage, "start": round(started - self.started, 4), "seconds": round(seconds, 4)}
+                if url is not None:
+                    span["url"] = url
+                span.update((field, _rounded(value)) for field, value in fields.items())
+                self.spans.append(span)
+
+    def add_volume(self, stage, **fields):
+        with self._lock:
+            summary = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0})
+            for field, value in fields.items():
+                summary[field] = summary.get(field, 0) + value
+
+    def add_event(self, event, value=1):
+        with self._lock:
+            self.events[event] = self.events.get(event, 0) + value
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        with self._lock:
+            stages = {
+                stage: {field: _rounded(value) for field, value in summary.items()}
+                for stage, summary in sorted(self.stages.items(), key=lambda item: -item[1]["seconds"])
+            }
+            return {
+                "seconds": round(self.elapsed, 4),
+                "stages": stages,
+                "events": dict(self.events),
+                "spans": list(self.spans),
+            }
+
+    def summary(self):
+        """
+        One line per stage, slowest first, for the logs.
+        """
+        stages = self.as_dict()["stages"]
+        parts = [f"{stage} {summary['seconds']:.2f}s/{summary['count']}" for stage, summary in stages.items()]
+        return f"{self.name} took {self.elapsed:.2f}s: " + ", ".join(parts)
+
+def _rounded(value):
+    return round(value, 4) if isinstance(value, float) else value
+
+_trace = contextvars.ContextVar("trace", default=None)
+_trace_url = contextvars.ContextVar("trace_url", default=None)
+
+def start_trace(name=""):
+    """
+    Start collecting the stages of the current request (and the tasks and threads it
+    starts, which copy the context) into a new Trace, and return it.
+    """
+    trace = Trace(name)
+    _trace.set(trace)
+    return trace
+
+def finish_trace(trace):
+    """
+    Log the stage breakdown of a slow request.
+    """
+    if TRACE_SLOW_SECONDS and trace.elapsed >= TRACE_SLOW_SECONDS:
+        logger.warning(f"Slow request: {trace.summary()}")
+
+def bind_url(url):
+    """
+    Attribute the spans recorded from now on in this task to url.
+    """
+    _trace_url.set(url)
+
+def record_stage(stage, seconds, started=None, **fields):
+    """
+    Record a finished stage run: its time in scraper_stage_seconds, its bytes, tokens
+    and CPU time (if given) in the stage counters, and a span in the current trace.
+    """
+    _registry.observe("scraper_stage_seconds", seconds, stage=stage)
+    if fields.get("bytes"):
+        _registry.inc("scraper_stage_bytes_total", fields["bytes"], stage=stage)
+    if fields.get("tokens"):
+        _registry.inc("scraper_stage_tokens_total", fields["tokens"], stage=stage)
+    if fields.get("cpu_seconds"):
+        _registry.inc("scraper_stage_cpu_seconds_total", fields["cpu_seconds"], stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        if started is None:
+            started = time.perf_counter() - seconds
+        trace.add(stage, started, seconds, _trace_url.get(), **fields)
+
+@contextmanager
+def stage_timer(stage, **fields):
+    """
+    Time the block as a run of stage. The yielded dict can be filled with more
+    fields (bytes, tokens, chunks) before the block ends.
+    """
+    started = time.perf_counter()
+    extra = dict(fields)
+    try:
+        yield extra
+    finally:
+        record_stage(stage, time.perf_counter() - started, started, **extra)
+
+def record_volume(stage, bytes=0, tokens=0):
+    """
+    Add bytes and tokens handled by a stage whose time is recorded elsewhere.
+    """
+    fields = {}
+    if bytes:
+        _registry.inc("scraper_stage_bytes_total", bytes, stage=stage)
+        fields["bytes"] = bytes
+    if tokens:
+        _registry.inc("scraper_stage_tokens_total", tokens, stage=stage)
+        fields["tokens"] = tokens
+    trace = _trace.get()
+    if trace is not None and fields:
+        trace.add_volume(stage, **fields)
+
+def count_event(event, value=1):
+    """
+    Count a cache hit, fallback or failure (scraper_events_total{event=...}).
+    """
+    _registry.inc("scraper_events_total", value, event=event)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_event(event, value)
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from backend.services.workers import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "1") == "1"
+PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", os.path.join("cache", "page_cache.sqlite3"))
+# Pages fetched less than this many seconds ago are served from the cache without touching the network.
+PAGE_CACHE_FRESHNESS = float(os.getenv("PAGE_CACHE_FRESHNESS", "300"))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "10000"))
+
+def content_hash(body):
+    """
+    Hash of a page body, used to tell whether a re-fetched page actually changed.
+    """
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+def description_key(parse_description):
+    return hashlib.sha256(parse_description.strip().encode("utf-8")).hexdigest()
+
+class PageCache:
+    """
+    On-disk cache of fetched pages, keyed by URL:
+      - pages: body, ETag, Last-Modified, fetch time and content hash, used to send
+        conditional requests and to skip the network within the freshness window.
+      - page_results: the extracted rows of a page for a parse description, valid
+        as long as the page's content hash is unchanged.
+    """
+
+    def __init__(self, path=PAGE_CACHE_PATH, freshness=PAGE_CACHE_FRESHNESS, max_entries=PAGE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.freshness = freshness
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self._stats = {"fresh_hits": 0, "not_modified": 0, "unchanged": 0, "changed": 0, "misses": 0, "result_hits": 0}
+
+        self._conn = connect_sqlite(path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY, body TEXT NOT NULL, etag TEXT, last_modified TEXT,"
+            " fetched_at REAL NOT NULL, content_hash TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS page_results ("
+            " url TEXT NOT NULL, description TEXT NOT NULL, content_hash TEXT NOT NULL,"
+            " result TEXT NOT NULL, PRIMARY KEY (url, description));"
+        )
+        self._conn.commit()
+
+    def get(self, url):
+        """
+        Return the cached entry for url as a dict, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, fetched_at, content_hash FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"body": row[0], "etag": row[1], "last_modified": row[2], "fetched_at": row[3], "content_hash": row[4]}
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry["fetched_at"] < self.freshness
+
+    def conditional_headers(self, entry):
+        """
+        If-None-Match / If-Modified-Since headers for revalidating a cached entry.
+        """
+        headers = {}
+        if entry is None:
+            return headers
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url, body, etag=None, last_modified=None):
+        """
+        Store a freshly downloaded page. Returns its content hash.
+        """
+        digest = content_hash(body)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, body, etag, last_modified, fetched_at, content_hash)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (url, body, etag, last_modified, time.time(), digest),
+            )
+            self._conn.commit()
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= 100:
+                self._evict()
+        return digest
+
+    def touch(self, url):
+        """
+        Restart the freshness window of an entry the server confirmed with a 304.
+        """
+        with self._lock:
+            self._conn.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    def _evict(self):
+        self._puts_since_evict = 0
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM pages WHERE url IN (SELECT url FROM pages ORDER BY fetched_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            self._conn.execute("DELETE FROM page_results WHERE url NOT IN (SELECT url FROM pages)")
+            self._conn.commit()
+
+    ### EXTRACTED RESULTS
+
+    def get_result(self, url, digest, parse_description):
+        """
+        Return the records stored for this page content and description, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, result FROM page_results WHERE url = ? AND description = ?",
+                (url, description_key(parse_description)),
+            ).fetchone()
+        if row is None or row[0] != digest:
+            return None
+        self.record("result_hits")
+        return json.loads(row[1])
+
+    def put_result(self, url, digest, parse_description, records):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_results (url, description, content_hash, result) VALUES (?, ?, ?, ?)",
+                (url, description_key(parse_description), digest, json.dumps(records)),
+            )
+            self._conn.commit()
+
+    def record(self, event):
+        with self._lock:
+            self._stats[event] += 1
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM pages")
+            self._conn.execute("DELETE FROM page_results")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            (stats["pages"],) = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()
+            (stats["results"],) = self._conn.execute("SELECT COUNT(*) FROM page_results").fetchone()
+        return stats
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_page_cache():
+    """
+    Return the process-wide page cache, or None when PAGE_CACHE_ENABLED is off.
+    """
+    global _cache
+    if not PAGE_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = PageCache()
+        return _cache
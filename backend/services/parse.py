@@ -1,19 +1,25 @@
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from dotenv import load_dotenv
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import csv
-import tiktoken
+import asyncio
+import html
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+import lxml.html
+from backend.services.llm_cache import get_llm_cache, make_key
+from backend.services.llm_dispatcher import get_dispatcher
+from backend.services.metrics import count_event
+from backend.services.results import ResultTable, parse_csv_rows
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-# Fetch Groq API key from environment variables
-groq_api_key = os.getenv("GROQ_API_KEY")
-if not groq_api_key:
-    raise ValueError("GROQ_API_KEY not found in environment variables")
+# Bump PROMPT_VERSION whenever the template changes, so cached responses for the old prompt are not reused.
+PROMPT_VERSION = "1"
 
 # Define the template for parsing instructions
 template = (
@@ -26,187 +32,397 @@ template = (
     "5. If no matching information is found, return an empty string ('').\n"
 )
 
-# Initialize the Groq model
-model = ChatGroq(
-    model="llama-3.3-70b-versatile",
-    temperature=0,
-    groq_api_key=groq_api_key
-)
+# The Groq model, created by get_model() at app startup or on first use. Assign another
+# chat model here to use it instead (the benchmarks point a ChatGroq at a mock API).
+model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """
+    Return the shared Groq model, creating it on first use. langchain_groq is imported
+    here and the API key checked here, so importing this module needs neither.
+    """
+    global model
+    with _model_lock:
+        if model is None:
+            # Fetch Groq API key from environment variables
+            groq_api_key = os.getenv("GROQ_API_KEY")
+            if not groq_api_key:
+                raise ValueError("GROQ_API_KEY not found in environment variables")
+            from langchain_groq import ChatGroq
+            # Retries are handled by the shared LLM dispatcher, which also honours the rate limits.
+            model = ChatGroq(
+                model="llama-3.3-70b-versatile",
+                temperature=0,
+                groq_api_key=groq_api_key,
+                max_retries=0
+            )
+        return model
+
+@lru_cache(maxsize=None)
+def get_prompt():
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_template(template)
+
+# Output tokens reserved against the TPM budget for each call until the real usage is known.
+LLM_OUTPUT_TOKENS_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKENS_ESTIMATE", "500"))
+# Rough size of a token, used for estimates while the encoding can't be loaded,
+# and how long to wait before trying to load it again.
+CHARS_PER_TOKEN = 4
+ENCODING_RETRY_SECONDS = 60
+_encoding_failed_at = float("-inf")
 
 ### TOKEN-AWARE SPLITTING FUNCTIONS
 
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = "cl100k_base"):
+    """
+    Load a tiktoken encoding once per process; tiktoken.get_encoding is expensive to call repeatedly.
+    """
+    import tiktoken
+    return tiktoken.get_encoding(encoding_name)
+
 def count_tokens(text: str, encoding_name: str = "cl100k_base") -> int:
     """
     Count tokens in a text using the specified encoding.
     """
-    encoding = tiktoken.get_encoding(encoding_name)
-    tokens = encoding.encode(text)
-    return len(tokens)
+    return len(get_encoding(encoding_name).encode(text))
+
+class _ChunkBuilder:
+    """
+    Packs pieces of text (paragraphs or words) into chunks using pre-computed token counts.
+    Each piece has two counts: `first` when it starts a chunk, and `joined` when it is
+    appended after the separator. Optionally carries the last overlap_tokens worth of
+    pieces over into the next chunk.
+    """
+
+    def __init__(self, separator: str, max_tokens: int, overlap_tokens: int, chunks: list):
+        self.separator = separator
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.chunks = chunks
+        self.pieces = []
+        self.tokens = 0
+
+    def add(self, text: str, first: int, joined: int):
+        if self.pieces and self.tokens + joined > self.max_tokens:
+            self.chunks.append(self.separator.join(piece[0] for piece in self.pieces))
+            self._keep_overlap(joined)
+            if not self.pieces and not text:
+                # Don't start a chunk with a blank line.
+                return
+        self.tokens += joined if self.pieces else first
+        self.pieces.append((text, first, joined))
 
-def token_aware_split(text: str, max_tokens: int = 500, encoding_name: str = "cl100k_base") -> list:
+    def _keep_overlap(self, next_joined: int):
+        tail = []
+        tail_tokens = 0
+        if self.overlap_tokens:
+            for piece in reversed(self.pieces):
+                if tail_tokens + piece[2] > self.overlap_tokens:
+                    break
+                tail.insert(0, piece)
+                tail_tokens += piece[2]
+            # The overlap must leave room for the piece that didn't fit.
+            while tail and tail_tokens + next_joined > self.max_tokens:
+                tail_tokens -= tail.pop(0)[2]
+        self.pieces = tail
+        self.tokens = (tail[0][1] + sum(piece[2] for piece in tail[1:])) if tail else 0
+
+    def flush(self):
+        if self.pieces:
+            self.chunks.append(self.separator.join(piece[0] for piece in self.pieces))
+        self.pieces = []
+        self.tokens = 0
+
+def _split_words(para: str, encoding, max_tokens: int, overlap_tokens: int, chunks: list):
+    words = para.split()
+    first_counts = [len(tokens) for tokens in encoding.encode_ordinary_batch(words)]
+    joined_counts = [len(tokens) for tokens in encoding.encode_ordinary_batch([" " + word for word in words])]
+    builder = _ChunkBuilder(" ", max_tokens, overlap_tokens, chunks)
+    for word, first, joined in zip(words, first_counts, joined_counts):
+        builder.add(word, first, joined)
+    builder.flush()
+
+def token_aware_split(text: str, max_tokens: int = 500, encoding_name: str = "cl100k_base", overlap_tokens: int = 0) -> list:
     """
     Split text into chunks such that each chunk has no more than max_tokens.
     Uses newline boundaries and falls back to word splitting if needed.
+
+    Every paragraph is encoded exactly once and chunk sizes are tracked as running
+    sums, so the cost is linear in the size of the text. The running sum counts one
+    separator token per newline, while tiktoken can merge a run of blank lines (or
+    trailing spaces plus the newline) into a single token, so a chunk may close a
+    little earlier than when the whole candidate string was re-encoded. Unlike the
+    previous version, a paragraph longer than max_tokens is always split by words,
+    even when it follows other paragraphs.
+
+    With overlap_tokens > 0, each chunk starts with up to that many tokens of trailing
+    paragraphs (or words) from the previous chunk, so records that straddle a chunk
+    boundary are seen whole at least once.
     """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+
+    encoding = get_encoding(encoding_name)
+    separator_tokens = len(encoding.encode_ordinary("\n"))
     paragraphs = text.splitlines()
+    paragraph_counts = [len(tokens) for tokens in encoding.encode_ordinary_batch(paragraphs)]
+
     chunks = []
-    current_chunk = ""
-    
-    for para in paragraphs:
-        candidate = current_chunk + "\n" + para if current_chunk else para
-        if count_tokens(candidate, encoding_name) > max_tokens:
-            if current_chunk:
-                chunks.append(current_chunk)
-                current_chunk = para
-            else:
-                # If a single paragraph is too long, split by words.
-                words = para.split()
-                temp_chunk = ""
-                for word in words:
-                    candidate_word = temp_chunk + " " + word if temp_chunk else word
-                    if count_tokens(candidate_word, encoding_name) > max_tokens:
-                        if temp_chunk:
-                            chunks.append(temp_chunk)
-                        temp_chunk = word
-                    else:
-                        temp_chunk = candidate_word
-                if temp_chunk:
-                    chunks.append(temp_chunk)
-                current_chunk = ""
-        else:
-            current_chunk = candidate
-    
-    if current_chunk:
-        chunks.append(current_chunk)
+    builder = _ChunkBuilder("\n", max_tokens, overlap_tokens, chunks)
+    for para, para_tokens in zip(paragraphs, paragraph_counts):
+        if para_tokens > max_tokens:
+            # If a single paragraph is too long, split by words.
+            builder.flush()
+            _split_words(para, encoding, max_tokens, overlap_tokens, chunks)
+        elif builder.pieces or para:
+            builder.add(para, para_tokens, para_tokens + separator_tokens)
+    builder.flush()
     return chunks
 
-def split_dom_content_token_aware(dom_content: str, max_tokens: int = 500, encoding_name: str = "cl100k_base") -> list:
+### RECORD-PRESERVING DOM CHUNKING
+
+# Attributes kept in the compact markup: the values the prompt asks the model to read.
+MARKUP_ATTRIBUTES = ("href", "src", "title", "alt", "datetime", "content")
+# Inline tags are dropped from the compact markup, keeping their text.
+INLINE_TAGS = {
+    "span", "b", "i", "strong", "em", "small", "font", "u", "s", "sup", "sub", "abbr", "label",
+    "mark", "del", "ins", "cite", "q", "bdi", "wbr", "br",
+}
+# Container tags are written bare (no attributes), and skipped when they only wrap one element.
+CONTAINER_TAGS = {
+    "body", "div", "section", "article", "main", "li", "ul", "ol", "tr", "table", "tbody", "thead",
+    "tfoot", "dl", "figure", "blockquote", "center",
+}
+
+class _MarkupNode:
+    """
+    Compact markup of a DOM subtree, its (summed) token count and its parts in
+    document order, so a subtree over the budget can be split into its children.
+    """
+    __slots__ = ("markup", "tokens", "parts")
+
+    def __init__(self, markup, tokens, parts=()):
+        self.markup = markup
+        self.tokens = tokens
+        self.parts = parts
+
+def _markup_text(value, keep_space):
+    text = re.sub(r"\s+", " ", html.escape(value, quote=False))
+    if not text.strip():
+        return " " if keep_space and text else ""
+    return text
+
+def _markup_tags(element):
+    tag = element.tag
+    if tag in INLINE_TAGS:
+        return "", ""
+    if tag in CONTAINER_TAGS:
+        return f"<{tag}>", f"</{tag}>"
+    attributes = []
+    text = " ".join(element.text_content().split())
+    for name in MARKUP_ATTRIBUTES:
+        value = " ".join((element.get(name) or "").split())
+        # A title repeating the visible text adds nothing; a different one is often the untruncated value.
+        if value and not (name in ("title", "alt") and value == text):
+            attributes.append(f'{name}="{html.escape(value)}"')
+    # A class is only worth its tokens on elements without text, where it can carry a value
+    # (e.g. <p class="star-rating Three">).
+    classes = element.get("class")
+    if classes and len(classes) <= 40 and not text:
+        attributes.append(f'class="{html.escape(classes.strip())}"')
+    if not attributes and tag not in ("a", "img", "p", "td", "th", "dt", "dd", "time", "pre") and not tag.startswith("h"):
+        return "", ""
+    opening = f"<{tag}{''.join(' ' + attribute for attribute in attributes)}>"
+    return opening, ("" if tag == "img" else f"</{tag}>")
+
+def _markup_node(element, count):
+    opening, closing = _markup_tags(element)
+    keep_space = not opening or element.tag not in CONTAINER_TAGS
+    parts = []
+    text = _markup_text(element.text or "", keep_space)
+    if text:
+        parts.append(_MarkupNode(text, count(text)))
+    for child in element:
+        if isinstance(child.tag, str):
+            node = _markup_node(child, count)
+            if node.markup:
+                parts.append(node)
+        tail = _markup_text(child.tail or "", keep_space)
+        if tail:
+            parts.append(_MarkupNode(tail, count(tail)))
+
+    if element.tag in CONTAINER_TAGS and len(parts) == 1:
+        # Pass-through wrapper: <div><div><article>...</article></div></div> -> <article>...</article>
+        return parts[0]
+    if not parts and not opening:
+        return _MarkupNode("", 0)
+    if not parts and element.tag in CONTAINER_TAGS:
+        return _MarkupNode("", 0)
+    markup = opening + "".join(part.markup for part in parts) + closing
+    tokens = count(opening) + count(closing) + sum(part.tokens for part in parts)
+    return _MarkupNode(markup, tokens, parts)
+
+def _markup_blocks(node, max_tokens, blocks):
     """
-    Given cleaned DOM content (HTML), extract text via BeautifulSoup and then split into token-aware chunks.
+    Whole subtrees that fit the budget, splitting larger ones into their children.
     """
-    from bs4 import BeautifulSoup
-    soup = BeautifulSoup(dom_content, "html.parser")
-    text_content = soup.get_text(separator="\n")
-    return token_aware_split(text_content, max_tokens=max_tokens, encoding_name=encoding_name)
+    if node.tokens <= max_tokens or not node.parts:
+        if node.markup.strip():
+            blocks.append(node)
+        return
+    for part in node.parts:
+        _markup_blocks(part, max_tokens, blocks)
 
-### CSV CLEANING FUNCTION
+def _page_markup(cleaned_html, count):
+    if not cleaned_html:
+        return _MarkupNode("", 0)
+    document = lxml.html.document_fromstring(cleaned_html)
+    body = document.find("body")
+    return _markup_node(body if body is not None else document, count)
 
-def clean_csv_data(csv_data: str) -> str:
+def split_dom_records(cleaned_html: str, max_tokens: int = 500, encoding_name: str = "cl100k_base", skip_block=None) -> list:
     """
-    Clean a CSV string by:
-      1. Removing leading/trailing whitespace and blank lines.
-      2. Using the first non-empty line as the header.
-      3. Skipping duplicate header lines.
-      4. Keeping only rows that have the same number of columns as the header.
-      5. Stripping any BOM characters from each line.
+    Split a cleaned page (CleanedPage.html) into chunks of compact markup that keep
+    DOM records intact, instead of flattening it to text first.
+
+    The DOM is rendered as compact markup: inline tags are dropped, containers are
+    written without attributes (and skipped when they only wrap one element), and other
+    tags keep only href/src/title/alt/datetime/content (plus class on text-less elements,
+    which often encodes values like ratings). A subtree that fits max_tokens is kept
+    whole; larger ones are split into their children, so sibling records such as
+    repeated product cards are packed into chunks without being cut. Only text blocks
+    that alone exceed max_tokens are split, by words.
+
+    Token counts are summed per piece (tags and text runs), like token_aware_split.
+
+    skip_block, if given, is called with the markup and token count of every block that
+    fits the budget; blocks it returns True for are left out before packing (see dedup).
     """
-    # Remove extra whitespace and split into lines.
-    lines = csv_data.strip().splitlines()
-    lines = [line.strip() for line in lines if line.strip() != ""]
-    if not lines:
-        return ""
-    
-    # Use the first non-empty line as header; remove BOM if present.
-    header = lines[0].lstrip("\ufeff")
-    try:
-        header_fields = next(csv.reader([header]))
-    except Exception as e:
-        raise ValueError("Error reading header from CSV data.") from e
-    expected_field_count = len(header_fields)
-    
-    valid_lines = [header]
-    for line in lines[1:]:
-        line = line.lstrip("\ufeff")
-        if line == header:
-            continue
+    return pack_dom_records(dom_record_blocks(cleaned_html, max_tokens, encoding_name), max_tokens, encoding_name, skip_block)
+
+def dom_record_blocks(cleaned_html: str, max_tokens: int = 500, encoding_name: str = "cl100k_base") -> list:
+    """
+    The (markup, tokens) blocks split_dom_records packs: the parsing and token counting,
+    kept apart so it can run in a CPU worker process (plain tuples cross it cheaply).
+    """
+    encoding = get_encoding(encoding_name)
+    counts = {}
+
+    def count(text):
+        if text not in counts:
+            counts[text] = len(encoding.encode_ordinary(text)) if text else 0
+        return counts[text]
+
+    blocks = []
+    _markup_blocks(_page_markup(cleaned_html, count), max_tokens, blocks)
+    return [(block.markup.strip(), block.tokens) for block in blocks]
+
+def pack_dom_records(blocks: list, max_tokens: int = 500, encoding_name: str = "cl100k_base", skip_block=None) -> list:
+    """
+    Pack dom_record_blocks into chunks of at most max_tokens (see split_dom_records).
+    """
+    encoding = get_encoding(encoding_name)
+    separator_tokens = len(encoding.encode_ordinary("\n"))
+    chunks = []
+    builder = _ChunkBuilder("\n", max_tokens, 0, chunks)
+    for markup, tokens in blocks:
+        if tokens > max_tokens:
+            builder.flush()
+            _split_words(markup, encoding, max_tokens, 0, chunks)
+        elif skip_block is None or not skip_block(markup, tokens):
+            builder.add(markup, tokens, tokens + separator_tokens)
+    builder.flush()
+    return chunks
+
+### PARSING FUNCTION WITH GROQ AND THE SHARED DISPATCHER
+
+def estimate_call_tokens(chunk, parse_description):
+    """
+    Input tokens of the LLM call for one chunk, plus the expected output tokens.
+    Falls back to CHARS_PER_TOKEN characters per token when the encoding can't be
+    loaded (tiktoken downloads it on first use), so a missing tokenizer only makes
+    the budget estimate rougher instead of failing the chunk.
+    """
+    global _encoding_failed_at
+    prompt = get_prompt().format(dom_content=chunk, parse_description=parse_description)
+    if time.monotonic() - _encoding_failed_at >= ENCODING_RETRY_SECONDS:
         try:
-            fields = next(csv.reader([line]))
+            return count_tokens(prompt) + LLM_OUTPUT_TOKENS_ESTIMATE
         except Exception as e:
-            print(f"Skipping line due to parsing error: {line} | Error: {e}")
-            continue
-        if len(fields) == expected_field_count:
-            valid_lines.append(line)
-        else:
-            print(f"Skipping invalid line: {line} (found {len(fields)} fields, expected {expected_field_count})")
-    
-    cleaned_csv = "\n".join(valid_lines)
-    return cleaned_csv
-
-### PARSING FUNCTION WITH GROQ AND THREADING
+            logger.warning(f"Could not load the tokenizer, estimating tokens from characters: {e}")
+            count_event("token_estimate_fallbacks")
+            _encoding_failed_at = time.monotonic()
+    return len(prompt) // CHARS_PER_TOKEN + LLM_OUTPUT_TOKENS_ESTIMATE
 
-def parse_with_groq(dom_chunks, parse_description):
+async def parse_with_groq(dom_chunks, parse_description, llm=None, usage=None, on_chunk=None, cache=None):
     """
-    Parse DOM content using the Groq model with parallel processing.
-    Each chunk is processed individually and cleaned.
-    Then, the valid CSV chunks are merged by selecting the longest (most complete) header as master.
+    Parse DOM content using the Groq model, with all chunk calls queued on the shared dispatcher.
+    Each chunk's response is parsed once into rows, and the rows of all chunks are
+    collected into a ResultTable that maps columns by header name.
+    Raw chunk responses are cached by chunk content, so unchanged chunks skip the LLM call.
+    Pass llm to use another chat model (e.g. a fake one in tests) instead of the Groq model,
+    and usage (a TokenUsage) to collect the token usage of this call.
+    on_chunk, if given, is called with each chunk's (header, rows) as soon as they are ready.
+    cache replaces the shared LLM cache (anything with get(key) and put(key, value)).
+    Cache lookups, token counting and CSV parsing run in worker threads, off the event loop.
     """
-    prompt = ChatPromptTemplate.from_template(template)
-    chain = prompt | model | StrOutputParser()
+    from langchain_core.output_parsers import StrOutputParser
 
-    parsed_results = []
+    llm = llm or get_model()
+    model_name = getattr(llm, "model_name", None) or type(llm).__name__
+    chain = get_prompt() | llm
+    cache = cache or await asyncio.to_thread(get_llm_cache)
+    dispatcher = get_dispatcher()
 
-    def process_chunk(chunk):
+    async def fetch_response(chunk):
+        key = make_key(chunk, parse_description, model_name, PROMPT_VERSION)
+        if cache is not None:
+            cached = await asyncio.to_thread(cache.get, key)
+            if cached is not None:
+                if usage is not None:
+                    usage.cache_hits += 1
+                count_event("llm_cache_hits")
+                return cached
+        inputs = {
+            "dom_content": chunk,
+            "parse_description": parse_description
+        }
+        estimated_tokens = await asyncio.to_thread(estimate_call_tokens, chunk, parse_description)
+        message = await dispatcher.call(lambda: chain.ainvoke(inputs), estimated_tokens, usage)
+        response = StrOutputParser().invoke(message)
+        logger.debug(f"Parsed chunk ({len(response)} chars): {response[:200]!r}")
+        if cache is not None:
+            await asyncio.to_thread(cache.put, key, response)
+        return response
+
+    async def process_chunk(chunk):
         try:
-            response = chain.invoke({
-                "dom_content": chunk,
-                "parse_description": parse_description
-            })
-            print(f"Parsed chunk: {response}")  # Debug output
-            if response.strip():
-                cleaned_csv = clean_csv_data(response)
-                if cleaned_csv.strip():
-                    return cleaned_csv
-            else:
-                print("Empty result for chunk")
+            response = await fetch_response(chunk)
         except Exception as e:
-            print(f"Error processing chunk: {str(e)}")
-        return ""
+            logger.warning(f"Error processing chunk: {e}")
+            count_event("chunk_failures")
+            if usage is not None:
+                usage.failed_chunks += 1
+            return None
+        if not response.strip():
+            logger.debug("Empty result for chunk")
+            return (), []
+        header, rows = await asyncio.to_thread(parse_csv_rows, response)
+        if on_chunk is not None and rows:
+            on_chunk(header, rows)
+        return header, rows
     
-    # Process chunks in parallel.
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(process_chunk, chunk) for chunk in dom_chunks]
-        for future in as_completed(futures):
-            result = future.result()
-            if result.strip():
-                parsed_results.append(result.strip())
-
-    # Filter out empty chunks.
-    valid_chunks = [chunk for chunk in parsed_results if chunk.strip()]
-    if not valid_chunks:
-        print("No valid CSV chunks found.")
-        return ""
-
-    # Use the longest chunk as the master header.
-    master_chunk = max(valid_chunks, key=len)
-    master_lines = master_chunk.strip().splitlines()
-    if not master_lines:
-        return ""
-    master_header = master_lines[0].lstrip("\ufeff")
-    try:
-        master_fields = next(csv.reader([master_header]))
-    except Exception as e:
-        print(f"Error parsing master header: {e}")
-        return ""
-    expected_field_count = len(master_fields)
-
-    combined_lines = [master_header]
-    for chunk in valid_chunks:
-        lines = chunk.strip().splitlines()
-        if not lines:
-            continue
-        current_header = lines[0].lstrip("\ufeff")
-        if current_header != master_header:
-            print(f"Warning: Skipping chunk due to header mismatch. Expected: {master_header} but got: {current_header}")
-            continue
-        for line in lines[1:]:
-            try:
-                fields = next(csv.reader([line]))
-            except Exception as e:
-                print(f"Skipping line due to parsing error: {line} | Error: {e}")
-                continue
-            if len(fields) == expected_field_count:
-                combined_lines.append(line)
-            else:
-                print(f"Skipping invalid line: {line} (found {len(fields)} fields, expected {expected_field_count})")
-    final_csv = "\n".join(combined_lines)
-    return final_csv
\ No newline at end of file
+    # Process chunks concurrently; the dispatcher bounds how many calls are in flight.
+    results = await asyncio.gather(*(process_chunk(chunk) for chunk in dom_chunks))
+
+    table = ResultTable()
+    for result in results:
+        if result is None:
+            table.failed_chunks += 1
+        else:
+            table.add_rows(*result)
+    if not table.row_count:
+        logger.info("No valid CSV chunks found.")
+    return table
@@ -0,0 +1,409 @@
+import asyncio
+import logging
+import os
+import weakref
+from typing import NamedTuple
+
+from backend.services.dedup import new_chunk_deduplicator
+from backend.services.driver_pool import DRIVER_POOL_SIZE
+from backend.services.fetcher import fetch_page
+from backend.services.metrics import bind_url, count_event, get_metrics, record_volume, stage_timer
+from backend.services.page_cache import get_page_cache
+from backend.services.relevance import RELEVANCE_FILTER_ENABLED, filter_chunks
+from backend.services.render_detect import MIN_TEXT_LENGTH, browser_may_help, get_render_memory
+from backend.services.scrape import selenium_scrape, clean_page
+from backend.services.parse import (
+    dom_record_blocks, estimate_call_tokens, pack_dom_records, parse_with_groq, token_aware_split
+)
+from backend.services.results import ResultTable
+from backend.services.selector_templates import (
+    TEMPLATE_MIN_ROWS, apply_template, get_template_store, learn_template
+)
+from backend.services.workers import cpu_pool_size, get_cpu_pool, offload, timed_call
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of URLs allowed in each stage at the same time.
+# Stages are shared by every request served by this process; the CPU-bound
+# ones allow at least one page per CPU worker process (see workers.CPU_WORKERS).
+STAGE_LIMITS = {
+    "fetch": int(os.getenv("FETCH_CONCURRENCY", "8")),
+    # Selenium renders: more would only queue for a driver while holding a slot.
+    "render": int(os.getenv("RENDER_CONCURRENCY", str(DRIVER_POOL_SIZE))),
+    "clean": int(os.getenv("CLEAN_CONCURRENCY", str(max(2, cpu_pool_size())))),
+    "chunk": int(os.getenv("CHUNK_CONCURRENCY", str(max(2, cpu_pool_size())))),
+    "parse": int(os.getenv("PARSE_CONCURRENCY", "4")),
+}
+
+# Chunk size sent to the LLM, and how many tokens of each chunk are repeated at the start of the next one.
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "500"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+# "records": chunks of compact markup that keep DOM records whole (parse.split_dom_records).
+# "text": the page text split on lines (token_aware_split), with CHUNK_OVERLAP_TOKENS.
+CHUNK_MODE = os.getenv("CHUNK_MODE", "records")
+
+# Semaphores are bound to the event loop that first waits on them, so keep one set per loop.
+_loop_limits = weakref.WeakKeyDictionary()
+
+def stage_limit(stage):
+    """
+    Return the semaphore guarding the given pipeline stage on the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    limits = _loop_limits.setdefault(loop, {})
+    if stage not in limits:
+        limits[stage] = asyncio.Semaphore(STAGE_LIMITS[stage])
+    return limits[stage]
+
+async def run_stage(stage, func, *args, metric=None, offload=False):
+    """
+    Run a blocking stage function in a worker thread once the stage has a free slot,
+    or, with offload and a CPU pool (see workers.get_cpu_pool), in a worker process:
+    func must then be a module-level function taking and returning plain data.
+    Its run time (without the wait for the slot) and the CPU time of the worker
+    thread are recorded as metric, or as stage.
+    """
+    pool = get_cpu_pool() if offload else None
+    async with stage_limit(stage):
+        with stage_timer(metric or stage) as span:
+            if pool is None:
+                result, span["cpu_seconds"] = await asyncio.to_thread(timed_call, func, *args)
+            else:
+                result, span["cpu_seconds"] = await asyncio.get_running_loop().run_in_executor(
+                    pool, timed_call, func, *args
+                )
+            return result
+
+class PageUnavailable(Exception):
+    """
+    The static fetch failed in a way a browser wouldn't fix (404, 5xx, unreachable host).
+    """
+
+    def __init__(self, url, error):
+        super().__init__(f"{url}: {error}")
+        self.status = getattr(getattr(error, "response", None), "status_code", None)
+
+async def fetch_static(url, page_cache=None):
+    """
+    Fetch a page with the pooled HTTP client, through the page cache if given.
+    Returns a FetchedPage, or None if the request failed but a browser might get
+    through (403, 429, timeouts). Raises PageUnavailable for any other failure.
+    """
+    async with stage_limit("fetch"):
+        with stage_timer("fetch") as span:
+            try:
+                fetched = await fetch_page(url, page_cache)
+            except Exception as e:
+                logger.warning(f"Simple scraper error for {url}: {e}")
+                count_event("fetch_errors")
+                if browser_may_help(e):
+                    return None
+                get_render_memory().record(url, "http_errors")
+                raise PageUnavailable(url, e) from e
+            span["bytes"] = len(fetched.html)
+            return fetched
+
+# Default of fetch_and_clean's fetched: None already means "the static fetch was blocked".
+NOT_FETCHED = object()
+
+async def fetch_and_clean(url, min_text_length=MIN_TEXT_LENGTH, fetched=NOT_FETCHED, on_html=None):
+    """
+    Fetch a page with the pooled HTTP client and clean it in a single parse.
+    Falls back to Selenium only when the static page is short and looks rendered
+    client-side (see render_detect), or when the static fetch was blocked.
+    fetched is the result of fetch_static for url if it was already called: a
+    FetchedPage, or None when the fetch was blocked (the page then goes straight
+    to Selenium instead of being fetched again).
+    on_html, if given, is called with the HTML Selenium rendered.
+    Returns (CleanedPage, rendered) where rendered is True if the page came from
+    Selenium, or (None, False) if neither fetch produced a page.
+    Raises PageUnavailable if the static fetch failed for good.
+    """
+    memory = get_render_memory()
+    if fetched is NOT_FETCHED:
+        fetched = await fetch_static(url)
+    static_page = None
+    if fetched:
+        static_page = await run_stage("clean", clean_page, fetched.html, offload=offload(len(fetched.html)))
+        record_volume("clean", bytes=len(static_page.html))
+        decision = memory.decide(url, fetched.html, static_page.text_length, min_text_length)
+        if not decision.needs_browser:
+            if static_page.text_length < min_text_length:
+                memory.record(url, "fallbacks_skipped")
+                logger.info(f"Short page, not using Selenium ({decision.reason}): {url}")
+            return static_page, False
+        logger.info(f"Page looks rendered client-side ({decision.reason}); switching to Selenium for {url}")
+    else:
+        logger.info(f"Static fetch blocked; switching to Selenium for {url}")
+
+    count_event("selenium_fallbacks")
+    async with stage_limit("render"):
+        with stage_timer("selenium") as span:
+            dom_content = await asyncio.to_thread(selenium_scrape, url)
+            span["bytes"] = len(dom_content or "")
+    if dom_content and on_html is not None:
+        on_html(dom_content)
+    static_length = static_page.text_length if static_page else 0
+    if not dom_content:
+        memory.record_selenium(url, static_length, 0, min_text_length)
+        return (static_page, False) if static_page and static_page.text_length else (None, False)
+    page = await run_stage("clean", clean_page, dom_content, offload=offload(len(dom_content)))
+    record_volume("clean", bytes=len(page.html))
+    memory.record_selenium(url, static_length, page.text_length, min_text_length)
+    if static_page and static_page.text_length >= page.text_length:
+        return static_page, False
+    return page, True
+
+class PageChunks(NamedTuple):
+    chunks: list
+    # Chunks the relevance filter found unrelated, and the estimated tokens of their calls.
+    dropped: list
+    saved_tokens: int
+    # Near-duplicates of blocks (records mode) or chunks (text mode) already sent in this
+    # request or job, and their estimated tokens.
+    duplicates: list
+    duplicate_tokens: int
+
+def split_page(content, mode, max_tokens, overlap_tokens):
+    """
+    The stateless, CPU-heavy part of chunking, which can run in a CPU worker process:
+    the (markup, tokens) DOM blocks of the cleaned HTML in records mode, the chunks of
+    the page text in text mode. Only the string the mode needs is sent.
+    """
+    if mode == "records":
+        return dom_record_blocks(content, max_tokens, "cl100k_base")
+    return token_aware_split(content, max_tokens, "cl100k_base", overlap_tokens)
+
+def chunk_page(page, parse_description, dedup=None, pieces=None):
+    """
+    Split a cleaned page into LLM chunks (see CHUNK_MODE), drop the ones the relevance
+    filter finds unrelated to the description (cookie banners, legal text, related links...).
+    pieces is the result of split_page for the page if it was already computed.
+
+    With a ChunkDeduplicator, content that nearly repeats what was already sent for other
+    pages of the request or job (sidebars, carousels, the same page at another URL) is
+    skipped. In records mode this is done per DOM block before packing, so a repeated
+    carousel is dropped even when it would share a chunk with new records; in text mode
+    per chunk. Blocks are compared with other pages only (records of one listing often
+    differ by a word), and remembered only once they passed the relevance filter.
+    """
+    if pieces is None:
+        content = page.html if CHUNK_MODE == "records" else page.text
+        pieces = split_page(content, CHUNK_MODE, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+    duplicates = []
+    duplicate_tokens = 0
+    # Blocks packed into this page's chunks, remembered by the deduplicator after filtering.
+    packed = []
+    if CHUNK_MODE == "records":
+        def skip_block(markup, tokens):
+            nonlocal duplicate_tokens
+            block_print = dedup.fingerprint(markup)
+            if dedup.is_duplicate(block_print):
+                duplicates.append(markup)
+                duplicate_tokens += tokens
+                return True
+            packed.append((markup, block_print))
+            return False
+
+        chunks = pack_dom_records(pieces, CHUNK_MAX_TOKENS, "cl100k_base", skip_block if dedup is not None else None)
+    else:
+        chunks = pieces
+    dropped = []
+    if RELEVANCE_FILTER_ENABLED:
+        chunks, dropped = filter_chunks(chunks, parse_description)
+    if packed:
+        dropped_text = "\n".join(dropped)
+        dedup.remember([block_print for markup, block_print in packed if markup not in dropped_text])
+    if dedup is not None and CHUNK_MODE != "records":
+        chunks, duplicates = dedup.filter(chunks)
+        duplicate_tokens = sum(estimate_call_tokens(chunk, parse_description) for chunk in duplicates)
+    return PageChunks(
+        chunks,
+        dropped,
+        sum(estimate_call_tokens(chunk, parse_description) for chunk in dropped),
+        duplicates,
+        duplicate_tokens,
+    )
+
+async def process_url(index, url, parse_description, usage=None, on_event=None, cache=None, dedup=None, on_html=None):
+    """
+    Run one URL through the fetch -> clean -> chunk -> parse stages.
+    Returns a ResultTable with the URL's rows, or None if nothing could be extracted.
+    If on_event is given, it is called with progress events and with the rows of each parsed chunk.
+    cache overrides the LLM cache used for the chunks of this URL.
+    dedup is the ChunkDeduplicator shared by the URLs of the request or job, if any.
+    on_html, if given, is called with the raw HTML of the page (static or rendered) as
+    soon as it is fetched, before it is parsed (the crawler reads its links there).
+
+    Static pages go through the page cache: when the page is unchanged since the
+    last fetch (fresh, 304, or same content hash) and was already parsed with the
+    same description, the stored rows are returned without cleaning or parsing.
+
+    With SELECTOR_TEMPLATES_ENABLED, a successful LLM extraction teaches a selector
+    template for the domain and description; later pages of the domain are
+    extracted with it, and only go to the LLM if its rows fail validation.
+    """
+    def emit(event, **fields):
+        if event == "url_done":
+            get_metrics().inc("scraper_urls_total", status=fields["status"])
+        if on_event is not None:
+            on_event({"event": event, "index": index, "url": url, **fields})
+
+    def emit_rows(header, rows):
+        emit("rows", header=header, rows=rows)
+
+    logger.info(f"Processing URL {index}: {url}")
+    bind_url(url)
+    emit("url_started")
+    page_cache = get_page_cache()
+    try:
+        fetched = await fetch_static(url, page_cache)
+    except PageUnavailable as e:
+        emit("url_done", status="fetch_failed", rows=0, http_status=e.status)
+        return None
+    if fetched and on_html is not None:
+        on_html(fetched.html)
+    if fetched and fetched.unchanged:
+        records = await asyncio.to_thread(page_cache.get_result, url, fetched.content_hash, parse_description)
+        if records is not None:
+            logger.info(f"Page unchanged since last parse, reusing its rows: {url}")
+            count_event("page_cache_result_hits")
+            table = ResultTable.from_records(records)
+            if table.row_count:
+                emit_rows(table.columns, table.rows)
+                emit("url_done", status="ok", rows=table.row_count, cached=True)
+                return table
+            emit("url_done", status="no_data", rows=0, cached=True)
+            return None
+
+    page, rendered = await fetch_and_clean(url, fetched=fetched, on_html=on_html)
+    # Only the hash of the raw page is needed from here on; drop its HTML before the LLM stage.
+    static = fetched is not None
+    content_hash = fetched.content_hash if fetched else None
+    fetched = None
+    if page is None:
+        logger.warning(f"Failed to scrape website: {url}")
+        emit("url_done", status="fetch_failed", rows=0)
+        return None
+
+    templates = get_template_store()
+    template = None
+    if templates is not None:
+        template = await asyncio.to_thread(templates.get, url, parse_description)
+    if template is not None:
+        table = await run_stage(
+            "clean", apply_template, page.html, template, metric="template", offload=offload(len(page.html))
+        )
+        if table is not None:
+            logger.info(f"Extracted {table.row_count} rows with the learned template: {url}")
+            count_event("template_hits")
+            await asyncio.to_thread(templates.record, url, parse_description, "hits")
+            emit_rows(table.columns, table.rows)
+        else:
+            count_event("template_fallbacks")
+            await asyncio.to_thread(templates.record, url, parse_description, "fallbacks")
+
+    duplicates = []
+    if template is None or table is None:
+        pieces = None
+        content = page.html if CHUNK_MODE == "records" else page.text
+        if offload(len(content)):
+            pieces = await run_stage(
+                "chunk", split_page, content, CHUNK_MODE, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS,
+                metric="split", offload=True,
+            )
+        page_chunks = await run_stage("chunk", chunk_page, page, parse_description, dedup, pieces)
+        # Release the page while the LLM calls run: only learn_template still needs its HTML.
+        content = pieces = None
+        page = page._replace(html=page.html if templates is not None else "", text="")
+        dom_chunks, dropped, saved_tokens = page_chunks.chunks, page_chunks.dropped, page_chunks.saved_tokens
+        record_volume("chunk", bytes=sum(len(chunk) for chunk in dom_chunks))
+        duplicates = page_chunks.duplicates
+        if duplicates:
+            logger.info(
+                f"Skipped {len(duplicates)} block(s) or chunk(s) repeating earlier content "
+                f"(~{page_chunks.duplicate_tokens} tokens) for {url}"
+            )
+            count_event("chunks_deduplicated", len(duplicates))
+            record_volume("dedup", tokens=page_chunks.duplicate_tokens)
+            if usage is not None:
+                usage.duplicate_chunks += len(duplicates)
+                usage.duplicate_tokens += page_chunks.duplicate_tokens
+        if dropped:
+            count_event("chunks_skipped", len(dropped))
+            record_volume("relevance", tokens=saved_tokens)
+            logger.info(
+                f"Relevance filter skipped {len(dropped)}/{len(dom_chunks) + len(duplicates) + len(dropped)} chunks "
+                f"(~{saved_tokens} tokens) for {url}"
+            )
+            if usage is not None:
+                usage.skipped_chunks += len(dropped)
+                usage.skipped_tokens += saved_tokens
+
+        logger.info(f"Parsing Website {index}: {url}")
+        async with stage_limit("parse"):
+            with stage_timer("parse", chunks=len(dom_chunks)):
+                table = await parse_with_groq(
+                    dom_chunks, parse_description, usage=usage, on_chunk=emit_rows, cache=cache
+                )
+        if templates is not None and table.row_count >= TEMPLATE_MIN_ROWS and not table.failed_chunks:
+            records = table.to_records()
+            learned = await run_stage(
+                "clean", learn_template, page.html, records["columns"], records["rows"],
+                metric="learn_template", offload=offload(len(page.html)),
+            )
+            if learned is not None:
+                logger.info(f"Learned a selector template from {url}: {learned['record']}")
+                await asyncio.to_thread(templates.put, url, parse_description, learned)
+
+    # Rows of chunks skipped as duplicates belong to other URLs, so such a result is not reusable on its own.
+    if page_cache is not None and static and not rendered and not table.failed_chunks and not duplicates:
+        await asyncio.to_thread(
+            page_cache.put_result, url, content_hash, parse_description, table.to_records()
+        )
+    if not table.row_count:
+        if duplicates and not dom_chunks:
+            logger.info(f"All content repeats earlier URLs: {url}")
+            emit("url_done", status="duplicate", rows=0)
+            return None
+        logger.warning(f"No relevant information found for URL: {url}")
+        emit("url_done", status="no_data", rows=0)
+        return None
+
+    emit("url_done", status="ok", rows=table.row_count)
+    return table
+
+async def run_pipeline(urls, parse_description, usage=None, on_event=None):
+    """
+    Process all URLs concurrently, with each stage bounded by STAGE_LIMITS.
+    Returns one ResultTable per URL, in the same order as the input URLs (None for failed URLs).
+    LLM token usage of the whole batch is added to usage (a TokenUsage) if given,
+    and progress events are passed to on_event (see process_url) if given.
+    Chunks repeating one already sent for another URL of the batch are skipped.
+    """
+    dedup = new_chunk_deduplicator()
+    tasks = [
+        process_url(i, url, parse_description, usage, on_event, dedup=dedup)
+        for i, url in enumerate(urls, start=1)
+    ]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    if usage is not None and usage.skipped_chunks:
+        logger.info(
+            f"Relevance filter saved ~{usage.skipped_tokens} tokens ({usage.skipped_chunks} chunks) on this request"
+        )
+    if usage is not None and usage.duplicate_chunks:
+        logger.info(
+            f"Chunk dedup saved {usage.duplicate_chunks} LLM calls (~{usage.duplicate_tokens} tokens) on this request"
+        )
+
+    tables = []
+    for index, (url, result) in enumerate(zip(urls, results), start=1):
+        if isinstance(result, Exception):
+            logger.error(f"Error processing URL {url}: {result}")
+            get_metrics().inc("scraper_urls_total", status="error")
+            if on_event is not None:
+                on_event({"event": "url_done", "index": index, "url": url, "status": "error", "rows": 0})
+            tables.append(None)
+        else:
+            tables.append(result)
+    return tables
@@ -0,0 +1,180 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import NamedTuple
+
+RELEVANCE_FILTER_ENABLED = os.getenv("RELEVANCE_FILTER_ENABLED", "1") == "1"
+# Chunks scoring below this fraction of the page's best chunk are not sent to the LLM.
+RELEVANCE_THRESHOLD = float(os.getenv("RELEVANCE_THRESHOLD", "0.15"))
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Weights of the score components (each normalized to 0..1 over the page's chunks).
+# Repeated line structure only boosts chunks that already match the description,
+# so a block of related links doesn't pass on its own.
+WEIGHT_BM25 = 0.6
+WEIGHT_FIELDS = 0.4
+REPETITION_BOOST = 0.5
+BOILERPLATE_PENALTY = 0.5
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+# Words of the parse description that say what to do rather than what to look for.
+STOPWORDS = {
+    "a", "all", "an", "and", "any", "are", "as", "at", "be", "by", "csv", "data", "detail", "each", "every",
+    "extract", "field", "find", "for", "from", "get", "give", "in", "include", "info", "information", "is",
+    "it", "item", "list", "me", "of", "on", "only", "or", "page", "please", "pull", "return", "scrape",
+    "site", "table", "the", "their", "them", "these", "this", "to", "website", "with",
+}
+# Field keywords of the description, and what their values look like in page text.
+FIELD_PATTERNS = {
+    "price": r"[$£€¥]\s?\d|\d[.,]\d{2}\s?(?:usd|eur|gbp)?\b",
+    "cost": r"[$£€¥]\s?\d|\d[.,]\d{2}\b",
+    "date": r"\b\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}\b|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.? \d",
+    "year": r"\b(?:19|20)\d{2}\b",
+    "email": r"[\w.+-]+@[\w-]+\.[\w.]+",
+    "phone": r"\+?\d[\d\s().-]{7,}\d",
+    "rating": r"\b[0-5](?:\.\d)?\s*(?:/\s*5|out of 5|stars?)\b|★",
+    "review": r"\b\d+\s+reviews?\b",
+    "url": r"https?://|www\.",
+    "link": r"https?://|www\.",
+    "stock": r"\b(?:in stock|out of stock|sold out|available)\b",
+    "availability": r"\b(?:in stock|out of stock|sold out|available)\b",
+    "quantity": r"\b\d+\s*(?:pcs|pieces|units|items)\b",
+}
+# Phrases of cookie banners, legal text and newsletter boxes that the tag blacklist lets through.
+BOILERPLATE_PATTERN = re.compile(
+    r"\b(?:cookies?|privacy|consent|gdpr|terms of (?:use|service)|all rights reserved|copyright|newsletter|"
+    r"subscribe|sign up|log ?in|unsubscribe|tracking|third[- ]party|advertis\w*|accept all|preferences)\b|©",
+    re.IGNORECASE,
+)
+
+def stem(word):
+    """
+    Crude plural folding so "prices" matches "price".
+    """
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def tokenize(text):
+    return [stem(word) for word in WORD_PATTERN.findall(text.lower())]
+
+def query_terms(parse_description):
+    """
+    The words of the parse description worth matching, in order, without duplicates.
+    """
+    terms = [term for term in tokenize(parse_description) if term not in STOPWORDS and len(term) > 1]
+    return list(dict.fromkeys(terms))
+
+def line_shape(line):
+    """
+    Shape of a line with digits and letters collapsed, so records of a listing share a shape.
+    """
+    shape = re.sub(r"\d+", "0", line.strip().lower())
+    return re.sub(r"[a-z]+", "a", shape)
+
+def repetition_score(text):
+    """
+    Share of a chunk's lines whose shape repeats at least three times: high for listings and tables.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) < 3:
+        return 0.0
+    shapes = Counter(line_shape(line) for line in lines)
+    return sum(count for count in shapes.values() if count >= 3) / len(lines)
+
+def boilerplate_score(text):
+    """
+    Share of a chunk's lines that read like cookie, legal or newsletter text.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return 0.0
+    return sum(1 for line in lines if BOILERPLATE_PATTERN.search(line)) / len(lines)
+
+def bm25_scores(chunk_tokens, terms):
+    """
+    BM25 of every chunk for the query terms, with the page's chunks as the corpus.
+    """
+    count = len(chunk_tokens)
+    average_length = sum(len(tokens) for tokens in chunk_tokens) / count or 1.0
+    frequencies = [Counter(tokens) for tokens in chunk_tokens]
+    scores = [0.0] * count
+    for term in terms:
+        containing = sum(1 for frequency in frequencies if term in frequency)
+        if not containing:
+            continue
+        idf = math.log(1 + (count - containing + 0.5) / (containing + 0.5))
+        for i, frequency in enumerate(frequencies):
+            tf = frequency.get(term, 0)
+            if tf:
+                length_norm = 1 - BM25_B + BM25_B * len(chunk_tokens[i]) / average_length
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+    return scores
+
+def field_scores(chunks, terms):
+    """
+    Matches per line of the value patterns of the description's field keywords (prices, dates...).
+    """
+    patterns = [re.compile(FIELD_PATTERNS[term], re.IGNORECASE) for term in terms if term in FIELD_PATTERNS]
+    if not patterns:
+        return [0.0] * len(chunks)
+    scores = []
+    for chunk in chunks:
+        lines = max(1, sum(1 for line in chunk.splitlines() if line.strip()))
+        scores.append(sum(len(pattern.findall(chunk)) for pattern in patterns) / lines)
+    return scores
+
+def _normalized(values):
+    top = max(values, default=0.0)
+    return [value / top for value in values] if top > 0 else [0.0] * len(values)
+
+class ChunkScore(NamedTuple):
+    score: float
+    bm25: float
+    fields: float
+    repetition: float
+    boilerplate: float
+
+def score_chunks(chunks, parse_description):
+    """
+    Relevance of each chunk to the parse description, combining BM25 over the
+    description's keywords and matches of the value patterns of known field names,
+    boosted by repeated line structure (listings) and penalized for boilerplate text.
+    """
+    terms = query_terms(parse_description)
+    bm25 = _normalized(bm25_scores([tokenize(chunk) for chunk in chunks], terms))
+    fields = _normalized(field_scores(chunks, terms))
+    scores = []
+    for i, chunk in enumerate(chunks):
+        repetition = repetition_score(chunk)
+        boilerplate = boilerplate_score(chunk)
+        score = (
+            (WEIGHT_BM25 * bm25[i] + WEIGHT_FIELDS * fields[i]) * (1 + REPETITION_BOOST * repetition)
+            - BOILERPLATE_PENALTY * boilerplate
+        )
+        scores.append(ChunkScore(score, bm25[i], fields[i], repetition, boilerplate))
+    return scores
+
+def filter_chunks(chunks, parse_description, threshold=RELEVANCE_THRESHOLD):
+    """
+    Drop the chunks scoring below threshold times the page's best chunk.
+    The best chunk is always kept, and nothing is dropped when the description
+    has no usable keywords or nothing on the page matches them.
+    Returns (kept chunks, dropped chunks).
+    """
+    if len(chunks) < 2 or not query_terms(parse_description):
+        return list(chunks), []
+    scores = score_chunks(chunks, parse_description)
+    best = max(score.score for score in scores)
+    if best <= 0:
+        return list(chunks), []
+    kept, dropped = [], []
+    for chunk, score in zip(chunks, scores):
+        (kept if score.score >= threshold * best else dropped).append(chunk)
+    return kept, dropped
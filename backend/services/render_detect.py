@@ -0,0 +1,185 @@
+import logging
+import os
+import re
+import threading
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Visible text below this length makes a page a candidate for the Selenium fallback.
+MIN_TEXT_LENGTH = int(os.getenv("RENDER_MIN_TEXT_LENGTH", "100"))
+# Inline script characters per visible text character above which a short page is assumed to render client-side.
+SCRIPT_TEXT_RATIO = float(os.getenv("RENDER_SCRIPT_TEXT_RATIO", "5"))
+# Selenium renders on a domain before their outcome overrides the classifier for its short pages.
+DOMAIN_MIN_SAMPLES = int(os.getenv("RENDER_DOMAIN_MIN_SAMPLES", "2"))
+
+# HTTP statuses where a real browser may get through (bot walls, throttling pages).
+# Any other error status (404, 410, 500...) is final and never triggers the fallback.
+BROWSER_FALLBACK_STATUSES = (403, 429)
+
+# Empty mount points of single-page apps: <div id="root"></div>, <app-root></app-root>...
+SPA_ROOT_PATTERN = re.compile(
+    r"<(div|main|section)\b[^>]*\bid=[\"']?(root|app|__next|__nuxt|___gatsby|svelte)[\"']?[^>]*>\s*</\1>"
+    r"|<app-root\b[^>]*>\s*</app-root>",
+    re.IGNORECASE,
+)
+NOSCRIPT_WARNING_PATTERN = re.compile(
+    r"<noscript\b[^>]*>(?:(?!</noscript>).)*?(enable|turn on|requires?|need)\b[^<]*javascript",
+    re.IGNORECASE | re.DOTALL,
+)
+SCRIPT_PATTERN = re.compile(r"<script\b[^>]*>(.*?)</script>", re.IGNORECASE | re.DOTALL)
+FRAMEWORK_SIGNATURES = {
+    "react": ("data-reactroot", "react-dom", "__react"),
+    "next.js": ("__NEXT_DATA__", "/_next/static/"),
+    "vue": ("data-v-app", "vue.runtime", "vue.global", "__VUE__"),
+    "nuxt": ("window.__NUXT__", "/_nuxt/"),
+    "angular": ("ng-version", "ng-app", "angular.min.js"),
+    "svelte": ("__sveltekit", "svelte-"),
+    "ember": ("ember-application", "ember.min.js"),
+    "gatsby": ("___gatsby",),
+}
+
+class RenderDecision(NamedTuple):
+    needs_browser: bool
+    reason: str
+
+def page_signals(html):
+    """
+    Signs in the raw static HTML that the content is rendered client-side.
+    """
+    signals = []
+    if SPA_ROOT_PATTERN.search(html):
+        signals.append("empty SPA root")
+    if NOSCRIPT_WARNING_PATTERN.search(html):
+        signals.append("noscript warning")
+    for framework, markers in FRAMEWORK_SIGNATURES.items():
+        if any(marker in html for marker in markers):
+            signals.append(framework)
+    return signals
+
+def script_text_ratio(html, text_length):
+    script_length = sum(len(script) for script in SCRIPT_PATTERN.findall(html))
+    return script_length / max(text_length, 1)
+
+def classify_page(html, text_length, min_text_length=MIN_TEXT_LENGTH):
+    """
+    Decide from the static response whether the page needs a browser.
+    Pages with enough visible text never do. Short pages do only if the HTML
+    shows signs of client-side rendering (SPA root markers, noscript warnings,
+    framework signatures, or far more script than text); a short page with
+    none of these is just a short page, and a browser would see the same thing.
+    """
+    if text_length >= min_text_length:
+        return RenderDecision(False, "enough static text")
+    signals = page_signals(html)
+    ratio = script_text_ratio(html, text_length)
+    if ratio >= SCRIPT_TEXT_RATIO:
+        signals.append(f"script/text ratio {ratio:.0f}")
+    if signals:
+        return RenderDecision(True, ", ".join(signals))
+    return RenderDecision(False, "short page without client-side rendering")
+
+def browser_may_help(error):
+    """
+    Whether a failed static fetch is worth retrying in a browser.
+    Only bot walls (403, 429), timeouts and servers dropping the connection
+    mid-response are; every other error (other statuses, unreachable hosts,
+    bad URLs, redirect loops, undecodable bodies) is final.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in BROWSER_FALLBACK_STATUSES
+    return isinstance(error, (httpx.TimeoutException, httpx.RemoteProtocolError))
+
+def domain_of(url):
+    return urlsplit(url).netloc.lower()
+
+class DomainRenderMemory:
+    """
+    Per-domain record of render decisions and Selenium outcomes:
+      - on a domain whose pages were repeatedly fixed by a browser, short pages go
+        to Selenium even when the static HTML shows no sign of client-side rendering;
+      - a domain where the browser repeatedly found no more text than the static
+        page stops falling back.
+    The counters also show how often each domain goes through Selenium.
+    """
+
+    def __init__(self, min_samples=DOMAIN_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._domains = {}
+
+    def _entry(self, domain):
+        return self._domains.setdefault(domain, {
+            "pages": 0,
+            "static": 0,
+            "browser": 0,
+            "selenium_calls": 0,
+            "selenium_useful": 0,
+            "fallbacks_skipped": 0,
+            "http_errors": 0,
+        })
+
+    def record(self, url, event):
+        with self._lock:
+            self._entry(domain_of(url))[event] += 1
+
+    def record_decision(self, url, decision):
+        with self._lock:
+            entry = self._entry(domain_of(url))
+            entry["pages"] += 1
+            entry["browser" if decision.needs_browser else "static"] += 1
+
+    def record_selenium(self, url, static_length, rendered_length, min_text_length=MIN_TEXT_LENGTH):
+        """
+        Record a Selenium render; it was useful if it found enough text the static page lacked.
+        """
+        useful = rendered_length >= min_text_length and rendered_length > static_length
+        with self._lock:
+            entry = self._entry(domain_of(url))
+            entry["selenium_calls"] += 1
+            if useful:
+                entry["selenium_useful"] += 1
+        return useful
+
+    def learned(self, url):
+        """
+        "browser" or "static" once the domain's Selenium outcomes are conclusive, else None.
+        """
+        with self._lock:
+            entry = self._domains.get(domain_of(url))
+            if entry is None or entry["selenium_calls"] < self.min_samples:
+                return None
+            if entry["selenium_useful"] == 0:
+                return "static"
+            if entry["selenium_useful"] == entry["selenium_calls"]:
+                return "browser"
+            return None
+
+    def decide(self, url, html, text_length, min_text_length=MIN_TEXT_LENGTH):
+        """
+        classify_page, overridden by what the domain has taught us.
+        """
+        decision = classify_page(html, text_length, min_text_length)
+        if text_length < min_text_length:
+            learned = self.learned(url)
+            if learned == "static" and decision.needs_browser:
+                decision = RenderDecision(False, f"browser never helped on this domain ({decision.reason})")
+            elif learned == "browser" and not decision.needs_browser:
+                decision = RenderDecision(True, "domain needed a browser before")
+        self.record_decision(url, decision)
+        return decision
+
+    def stats(self):
+        with self._lock:
+            return {domain: dict(entry) for domain, entry in self._domains.items()}
+
+_memory = DomainRenderMemory()
+
+def get_render_memory():
+    """
+    Return the process-wide per-domain render memory.
+    """
+    return _memory
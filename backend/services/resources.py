@@ -0,0 +1,98 @@
+import asyncio
+import inspect
+import logging
+import time
+from typing import Callable, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+class Resource(NamedTuple):
+    name: str
+    start: Callable
+    stop: Optional[Callable]
+    # Started in a task after startup instead of before the app serves requests.
+    background: bool
+    # A failure to start aborts startup; optional resources are logged and retried on first use.
+    required: bool
+
+async def _call(func):
+    # Coroutine functions run on the event loop, blocking ones in a thread.
+    if inspect.iscoroutinefunction(func):
+        return await func()
+    return await asyncio.to_thread(func)
+
+class ResourceRegistry:
+    """
+    The process-wide resources (HTTP client, LLM client, tokenizer, driver pool...)
+    started by the app's lifespan, in the order they were added, and stopped in
+    reverse order. Each module still owns its resource behind its getter: the
+    registry only decides when they are created, so importing the app stays cheap
+    and the first request doesn't pay for them.
+    """
+
+    def __init__(self):
+        self._resources = []
+        self._state = {}
+        self._tasks = []
+
+    def add(self, name, start, stop=None, background=False, required=True):
+        self._resources.append(Resource(name, start, stop, background, required))
+        self._state[name] = {"state": "pending", "seconds": 0.0}
+
+    async def _start(self, resource):
+        state = self._state[resource.name]
+        state["state"] = "starting"
+        started = time.perf_counter()
+        try:
+            await _call(resource.start)
+        except Exception as e:
+            state.update(state="failed", error=str(e), seconds=time.perf_counter() - started)
+            if resource.required:
+                raise
+            logger.warning(f"Could not start {resource.name}, it will be created on first use: {e}")
+            return
+        state.update(state="started", seconds=time.perf_counter() - started)
+        logger.debug(f"Started {resource.name} in {state['seconds']:.3f}s")
+
+    async def start(self):
+        """
+        Start the resources: foreground ones one after the other, background ones in tasks.
+        """
+        for resource in self._resources:
+            if resource.background:
+                self._tasks.append(asyncio.create_task(self._start(resource)))
+            else:
+                await self._start(resource)
+
+    async def stop(self):
+        """
+        Stop the resources in reverse order, including those that failed to start
+        (they may have been created on first use since). Errors are logged, not raised.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        for resource in reversed(self._resources):
+            if resource.stop is None or self._state[resource.name]["state"] == "pending":
+                continue
+            try:
+                await _call(resource.stop)
+            except Exception as e:
+                logger.warning(f"Error stopping {resource.name}: {e}")
+            self._state[resource.name]["state"] = "stopped"
+
+    def stats(self):
+        return {
+            "startup_seconds": round(sum(state["seconds"] for state in self._state.values()), 4),
+            "failed": sum(1 for state in self._state.values() if state["state"] == "failed"),
+            **{name: {**state, "seconds": round(state["seconds"], 4)} for name, state in self._state.items()},
+        }
+
+_registry = ResourceRegistry()
+
+def get_resources():
+    """
+    Return the process-wide resource registry.
+    """
+    return _registry
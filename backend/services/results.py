@@ -0,0 +1,529 @@
+import base64
+import csv
+import io
+import logging
+import json
+import os
+import tempfile
+import threading
+import xml.sax.saxutils as saxutils
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ["csv", "json", "excel", "xml"]
+# Rows rendered per write() call by the streaming writers.
+WRITE_BATCH_ROWS = 10000
+# pandas (and openpyxl for Excel) are imported on the first render, not with this module.
+# The app imports them in the background after startup (0 to wait for the first render instead).
+PRELOAD_OUTPUT_MODULES = os.getenv("PRELOAD_OUTPUT_MODULES", "1") == "1"
+# Results of at least this many rows are rendered into a temporary file and streamed into
+# the response from there, instead of being built as one string (0 to never spill).
+RESULT_SPILL_ROWS = int(os.getenv("RESULT_SPILL_ROWS", "50000"))
+# Directory of the spill files (the system temporary directory by default).
+RESULT_SPILL_DIR = os.getenv("RESULT_SPILL_DIR") or None
+# Rows shown in the HTML preview returned with Excel output (0 for all of them).
+EXCEL_PREVIEW_ROWS = int(os.getenv("EXCEL_PREVIEW_ROWS", "100"))
+# Characters read from a spill file at a time.
+SPILL_READ_CHARS = 1024 * 1024
+
+_import_lock = threading.Lock()
+
+def output_modules(excel=False):
+    """
+    Import pandas (and openpyxl, for Excel) on first use and return pandas. The imports
+    go through one lock: a render must not see openpyxl half-imported by the startup preload.
+    """
+    with _import_lock:
+        import pandas
+        if excel:
+            import openpyxl
+    return pandas
+
+def infer_column(values):
+    """
+    Give a column of CSV strings the types pd.read_csv would: empty strings become
+    missing values, and columns that are entirely numeric become numbers.
+    """
+    pd = output_modules()
+    column = pd.Series([value if value != "" else None for value in values], dtype=object)
+    try:
+        return pd.to_numeric(column)
+    except (ValueError, TypeError):
+        return column
+
+def xml_tag(key):
+    """
+    Turn a column name into an XML element name.
+    """
+    return str(key).replace(" ", "_").replace("(", "").replace(")", "")
+
+def column_key(name):
+    """
+    Normalized column name used to match headers from different chunks ("Book_Title" == "book title").
+    """
+    return " ".join(str(name).replace("_", " ").split()).casefold()
+
+def parse_csv_rows(csv_data):
+    """
+    Parse an LLM CSV response once into (header, rows):
+      1. Blank records and a BOM on the first line are ignored (as are ``` code fences).
+      2. The first record is the header; repeated header records are skipped.
+      3. Only rows with the same number of columns as the header are kept.
+    The whole response goes through one csv.reader, so quoted fields spanning
+    several lines are kept intact. Rows are tuples of stripped strings,
+    with None for empty fields.
+    """
+    text = csv_data.strip().lstrip("\ufeff")
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+    if text.rstrip().endswith("```"):
+        text = text.rstrip()[:-3]
+
+    header = None
+    rows = []
+    try:
+        for record in csv.reader(io.StringIO(text)):
+            fields = [field.strip() for field in record]
+            if not any(fields):
+                continue
+            if header is None:
+                header = tuple(fields)
+                continue
+            if tuple(fields) == header:
+                continue
+            if len(fields) == len(header):
+                rows.append(tuple(field or None for field in fields))
+            else:
+                logger.warning(f"Skipping invalid row: {record} (found {len(fields)} fields, expected {len(header)})")
+    except csv.Error as e:
+        logger.warning(f"Stopped reading CSV response due to parsing error: {e}")
+    return header or (), rows
+
+class ResultTable:
+    """
+    Accumulates row tuples from the parsed chunks and assembles them into a
+    single DataFrame once, instead of growing a DataFrame chunk by chunk.
+
+    Columns are matched by (normalized) header name: the first batch defines the
+    columns, later batches are mapped onto them by name, and names not seen before
+    become new columns (missing in earlier rows). A batch that shares no column
+    name with the table is mapped by position if it has the same width, and
+    skipped otherwise.
+    """
+
+    def __init__(self):
+        self.columns = []
+        self.rows = []
+        self._positions = {}
+        self._frame = None
+        # Chunks whose rows are missing because their LLM call failed.
+        self.failed_chunks = 0
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    def _add_column(self, name):
+        self._positions.setdefault(column_key(name), len(self.columns))
+        self.columns.append(name)
+        return len(self.columns) - 1
+
+    def _map_header(self, header):
+        """
+        Table position of every column of header, or None if the batch can't be placed.
+        """
+        if not self.columns:
+            return [self._add_column(name) for name in header]
+        mapping = [self._positions.get(column_key(name)) for name in header]
+        if all(position is None for position in mapping):
+            if len(header) == len(self.columns):
+                return list(range(len(header)))
+            logger.warning(
+                f"Skipping chunk with unrelated columns. Expected {self.columns}, got {list(header)}"
+            )
+            return None
+        seen = set()
+        for i, position in enumerate(mapping):
+            if position is None or position in seen:
+                mapping[i] = self._add_column(header[i])
+            seen.add(mapping[i])
+        return mapping
+
+    def add_rows(self, header, rows):
+        """
+        Add a batch of row tuples read under the given header. Returns the number of rows added.
+        """
+        rows = [row for row in rows if len(row) == len(header)]
+        if not rows:
+            return 0
+        mapping = self._map_header(header)
+        if mapping is None:
+            return 0
+        if mapping == list(range(len(self.columns))):
+            self.rows.extend(tuple(row) for row in rows)
+        else:
+            width = len(self.columns)
+            for row in rows:
+                placed = [None] * width
+                for value, position in zip(row, mapping):
+                    placed[position] = value
+                self.rows.append(tuple(placed))
+        self._frame = None
+        return len(rows)
+
+    def add_csv(self, csv_text):
+        """
+        Parse a CSV string once and add its rows.
+        """
+        header, rows = parse_csv_rows(csv_text)
+        return self.add_rows(header, rows)
+
+    def extend(self, other):
+        """
+        Append the rows of another table, matching its columns by name.
+        """
+        records = other.to_records()
+        self.add_rows(records["columns"], records["rows"])
+
+    def drop_duplicate_rows(self, key_columns=None):
+        """
+        Remove rows whose key repeats an earlier row's, keeping the first. The key is
+        the values of key_columns (matched by normalized name, unknown names ignored),
+        or the whole row when none are given or none match. Values are compared
+        case- and whitespace-insensitively. Returns the number of rows removed.
+        """
+        positions = [self._positions[column_key(name)] for name in key_columns or () if column_key(name) in self._positions]
+        if key_columns and not positions:
+            logger.warning(f"None of the dedup columns {list(key_columns)} are in the table {self.columns}")
+        width = len(self.columns)
+        seen = set()
+        kept = []
+        for row in self.rows:
+            if positions:
+                values = [row[position] if position < len(row) else None for position in positions]
+            else:
+                values = row + (None,) * (width - len(row))
+            key = tuple(" ".join(value.split()).casefold() if isinstance(value, str) else value for value in values)
+            if key not in seen:
+                seen.add(key)
+                kept.append(row)
+        removed = len(self.rows) - len(kept)
+        if removed:
+            self.rows = kept
+            self._frame = None
+        return removed
+
+    def to_records(self):
+        """
+        JSON-serializable form of the table, for checkpoints.
+        """
+        width = len(self.columns)
+        return {"columns": self.columns, "rows": [row + (None,) * (width - len(row)) for row in self.rows]}
+
+    @classmethod
+    def from_records(cls, records):
+        table = cls()
+        table.add_rows(records["columns"], [tuple(row) for row in records["rows"]])
+        return table
+
+    def to_dataframe(self):
+        """
+        Build the DataFrame once, column by column.
+        """
+        if self._frame is None:
+            pd = output_modules()
+            data = {}
+            for position in range(len(self.columns)):
+                values = [row[position] if position < len(row) else None for row in self.rows]
+                data[position] = infer_column(values)
+            frame = pd.DataFrame(data) if data else pd.DataFrame()
+            frame.columns = self.columns
+            self._frame = frame
+        return self._frame
+
+    ### WRITERS
+
+    def _column_dtypes(self):
+        """
+        The dtype infer_column gives each whole column (None for text), found a batch
+        at a time: a column is numeric if every batch is, and stays int64 only if every
+        batch is (a missing value makes a batch float64, as it would the whole column).
+        """
+        dtypes = [None] * len(self.columns)
+        for start in range(0, self.row_count, WRITE_BATCH_ROWS):
+            batch = self.rows[start:start + WRITE_BATCH_ROWS]
+            for position in range(len(self.columns)):
+                if start and dtypes[position] is None:
+                    continue
+                column = infer_column([row[position] if position < len(row) else None for row in batch])
+                dtype = column.dtype if column.dtype.kind in "iuf" else None
+                if dtype is None or not start:
+                    dtypes[position] = dtype
+                elif dtype != dtypes[position]:
+                    dtypes[position] = "float64"
+        return dtypes
+
+    def _frames(self, limit=None):
+        """
+        The table as DataFrames of WRITE_BATCH_ROWS rows (the first limit rows if given),
+        typed as to_dataframe() would type the whole table. The writers render one batch
+        at a time, so only the rows and one batch are in memory, never the whole frame.
+        """
+        pd = output_modules()
+        dtypes = self._column_dtypes()
+        end = self.row_count if limit is None else min(limit, self.row_count)
+        for start in range(0, end, WRITE_BATCH_ROWS):
+            batch = self.rows[start:min(start + WRITE_BATCH_ROWS, end)]
+            data = {}
+            for position, dtype in enumerate(dtypes):
+                values = [row[position] if position < len(row) else None for row in batch]
+                if dtype is None:
+                    # A text column, even where this batch alone would look numeric (or empty)
+                    data[position] = pd.Series([value if value != "" else None for value in values], dtype=object)
+                else:
+                    data[position] = infer_column(values).astype(dtype)
+            frame = pd.DataFrame(data) if data else pd.DataFrame(index=range(len(batch)))
+            frame.columns = self.columns
+            yield frame
+
+    def write_csv(self, stream):
+        """
+        Stream the table as CSV, WRITE_BATCH_ROWS rows at a time.
+        """
+        header = True
+        for frame in self._frames():
+            frame.to_csv(stream, index=False, header=header)
+            header = False
+        if header:
+            # No rows: just the header line
+            self.to_dataframe().to_csv(stream, index=False)
+
+    def write_xml(self, stream):
+        """
+        Stream the table as <data><item><column>value</column>...</item>...</data>.
+        Values are escaped column by column instead of building an element tree.
+        """
+        tags = [(f"<{xml_tag(name)}>", f"</{xml_tag(name)}>") for name in self.columns]
+
+        stream.write("<data>")
+        for batch in self._frames():
+            columns = [
+                (open_tag, close_tag, batch.iloc[:, position].map(lambda value: saxutils.escape(str(value))).tolist())
+                for position, (open_tag, close_tag) in enumerate(tags)
+            ]
+            stream.write("".join(
+                "<item>" + "".join(open_tag + values[i] + close_tag for open_tag, close_tag, values in columns) + "</item>"
+                for i in range(len(batch))
+            ))
+        stream.write("</data>")
+
+    def write_json(self, stream):
+        """
+        Stream the table as pandas' records JSON (indent 4), WRITE_BATCH_ROWS rows at a time.
+        """
+        stream.write("[\n")
+        for i, frame in enumerate(self._frames()):
+            # Each batch renders as "[\n    {...},\n    {...}\n]": keep the records between the brackets.
+            stream.write((",\n" if i else "") + frame.to_json(orient="records", indent=4)[2:-2])
+        stream.write("\n]")
+
+    def to_json(self):
+        buffer = io.StringIO()
+        self.write_json(buffer)
+        return buffer.getvalue()
+
+    def write_excel(self, stream):
+        """
+        Write the table as an .xlsx workbook (the sheet pandas' to_excel wrote) to a binary
+        stream. openpyxl's write-only mode streams the rows out WRITE_BATCH_ROWS at a time
+        instead of keeping a cell object per value.
+        """
+        output_modules(excel=True)
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Sheet1")
+        sheet.append([str(name) for name in self.columns])
+        for batch in self._frames():
+            # Missing values become empty cells, numpy scalars plain Python values
+            columns = [
+                batch.iloc[:, position].astype(object).where(batch.iloc[:, position].notna(), None).tolist()
+                for position in range(len(self.columns))
+            ]
+            for row in zip(*columns):
+                sheet.append(row)
+        workbook.save(stream)
+
+    def to_excel_bytes(self):
+        excel_file = io.BytesIO()
+        self.write_excel(excel_file)
+        return excel_file.getvalue()
+
+    def excel_preview(self):
+        """
+        HTML table of the first EXCEL_PREVIEW_ROWS rows, shown by the extension.
+        """
+        pd = output_modules()
+        frames = list(self._frames(EXCEL_PREVIEW_ROWS or None))
+        frame = pd.concat(frames) if frames else self.to_dataframe()
+        return frame.to_html(
+            index=False,
+            escape=False,
+            classes="table table-bordered table-striped"
+        )
+
+    def render(self, output_format, spill=None):
+        """
+        Convert the table to the requested output format.
+        Returns a dict with "data" (and "preview" for Excel).
+        With spill (by default, when the table has RESULT_SPILL_ROWS rows or more) "data"
+        is a SpilledOutput holding the rendered text in a temporary file.
+        """
+        if spill is None:
+            spill = bool(RESULT_SPILL_ROWS) and self.row_count >= RESULT_SPILL_ROWS
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Invalid output format: {output_format}")
+        if spill:
+            return self._render_spilled(output_format)
+        if output_format == "csv":
+            buffer = io.StringIO()
+            self.write_csv(buffer)
+            return {"data": buffer.getvalue()}
+        elif output_format == "json":
+            return {"data": self.to_json()}
+        elif output_format == "excel":
+            encoded_excel = base64.b64encode(self.to_excel_bytes()).decode("utf-8")
+            return {"data": encoded_excel, "preview": self.excel_preview()}
+        buffer = io.StringIO()
+        self.write_xml(buffer)
+        return {"data": buffer.getvalue()}
+
+    def _render_spilled(self, output_format):
+        output = SpilledOutput.create()
+        try:
+            with open(output.path, "w", encoding="utf-8", newline="") as stream:
+                if output_format == "csv":
+                    self.write_csv(stream)
+                elif output_format == "json":
+                    self.write_json(stream)
+                elif output_format == "xml":
+                    self.write_xml(stream)
+                else:
+                    # Base64 of the workbook, encoded a block at a time (a multiple of 3 bytes,
+                    # so the blocks' encodings join into the encoding of the whole file)
+                    with tempfile.TemporaryFile(dir=RESULT_SPILL_DIR) as workbook:
+                        self.write_excel(workbook)
+                        workbook.seek(0)
+                        while block := workbook.read(3 * SPILL_READ_CHARS // 4):
+                            stream.write(base64.b64encode(block).decode("ascii"))
+        except BaseException:
+            output.close()
+            raise
+        output.size = os.path.getsize(output.path)
+        result = {"data": output}
+        if output_format == "excel":
+            result["preview"] = self.excel_preview()
+        return result
+
+class SpilledOutput:
+    """
+    Rendered output kept in a temporary file instead of a string, for large results:
+    it is streamed into the response (see json_chunks) and removed once sent, or when
+    the object is garbage collected. Only the path is pickled, so a CPU worker process
+    can render a result and hand the file over to the server.
+    """
+
+    def __init__(self, path, size=0):
+        self.path = path
+        self.size = size
+        self._owned = True
+
+    @classmethod
+    def create(cls):
+        descriptor, path = tempfile.mkstemp(prefix="scraper-output-", suffix=".txt", dir=RESULT_SPILL_DIR)
+        os.close(descriptor)
+        return cls(path)
+
+    def __getstate__(self):
+        # The process unpickling the output owns the file from now on.
+        self._owned = False
+        return {"path": self.path, "size": self.size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _owned=True)
+
+    def chunks(self, size=SPILL_READ_CHARS):
+        with open(self.path, encoding="utf-8", newline="") as stream:
+            while chunk := stream.read(size):
+                yield chunk
+
+    def read(self):
+        with open(self.path, encoding="utf-8", newline="") as stream:
+            return stream.read()
+
+    def json_chunks(self):
+        """
+        The output as a JSON string, encoded a chunk at a time.
+        """
+        yield '"'
+        for chunk in self.chunks():
+            yield json.dumps(chunk)[1:-1]
+        yield '"'
+
+    def close(self):
+        if self._owned:
+            self._owned = False
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __del__(self):
+        self.close()
+
+def output_size(data):
+    """
+    Size of a rendered output's "data", whether a string or a SpilledOutput (in bytes).
+    """
+    return data.size if isinstance(data, SpilledOutput) else len(data)
+
+def json_chunks(content):
+    """
+    Encode a response dict as JSON piece by piece, streaming SpilledOutput values from
+    their files. The spill files are removed once sent (or if the client goes away).
+    """
+    try:
+        yield "{"
+        for i, (key, value) in enumerate(content.items()):
+            yield ("," if i else "") + json.dumps(key) + ":"
+            if isinstance(value, SpilledOutput):
+                yield from value.json_chunks()
+            else:
+                yield json.dumps(value)
+        yield "}"
+    finally:
+        for value in content.values():
+            if isinstance(value, SpilledOutput):
+                value.close()
+
+def load_output_modules():
+    """
+    Import the modules the output formats need ahead of the first render.
+    """
+    if PRELOAD_OUTPUT_MODULES:
+        output_modules(excel=True)
+
+def merge_and_render(tables_records, output_format, dedup_columns=None, dedup=True):
+    """
+    Merge per-URL tables given as to_records() dicts (columns matched by name), drop
+    duplicate rows if dedup (see drop_duplicate_rows) and render the result. Plain data
+    in and out, so it can run in a CPU worker process.
+    Returns (output, row count, rows removed); output is None when no row is left.
+    """
+    table = ResultTable()
+    for records in tables_records:
+        table.add_rows(records["columns"], [tuple(row) for row in records["rows"]])
+    removed = table.drop_duplicate_rows(dedup_columns) if dedup else 0
+    if table.row_count == 0:
+        return None, 0, removed
+    return table.render(output_format), table.row_count, removed
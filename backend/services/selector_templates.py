@@ -0,0 +1,386 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import lxml.etree
+import lxml.html
+
+from backend.services.page_cache import description_key
+from backend.services.render_detect import domain_of
+from backend.services.results import ResultTable
+from backend.services.workers import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+SELECTOR_TEMPLATES_ENABLED = os.getenv("SELECTOR_TEMPLATES_ENABLED", "0") == "1"
+SELECTOR_TEMPLATES_PATH = os.getenv("SELECTOR_TEMPLATES_PATH", os.path.join("cache", "selector_templates.sqlite3"))
+# Rows an LLM extraction needs before a template is learned from it.
+TEMPLATE_MIN_ROWS = int(os.getenv("SELECTOR_TEMPLATE_MIN_ROWS", "3"))
+# Share of the LLM's rows the template must reproduce (and of its own rows the LLM must have found).
+TEMPLATE_MIN_AGREEMENT = float(os.getenv("SELECTOR_TEMPLATE_MIN_AGREEMENT", "0.9"))
+# Share of a column's values that must keep the learned shape (number or text) on later pages.
+TEMPLATE_MIN_SHAPE_MATCH = float(os.getenv("SELECTOR_TEMPLATE_MIN_SHAPE_MATCH", "0.8"))
+
+# Attributes whose values can hold a field (links, image sources, tooltips, dates).
+VALUE_ATTRIBUTES = ("href", "src", "title", "alt", "datetime", "content", "value")
+NUMBER_PATTERN = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+def normalize_text(value):
+    return " ".join(str(value).split())
+
+def parse_number(value):
+    """
+    The number in a value like "£51.77" or "1,200 reviews", as a string, or None.
+    """
+    match = NUMBER_PATTERN.search(value)
+    return match.group(0).replace(",", "") if match else None
+
+def is_number(value):
+    return re.fullmatch(r"[^\d-]{0,3}-?\d[\d,]*(?:\.\d+)?[^\d]{0,3}", value.strip()) is not None
+
+def parse_body(html):
+    document = lxml.html.document_fromstring(html)
+    body = document.find("body")
+    return body if body is not None else document
+
+### PATHS
+
+def _class_predicate(element):
+    classes = (element.get("class") or "").split()
+    if not classes or "'" in classes[0]:
+        return ""
+    return f"[contains(concat(' ', normalize-space(@class), ' '), ' {classes[0]} ')]"
+
+def _step(element, positional):
+    step = element.tag + _class_predicate(element)
+    if positional:
+        parent = element.getparent()
+        if parent is not None:
+            similar = parent.xpath("./" + step)
+            if len(similar) > 1:
+                step += f"[{similar.index(element) + 1}]"
+    return step
+
+def _path(element, ancestor, positional):
+    """
+    XPath from ancestor down to element (".") if they are the same.
+    """
+    steps = []
+    while element is not ancestor:
+        steps.append(_step(element, positional))
+        element = element.getparent()
+    return "/".join(reversed(steps)) or "."
+
+def _shortest_record_path(body, path):
+    """
+    The shortest ".//a/b" suffix of a record path that selects the same elements,
+    so page chrome around the records (sidebars, wrappers) can change between pages.
+    """
+    full = "./" + path
+    if path == ".":
+        return full
+    records = body.xpath(full)
+    steps = path.split("/")
+    for size in range(1, len(steps)):
+        candidate = ".//" + "/".join(steps[-size:])
+        if body.xpath(candidate) == records:
+            return candidate
+    return full
+
+def _ancestors(element):
+    chain = []
+    while element is not None:
+        chain.append(element)
+        element = element.getparent()
+    return chain
+
+def _common_ancestor(elements):
+    common = None
+    for element in elements:
+        chain = _ancestors(element)
+        if common is None:
+            common = chain
+        else:
+            members = set(chain)
+            common = [ancestor for ancestor in common if ancestor in members]
+    return common[0] if common else None
+
+def _distance(a, b):
+    chain_a = _ancestors(a)
+    chain_b = _ancestors(b)
+    members = set(chain_b)
+    for steps_a, ancestor in enumerate(chain_a):
+        if ancestor in members:
+            return steps_a + chain_b.index(ancestor)
+    return len(chain_a) + len(chain_b)
+
+### LEARNING
+
+class _PageIndex:
+    """
+    Elements of a page by normalized text and by attribute value.
+    """
+
+    def __init__(self, body):
+        self.texts = {}
+        self.attributes = {}
+        self.elements = []
+        for element in body.iter(lxml.etree.Element):
+            text = normalize_text(element.text_content())
+            # Numbers are only looked up in an element's own text, so the record doesn't match its price
+            own_text = normalize_text(" ".join(element.xpath("text()")))
+            if own_text:
+                self.elements.append((element, own_text))
+            if text:
+                self.texts.setdefault(text, []).append(element)
+            for attribute in VALUE_ATTRIBUTES:
+                value = element.get(attribute)
+                if value:
+                    self.attributes.setdefault(normalize_text(value), []).append((element, attribute))
+
+    def candidates(self, value):
+        """
+        (element, attribute, mode) places a value could have been read from, most specific first.
+        """
+        value = normalize_text(value)
+        if value in self.texts:
+            # Innermost elements come last in document order
+            return [(element, None, "text") for element in reversed(self.texts[value])]
+        if value in self.attributes:
+            return [(element, attribute, "text") for element, attribute in self.attributes[value]]
+        number = parse_number(value) if is_number(value) else None
+        if number is not None:
+            found = [
+                element for element, own_text in self.elements
+                if len(own_text) < 200 and parse_number(own_text) == number
+            ]
+            return [(element, None, "number") for element in reversed(found)]
+        return []
+
+def _place_row(index, row):
+    """
+    Pick one candidate per column for a row: anchor on the most distinctive value,
+    then take the candidates closest to it. Returns {column: (element, attribute, mode)}.
+    """
+    options = {}
+    for position, value in enumerate(row):
+        if value is None or value == "":
+            continue
+        found = index.candidates(value)[:50]
+        if found:
+            options[position] = found
+    if not options:
+        return {}
+    anchor_position = min(options, key=lambda position: len(options[position]))
+    anchor = options[anchor_position][0][0]
+    placed = {anchor_position: options[anchor_position][0]}
+    for position, found in options.items():
+        if position != anchor_position:
+            placed[position] = min(found, key=lambda candidate: _distance(anchor, candidate[0]))
+    return placed
+
+def learn_template(html, columns, rows):
+    """
+    Find the repeating record element and the per-column field selectors that
+    reproduce the LLM's rows on this page. Returns the template (a JSON-able
+    dict), or None if no template reproduces the rows closely enough.
+    """
+    if len(rows) < TEMPLATE_MIN_ROWS:
+        return None
+    body = parse_body(html)
+    index = _PageIndex(body)
+
+    record_paths = Counter()
+    field_paths = [Counter() for _ in columns]
+    for row in rows:
+        placed = _place_row(index, row)
+        if not placed:
+            continue
+        elements = [candidate[0] for candidate in placed.values()]
+        record = _common_ancestor(elements) if len(elements) > 1 else elements[0]
+        if record is None:
+            continue
+        record_paths[_path(record, body, positional=False)] += 1
+        for position, (element, attribute, mode) in placed.items():
+            if record in _ancestors(element):
+                field_paths[position][(_path(element, record, positional=True), attribute, mode)] += 1
+    if not record_paths:
+        return None
+
+    record_path, record_count = record_paths.most_common(1)[0]
+    if record_count < TEMPLATE_MIN_AGREEMENT * len(rows):
+        logger.info(f"No common record structure ({record_count}/{len(rows)} rows share {record_path})")
+        return None
+    fields = []
+    for column, paths in zip(columns, field_paths):
+        if not paths:
+            fields.append(None)
+            continue
+        (path, attribute, mode), _ = paths.most_common(1)[0]
+        fields.append({"path": path, "attribute": attribute, "mode": mode})
+
+    template = {
+        "record": _shortest_record_path(body, record_path),
+        "columns": list(columns),
+        "fields": fields,
+        "shapes": [],
+        "fill": [],
+        "learned_rows": len(rows),
+    }
+    for position in range(len(columns)):
+        values = [row[position] for row in rows if row[position] not in (None, "")]
+        template["fill"].append(len(values) / len(rows))
+        numeric = values and sum(is_number(value) for value in values) >= 0.9 * len(values)
+        template["shapes"].append("number" if numeric else "text")
+
+    extracted = extract_rows(body, template)
+    expected = {tuple(normalize_text(value) if value is not None else "" for value in row) for row in rows}
+    found = {tuple(value or "" for value in row) for row in extracted}
+    matched = len(expected & found)
+    recall = matched / len(expected) if expected else 0.0
+    precision = matched / len(found) if found else 0.0
+    if recall < TEMPLATE_MIN_AGREEMENT or precision < TEMPLATE_MIN_AGREEMENT:
+        logger.info(f"Template rejected: reproduces {recall:.0%} of the LLM rows at {precision:.0%} precision")
+        return None
+    template["agreement"] = round(min(recall, precision), 3)
+    return template
+
+### EXTRACTION
+
+def _field_value(record, field):
+    if field is None:
+        return None
+    matches = [record] if field["path"] == "." else record.xpath(field["path"])
+    if not matches:
+        return None
+    element = matches[0]
+    if field["attribute"]:
+        value = element.get(field["attribute"])
+    else:
+        value = element.text_content()
+    value = normalize_text(value) if value else ""
+    if field["mode"] == "number":
+        value = parse_number(value) or ""
+    return value or None
+
+def extract_rows(body, template):
+    rows = []
+    for record in body.xpath(template["record"]):
+        row = tuple(_field_value(record, field) for field in template["fields"])
+        if any(value is not None for value in row):
+            rows.append(row)
+    return rows
+
+def validate_rows(template, rows):
+    """
+    Check extracted rows against the learned schema. Returns None if they fit, or the reason they don't.
+    """
+    if not rows:
+        return "no records found"
+    for position, column in enumerate(template["columns"]):
+        values = [row[position] for row in rows if row[position] is not None]
+        fill = len(values) / len(rows)
+        if fill < template["fill"][position] - 0.2:
+            return f"column {column!r} filled in {fill:.0%} of records (learned {template['fill'][position]:.0%})"
+        if template["shapes"][position] == "number" and values:
+            numeric = sum(is_number(value) for value in values) / len(values)
+            if numeric < TEMPLATE_MIN_SHAPE_MATCH:
+                return f"column {column!r} is numeric in only {numeric:.0%} of records"
+    return None
+
+def apply_template(html, template):
+    """
+    Extract a page with a learned template. Returns a ResultTable, or None if the
+    rows don't validate against the template's schema (the caller falls back to the LLM).
+    """
+    try:
+        rows = extract_rows(parse_body(html), template)
+    except Exception as e:
+        logger.warning(f"Template extraction failed: {e}")
+        return None
+    problem = validate_rows(template, rows)
+    if problem is not None:
+        logger.info(f"Template validation failed: {problem}")
+        return None
+    table = ResultTable()
+    table.add_rows(tuple(template["columns"]), rows)
+    return table
+
+### STORE
+
+class TemplateStore:
+    """
+    Learned templates in SQLite, one per (domain, parse description), with hit and fallback counters.
+    """
+
+    def __init__(self, path=SELECTOR_TEMPLATES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS selector_templates ("
+            " domain TEXT NOT NULL, description TEXT NOT NULL, template TEXT NOT NULL,"
+            " created_at REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0, fallbacks INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (domain, description))"
+        )
+        self._conn.commit()
+
+    def get(self, url, parse_description):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT template FROM selector_templates WHERE domain = ? AND description = ?",
+                (domain_of(url), description_key(parse_description)),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, url, parse_description, template):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO selector_templates (domain, description, template, created_at)"
+                " VALUES (?, ?, ?, ?)",
+                (domain_of(url), description_key(parse_description), json.dumps(template), time.time()),
+            )
+            self._conn.commit()
+
+    def record(self, url, parse_description, event):
+        """
+        Count a "hits" (page extracted by the template) or "fallbacks" (sent to the LLM) event.
+        """
+        column = {"hits": "hits", "fallbacks": "fallbacks"}[event]
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE selector_templates SET {column} = {column} + 1 WHERE domain = ? AND description = ?",
+                (domain_of(url), description_key(parse_description)),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM selector_templates")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT domain, COUNT(*), SUM(hits), SUM(fallbacks) FROM selector_templates GROUP BY domain"
+            ).fetchall()
+        return {domain: {"templates": count, "hits": hits, "fallbacks": fallbacks} for domain, count, hits, fallbacks in rows}
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_template_store():
+    """
+    Return the process-wide template store, or None when SELECTOR_TEMPLATES_ENABLED is off.
+    """
+    global _store
+    if not SELECTOR_TEMPLATES_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = TemplateStore()
+        return _store
@@ -0,0 +1,135 @@
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Web worker processes serving the API (python -m backend.serve, or gunicorn -w). Per-process
+# budgets such as the Groq rate limits are divided by it, and the caches skip their memory tiers.
+WEB_WORKERS = max(1, int(os.getenv("WEB_WORKERS", "1")))
+# Identifies one run of the server across its worker processes (set by backend.serve), so a
+# worker only resumes the background jobs of a previous run or of a worker that died.
+SERVER_INSTANCE_ID = os.getenv("SERVER_INSTANCE_ID") or uuid.uuid4().hex
+# Processes running the CPU-bound stages (cleaning, chunking, merging) in each web worker:
+# "auto" to share the cores between the web workers (at least one each), 0 to run them in
+# threads of the serving process.
+CPU_WORKERS = os.getenv("CPU_WORKERS", "0")
+# Pages smaller than this are still cleaned and chunked in a thread: sending them to a
+# process costs more than it saves.
+CPU_POOL_MIN_BYTES = int(os.getenv("CPU_POOL_MIN_BYTES", "20000"))
+# Results with fewer rows are merged and rendered in a thread.
+CPU_POOL_MIN_ROWS = int(os.getenv("CPU_POOL_MIN_ROWS", "2000"))
+# Seconds a SQLite store waits for another process's write lock before failing.
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+
+### SHARED SQLITE STORES
+
+def connect_sqlite(path):
+    """
+    Open a SQLite store that several worker processes can share: WAL journaling lets
+    readers run alongside the single writer, and writers wait up to SQLITE_BUSY_TIMEOUT
+    for each other instead of failing with "database is locked".
+    """
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT)
+    if path != ":memory:":
+        conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only risks the last transactions on power loss, never corruption.
+        conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def worker_owner():
+    """
+    Owner tag of this process for the rows it claims in a shared store.
+    """
+    return f"{SERVER_INSTANCE_ID}:{os.getpid()}"
+
+def owner_alive(owner):
+    """
+    Whether the process that tagged a row with worker_owner() is still running in this server run.
+    """
+    instance, _, pid = (owner or "").rpartition(":")
+    if instance != SERVER_INSTANCE_ID or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+### CPU PROCESS POOL
+
+def cpu_pool_size():
+    if CPU_WORKERS == "auto":
+        return max(1, (os.cpu_count() or 1) // WEB_WORKERS)
+    return max(0, int(CPU_WORKERS))
+
+def timed_call(func, *args):
+    """
+    Run func and return (result, CPU time of the calling thread).
+    """
+    start = time.thread_time()
+    result = func(*args)
+    return result, time.thread_time() - start
+
+def _warm_worker():
+    # Load the tokenizer once per process rather than on its first chunk.
+    from backend.services.parse import get_encoding
+    try:
+        get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Could not load the tokenizer in a CPU worker: {e}")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_cpu_pool():
+    """
+    Return the process pool for the CPU-bound stages, or None when CPU_WORKERS is 0.
+    Workers are spawned, not forked: the serving process has threads (and an event loop)
+    that a fork would copy in an unknown state.
+    """
+    global _pool
+    size = cpu_pool_size()
+    if size <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=size, mp_context=multiprocessing.get_context("spawn"), initializer=_warm_worker
+            )
+            logger.info(f"Started {size} CPU worker process(es)")
+        return _pool
+
+def shutdown_cpu_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+def offload(size=None, rows=None):
+    """
+    Whether a page of size bytes (or characters), or a result of rows rows, should go to the CPU pool.
+    """
+    large = size >= CPU_POOL_MIN_BYTES if rows is None else rows >= CPU_POOL_MIN_ROWS
+    return large and get_cpu_pool() is not None
+
+def cpu_call(func, *args):
+    """
+    Run a CPU-bound function in the pool when there is one, else in the calling thread.
+    Blocking: call it from a worker thread. Arguments and results cross the process
+    boundary pickled, so pass plain strings, tuples and lists, not parsed trees.
+    """
+    pool = get_cpu_pool()
+    if pool is None:
+        return func(*args)
+    return pool.submit(func, *args).result()
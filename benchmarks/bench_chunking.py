@@ -0,0 +1,91 @@
+"""
+Micro-benchmark of token_aware_split against the previous re-encoding implementation.
+
+    python -m benchmarks.bench_chunking [--all]
+
+The previous implementation re-encodes the growing chunk for every paragraph and
+takes minutes on 10 MB, so it only runs on the 1 MB input unless --all is given.
+"""
+import random
+import sys
+import time
+
+import tiktoken
+
+from backend.services.parse import get_encoding, token_aware_split
+
+def old_token_aware_split(text, max_tokens=500, encoding_name="cl100k_base"):
+    # The implementation token_aware_split replaced, including the per-call get_encoding.
+    def count_tokens(value):
+        return len(tiktoken.get_encoding(encoding_name).encode(value))
+
+    paragraphs = text.splitlines()
+    chunks = []
+    current_chunk = ""
+    for para in paragraphs:
+        candidate = current_chunk + "\n" + para if current_chunk else para
+        if count_tokens(candidate) > max_tokens:
+            if current_chunk:
+                chunks.append(current_chunk)
+                current_chunk = para
+            else:
+                temp_chunk = ""
+                for word in para.split():
+                    candidate_word = temp_chunk + " " + word if temp_chunk else word
+                    if count_tokens(candidate_word) > max_tokens:
+                        if temp_chunk:
+                            chunks.append(temp_chunk)
+                        temp_chunk = word
+                    else:
+                        temp_chunk = candidate_word
+                if temp_chunk:
+                    chunks.append(temp_chunk)
+                current_chunk = ""
+        else:
+            current_chunk = candidate
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+def sample_text(size_bytes, seed=0):
+    """
+    Page-like text: short lines (titles, prices) mixed with longer descriptions.
+    """
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(2000)] + ["In", "stock", "£", "Add", "to", "basket"]
+    lines = []
+    size = 0
+    while size < size_bytes:
+        length = rng.choice((1, 2, 3, 5, 8, 40))
+        line = " ".join(rng.choice(vocabulary) for _ in range(length))
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    run_old_everywhere = "--all" in sys.argv
+    get_encoding("cl100k_base")  # load the encoder outside the timings
+
+    print(f"{'input':>6} {'old s':>9} {'new s':>9} {'overlap s':>10} {'chunks old/new':>15} {'same':>5}")
+    for megabytes in (1, 10):
+        text = sample_text(megabytes * 1_000_000)
+        new_chunks, new_seconds = timed(token_aware_split, text, 500)
+        _, overlap_seconds = timed(token_aware_split, text, 500, overlap_tokens=50)
+        if megabytes == 1 or run_old_everywhere:
+            old_chunks, old_seconds = timed(old_token_aware_split, text, 500)
+            old_column = f"{old_seconds:>9.2f}"
+            chunks_column = f"{len(old_chunks)}/{len(new_chunks)}"
+            same_column = "yes" if old_chunks == new_chunks else "no"
+        else:
+            old_column = f"{'skipped':>9}"
+            chunks_column = f"-/{len(new_chunks)}"
+            same_column = "-"
+        print(f"{megabytes:>4}MB {old_column} {new_seconds:>9.2f} {overlap_seconds:>10.2f} {chunks_column:>15} {same_column:>5}")
+
+if __name__ == "__main__":
+    main()
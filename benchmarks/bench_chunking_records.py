@@ -0,0 +1,91 @@
+"""
+Compare the two chunking modes of the pipeline (CHUNK_MODE): page text split on
+lines ("text") and compact markup that keeps DOM records whole ("records").
+
+    python -m benchmarks.bench_chunking_records [max_tokens] [pages_dir]
+
+For each page: chunks and tokens sent to the LLM, rows the mock model extracts
+and tokens per row, records cut across two chunks (no chunk holds both their title
+and price), and records whose full title (the title attribute of their link, which
+the visible text often truncates) reaches the model. Recorded snapshots only get
+the first columns, since their records are not known.
+"""
+import html
+import sys
+import time
+
+import lxml.html
+
+from backend.services.parse import estimate_call_tokens, split_dom_records, token_aware_split
+from backend.services.scrape import clean_page
+from benchmarks.bench_relevance import mock_rows, padded_page
+from benchmarks.bench_templates import fixture
+from benchmarks.local_server import sample_page
+from benchmarks.record_pages import DEFAULT_PAGES_DIR, load_pages
+
+DESCRIPTION = "Extract the product names and prices"
+# Records of the generated and fixture pages, and the price inside a record.
+RECORD_XPATH = "//article | //div[@class='product']"
+PRICE_XPATH = ".//p[contains(@class, 'price')]"
+
+def page_records(raw_html):
+    """
+    (full title, visible title, price) of every record of a page.
+    """
+    records = []
+    for element in lxml.html.document_fromstring(raw_html).xpath(RECORD_XPATH):
+        link = element.find(".//h3/a")
+        price = element.xpath(PRICE_XPATH)
+        if link is None or not price:
+            continue
+        visible = link.text_content().strip()
+        records.append((link.get("title") or visible, visible, price[0].text_content().strip()))
+    return records
+
+def chunk(mode, page, max_tokens):
+    if mode == "records":
+        return split_dom_records(page.html, max_tokens)
+    return token_aware_split(page.text, max_tokens)
+
+def measure(name, raw_html, max_tokens):
+    page = clean_page(raw_html)
+    records = page_records(raw_html)
+    for mode in ("text", "records"):
+        start = time.perf_counter()
+        chunks = chunk(mode, page, max_tokens)
+        elapsed = (time.perf_counter() - start) * 1000
+        tokens = sum(estimate_call_tokens(chunk, DESCRIPTION) for chunk in chunks)
+        rows = len(mock_rows(chunks))
+        per_row = f"{tokens / rows:.0f}" if rows else "-"
+        texts = [html.unescape(chunk) for chunk in chunks]
+        if records:
+            split = sum(1 for _, visible, price in records if not any(visible in text and price in text for text in texts))
+            full = sum(1 for title, _, _ in records if any(title in text for text in texts))
+            record_columns = f"{split:>5}/{len(records):<4} {full / len(records):>6.0%}"
+        else:
+            record_columns = f"{'-':>10} {'-':>6}"
+        print(
+            f"{name[:26]:<26} {mode:<8} {len(chunks):>6} {tokens:>7} {rows:>5} {per_row:>7} "
+            f"{record_columns} {elapsed:>7.1f}"
+        )
+
+def main():
+    max_tokens = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    pages_dir = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_PAGES_DIR
+    print(
+        f"{'page':<26} {'mode':<8} {'chunks':>6} {'tokens':>7} {'rows':>5} {'tok/row':>7} "
+        f"{'split':>10} {'titles':>6} {'ms':>7}"
+    )
+    pages = {
+        "books_page1": fixture("books_page1.html"),
+        "books_page2": fixture("books_page2.html"),
+        "books_redesigned": fixture("books_redesigned.html"),
+        "products": sample_page(150),
+        "products + boilerplate": padded_page(),
+    }
+    pages.update(load_pages(pages_dir))
+    for name, raw_html in pages.items():
+        measure(name, raw_html, max_tokens)
+
+if __name__ == "__main__":
+    main()
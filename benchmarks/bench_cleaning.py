@@ -0,0 +1,71 @@
+"""
+Compare the old multi-parse cleaning chain with the single-parse clean_page.
+
+    python -m benchmarks.record_pages      # once, to save the testing_sites pages
+    python -m benchmarks.bench_cleaning [pages_dir]
+
+Falls back to generated listing pages when no snapshots were recorded.
+"""
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from backend.services.scrape import BLACKLISTED_ATTRIBUTES, BLACKLISTED_TAGS, clean_page
+from benchmarks.local_server import sample_page
+from benchmarks.record_pages import DEFAULT_PAGES_DIR, load_pages
+
+def old_clean(html):
+    # What the old chain did: check the body's text length, extract the body,
+    # clean it and parse it once more for its text, four BeautifulSoup parses.
+    body = BeautifulSoup(html, "html.parser").body
+    body is not None and len(body.get_text(strip=True))
+    body = BeautifulSoup(html, "html.parser").body
+    body = str(body) if body else ""
+    soup = BeautifulSoup(body, "html.parser")
+    for tag in soup(BLACKLISTED_TAGS):
+        tag.extract()
+    for tag in soup.find_all(True):
+        for attribute in list(tag.attrs):
+            if attribute in BLACKLISTED_ATTRIBUTES or attribute.startswith("data-"):
+                del tag.attrs[attribute]
+    cleaned = str(soup)
+    return BeautifulSoup(cleaned, "html.parser").get_text(separator="\n")
+
+def new_clean(html):
+    return clean_page(html).text
+
+def throughput(func, pages, min_seconds=1.0):
+    """
+    MB/s of page input processed by func.
+    """
+    total_bytes = sum(len(html.encode("utf-8")) for html in pages)
+    rounds = 0
+    start = time.perf_counter()
+    while True:
+        for html in pages:
+            func(html)
+        rounds += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return total_bytes * rounds / elapsed / 1e6
+
+def main():
+    pages_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PAGES_DIR
+    pages = load_pages(pages_dir)
+    if not pages:
+        print(f"No snapshots in {pages_dir}; using generated listing pages.")
+        pages = {f"generated_{n}.html": sample_page(n) for n in (50, 500, 5000)}
+
+    print(f"{'page':<48} {'KB':>8} {'old MB/s':>9} {'new MB/s':>9}")
+    for name, html in pages.items():
+        old_rate = throughput(old_clean, [html])
+        new_rate = throughput(new_clean, [html])
+        print(f"{name[:48]:<48} {len(html) / 1024:>8.0f} {old_rate:>9.2f} {new_rate:>9.2f}")
+
+    old_rate = throughput(old_clean, list(pages.values()))
+    new_rate = throughput(new_clean, list(pages.values()))
+    print(f"{'all pages':<48} {'':>8} {old_rate:>9.2f} {new_rate:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Crawl a local multi-page fixture site and check the crawler's guarantees.
+
+    python -m benchmarks.bench_crawl [catalogue_pages] [max_pages]
+
+The site is a paginated catalogue (20 products a page, a "next" pager, product
+links, links back to earlier pages and to the first page under a second URL)
+with one detail page per product and a robots.txt disallowing /private/, which
+every catalogue page links to. The crawl follows the pager and the /product/
+and /private/ links one level deep, against the deterministic mock chat API.
+
+For a few politeness settings it reports the pages crawled and their statuses,
+rows, LLM calls, time, the smallest gap between two fetches of the site and the
+most fetches in flight at once, and checks that no page was fetched twice, that
+robots.txt was read once and honoured, and that every catalogue product reached
+the results.
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("GROQ_RPM", "100000")
+os.environ.setdefault("GROQ_TPM", "100000000")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+os.environ.setdefault("PAGE_CACHE_ENABLED", "0")
+
+from langchain_groq import ChatGroq
+
+from backend.services import crawler, fetcher, parse
+from backend.services.crawler import crawl, get_robots_cache
+from backend.services.llm_dispatcher import TokenUsage
+from backend.services.results import ResultTable
+from benchmarks.local_server import PageHandler, start_server
+from benchmarks.mock_llm_server import start_mock_llm
+
+DESCRIPTION = "Extract the product names and prices"
+PER_PAGE = 20
+LINK_PATTERN = r"/(product|private)/"
+ROBOTS = "User-agent: *\nDisallow: /private/\n"
+
+def catalogue_page(page, pages):
+    products = "".join(
+        f"<article class='product'><h3><a href='/product/{i}.html'>Product {i}</a></h3>"
+        f"<p class='price'>${i % 97}.99</p></article>"
+        for i in range((page - 1) * PER_PAGE, page * PER_PAGE)
+    )
+    pager = "".join(f"<li><a href='/catalogue/page-{n}.html'>{n}</a></li>" for n in range(1, page))
+    if page < pages:
+        pager += f"<li class='next'><a href='/catalogue/page-{page + 1}.html'>next</a></li>"
+    return (
+        "<html><head><title>Catalogue</title></head><body>"
+        "<nav><a href='/catalogue/'>All products</a> <a href='/private/offers.html'>Staff offers</a>"
+        "<a href='#top'>Top</a></nav>"
+        f"<main>{products}</main><ul class='pager'>{pager}</ul></body></html>"
+    )
+
+def product_page(i):
+    return (
+        f"<html><body><h1>Product {i}</h1><p class='price'>${i % 97}.99</p>"
+        f"<p>Description of product {i}, shipped in two days.</p>"
+        f"<a href='/product/{i + 1}.html'>Related product</a> <a href='/catalogue/page-1.html'>Back</a>"
+        "</body></html>"
+    )
+
+def fixture_site(pages):
+    site = {f"/catalogue/page-{n}.html": catalogue_page(n, pages) for n in range(1, pages + 1)}
+    site["/catalogue/"] = site["/catalogue/page-1.html"]
+    site.update({f"/product/{i}.html": product_page(i) for i in range(pages * PER_PAGE)})
+    site["/private/offers.html"] = "<html><body>Staff only</body></html>"
+    site["/robots.txt"] = ROBOTS
+    return site
+
+class LoggingHandler(PageHandler):
+    """
+    PageHandler logging (path, start, end) of every request it serves.
+    """
+    log = None
+
+    def do_GET(self):
+        start = time.monotonic()
+        super().do_GET()
+        self.log.append((self.path, start, time.monotonic()))
+
+def fetch_stats(log):
+    pages = sorted((start, end) for path, start, end in log if path != "/robots.txt")
+    gaps = [b[0] - a[0] for a, b in zip(pages, pages[1:])]
+    in_flight = max(
+        (sum(1 for other_start, other_end in pages if other_start <= start < other_end) for start, _ in pages),
+        default=0,
+    )
+    return min(gaps, default=0.0), in_flight
+
+async def run_crawls(catalogue_pages, max_pages, llm_url):
+    parse.model = ChatGroq(model="mock-model", groq_api_key="test", groq_api_base=llm_url, max_retries=0)
+    try:
+        for concurrency, delay in ((1, 0.2), (2, 0.1), (4, 0.0)):
+            crawler.CRAWL_DOMAIN_CONCURRENCY, crawler.CRAWL_DOMAIN_DELAY = concurrency, delay
+            get_robots_cache().clear()
+            log = []
+            server, base_url = start_server(fixture_site(catalogue_pages), LoggingHandler, log=log)
+            usage = TokenUsage()
+            try:
+                start = time.perf_counter()
+                pages, tables = await crawl(
+                    [f"{base_url}/catalogue/page-1.html"], DESCRIPTION, link_pattern=LINK_PATTERN,
+                    max_depth=1, max_pages=max_pages, usage=usage,
+                )
+                elapsed = time.perf_counter() - start
+            finally:
+                server.shutdown()
+            statuses = Counter(page["status"] for page in pages)
+            table = ResultTable()
+            for url_table in tables:
+                if url_table is not None:
+                    table.extend(url_table)
+            table.drop_duplicate_rows(["Name"])
+            names = {row[0] for row in table.rows}
+            missing = sum(1 for i in range(catalogue_pages * PER_PAGE) if f"Product {i}" not in names)
+            fetched = Counter(path for path, _, _ in log)
+            duplicates = sum(count - 1 for path, count in fetched.items() if path != "/robots.txt")
+            min_gap, in_flight = fetch_stats(log)
+            print(
+                f"{concurrency:>11} {delay:>6.2f} {len(pages):>6} {statuses['ok']:>4} {statuses['robots_disallowed']:>7} "
+                f"{table.row_count:>5} {usage.calls:>6} {elapsed:>8.2f} {min_gap:>8.3f} {in_flight:>9} "
+                f"{duplicates:>11} {fetched['/robots.txt']:>10} {missing:>8}"
+            )
+            if fetched["/private/offers.html"]:
+                print("  robots.txt was not honoured: /private/offers.html was fetched")
+    finally:
+        await fetcher.close_client()
+
+def main():
+    catalogue_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    max_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    llm_server, llm_url, _ = start_mock_llm(latency=0.05, jitter=0.01)
+    print(
+        f"{'concurrency':>11} {'delay':>6} {'pages':>6} {'ok':>4} {'robots':>7} {'rows':>5} {'calls':>6} "
+        f"{'seconds':>8} {'min gap':>8} {'in flight':>9} {'dup fetches':>11} {'robots.txt':>10} {'missing':>8}"
+    )
+    try:
+        asyncio.run(run_crawls(catalogue_pages, max_pages, llm_url))
+    finally:
+        llm_server.shutdown()
+
+if __name__ == "__main__":
+    main()
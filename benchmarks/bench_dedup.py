@@ -0,0 +1,92 @@
+"""
+Measure chunk and row deduplication on a paginated listing.
+
+    python -m benchmarks.bench_dedup [pages]
+
+Each page of the generated listing has its own products plus the same
+"featured" carousel and category sidebar; page 1 is also served at a second
+URL (?page=1), as many sites do. The pages go through chunk_page with a shared
+ChunkDeduplicator (as the URLs of one request do), and the mock model's rows
+are merged into one table and deduplicated by the Name column.
+
+Reports the LLM calls and tokens saved (skipped counts DOM blocks in records
+mode and chunks in text mode), and checks that no product row is lost: every
+product of the listing must still be extracted from the chunks sent.
+"""
+import sys
+import time
+
+from backend.services import pipeline
+from backend.services.dedup import ChunkDeduplicator
+from backend.services.pipeline import chunk_page
+from backend.services.results import ResultTable, parse_csv_rows
+from backend.services.scrape import clean_page
+from benchmarks.mock_llm_server import csv_from_prompt
+
+DESCRIPTION = "Extract the product names and prices"
+PER_PAGE = 40
+
+FEATURED = (
+    "<section class='featured'><h2>Featured this week</h2>"
+    + "".join(
+        f"<div class='product'><h3><a href='/featured/{i}'>Featured gift box {i}</a></h3>"
+        f"<p class='price'>${20 + i}.50</p><p>Limited offer, while stocks last</p></div>"
+        for i in range(8)
+    )
+    + "</section>"
+)
+SIDEBAR = (
+    "<div class='categories'><h2>Browse by category</h2><ul>"
+    + "".join(f"<li><a href='/category/{i}'>Category {i} gifts and accessories</a></li>" for i in range(30))
+    + "</ul></div>"
+)
+
+def listing_page(page):
+    products = "".join(
+        f"<div class='product'><h3><a href='/item/{i}' title='Product {i}'>Product {i}</a></h3>"
+        f"<p class='price'>${i % 97}.99</p><p class='stock'>In stock</p></div>"
+        for i in range((page - 1) * PER_PAGE, page * PER_PAGE)
+    )
+    return (
+        "<html><head><title>Catalogue</title></head><body><main>"
+        f"{FEATURED}<section class='listing'>{products}</section>{SIDEBAR}"
+        f"<p>Page {page}</p></main></body></html>"
+    )
+
+def mock_table(chunks):
+    table = ResultTable()
+    for chunk in chunks:
+        header, rows = parse_csv_rows(csv_from_prompt(f"HTML DOM content: {chunk}\n\nFollow these instructions"))
+        table.add_rows(header, rows)
+    return table
+
+def run(pages, dedup):
+    urls = [(f"/list?page={page}", listing_page(page)) for page in range(1, pages + 1)]
+    urls.append(("/list", listing_page(1)))
+    sent, skipped, skipped_tokens = [], 0, 0
+    start = time.perf_counter()
+    for _, html in urls:
+        result = chunk_page(clean_page(html), DESCRIPTION, dedup)
+        sent.extend(result.chunks)
+        skipped += len(result.duplicates)
+        skipped_tokens += result.duplicate_tokens
+    elapsed = (time.perf_counter() - start) * 1000
+    table = mock_table(sent)
+    rows_before = table.row_count
+    removed = table.drop_duplicate_rows(["Name"])
+    names = {row[0] for row in table.rows}
+    missing = sum(1 for i in range(pages * PER_PAGE) if f"Product {i}" not in names)
+    return len(urls), len(sent), skipped, skipped_tokens, rows_before, removed, missing, elapsed
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print(f"{'mode':<8} {'dedup':<6} {'urls':>5} {'llm calls':>10} {'skipped':>8} {'tokens saved':>13} "
+          f"{'rows':>6} {'dup rows':>9} {'missing':>8} {'chunk ms':>9}")
+    for mode in ("records", "text"):
+        pipeline.CHUNK_MODE = mode
+        for label, dedup in (("off", None), ("on", ChunkDeduplicator())):
+            urls, calls, skipped, saved, rows, removed, missing, elapsed = run(pages, dedup)
+            print(f"{mode:<8} {label:<6} {urls:>5} {calls:>10} {skipped:>8} {saved:>13} {rows:>6} {removed:>9} {missing:>8} {elapsed:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Drive parse_with_groq through the shared dispatcher against the throttling mock LLM API.
+
+    python -m benchmarks.bench_dispatcher
+
+The mock allows fewer requests per minute than the dispatcher is configured for and
+fails a share of calls with 500s, so every chunk has to survive 429s (with
+Retry-After) and 5xx retries. Checks that no chunk's rows are lost.
+"""
+import asyncio
+import time
+
+from langchain_groq import ChatGroq
+
+from backend.services import llm_cache, llm_dispatcher
+from backend.services.llm_dispatcher import LLMDispatcher, TokenUsage
+from backend.services.parse import parse_with_groq
+from benchmarks.mock_llm_server import start_mock_llm
+
+CHUNKS = 40
+
+def make_chunks():
+    return [f"Product {i}\n${i}.99\nIn stock" for i in range(CHUNKS)]
+
+async def run(llm):
+    usage = TokenUsage()
+    start = time.perf_counter()
+    table = await parse_with_groq(make_chunks(), "Name and Price of each product", llm=llm, usage=usage)
+    return table, usage, time.perf_counter() - start
+
+def main():
+    server, base_url, state = start_mock_llm(latency=0.05, error_rate=0.1, request_limit=15, limit_window=5)
+    llm = ChatGroq(model="mock-model", groq_api_key="test", groq_api_base=base_url, max_retries=0)
+    llm_cache.LLM_CACHE_ENABLED = False
+    # Generous local budgets, so the mock's throttling is what the dispatcher has to handle.
+    llm_dispatcher._dispatcher = LLMDispatcher(rpm=1000, tpm=10_000_000, max_concurrency=8, backoff_base=0.2)
+    try:
+        table, usage, seconds = asyncio.run(run(llm))
+    finally:
+        server.shutdown()
+
+    print(f"chunks: {CHUNKS}, rows: {table.row_count}, seconds: {seconds:.1f}")
+    print(f"usage: {usage.as_dict()}")
+    print(f"mock server: {state.counts}")
+    print(f"dispatcher: {llm_dispatcher.get_dispatcher().stats()}")
+    assert table.row_count == CHUNKS, "rows were lost"
+
+if __name__ == "__main__":
+    main()
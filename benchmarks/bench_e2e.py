@@ -0,0 +1,240 @@
+"""
+End-to-end benchmark of /scrape_and_parse/ without live sites or Groq.
+
+    python -m benchmarks.bench_e2e [--requests 20] [--concurrency 4] [--urls-per-request 3]
+        [--latency 0.2] [--jitter 0.05] [--error-rate 0.0] [--format csv]
+        [--pages-dir benchmarks/pages] [--output results.json] [--compare baseline.json]
+
+Saved snapshots of the testing_sites pages (see record_pages), the HTML fixtures
+and a generated listing are served by a local HTTP server, and the route handler
+runs against the deterministic mock chat API (mock_llm_server) with the given
+latency and error rate. Each request gets a random mix of pages with their
+testing_sites parsing description.
+
+Reports throughput, p50/p95 request latency, per-stage wall and CPU time (from
+the request traces), process CPU time, peak RSS and LLM token counts, and saves
+them as JSON (by default benchmarks/results/e2e-<commit>.json) so runs can be
+compared between commits with --compare.
+
+The LLM, page and template caches are off unless set in the environment, so
+every request does the full work.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# The services read their settings at import.
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("GROQ_RPM", "100000")
+os.environ.setdefault("GROQ_TPM", "100000000")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+os.environ.setdefault("PAGE_CACHE_ENABLED", "0")
+os.environ.setdefault("TRACE_SLOW_SECONDS", "0")
+
+from langchain_groq import ChatGroq
+
+from backend.models import ScrapeRequest
+from backend.routers import main as main_router
+from backend.services import fetcher, parse
+from benchmarks.bench_relevance import padded_page
+from benchmarks.bench_templates import fixture
+from benchmarks.local_server import start_server
+from benchmarks.mock_llm_server import start_mock_llm
+from benchmarks.record_pages import DEFAULT_PAGES_DIR, load_pages, snapshot_name, testing_site_prompts
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+BOOKS_DESCRIPTION = next(iter(testing_site_prompts().values()), "Extract book titles and prices")
+PRODUCTS_DESCRIPTION = "Extract the product names and prices"
+# Numbers compared by --compare, and whether higher is better.
+COMPARED = {
+    "throughput_urls_per_second": True,
+    "latency_p50": False,
+    "latency_p95": False,
+    "cpu_seconds": False,
+    "peak_rss_mb": False,
+    "total_tokens": False,
+    "rows": True,
+}
+
+def benchmark_pages(pages_dir):
+    """
+    {path: (html, parsing description)} of the pages to serve.
+    """
+    pages = {
+        "/books_page1": (fixture("books_page1.html"), BOOKS_DESCRIPTION),
+        "/books_page2": (fixture("books_page2.html"), BOOKS_DESCRIPTION),
+        "/products": (padded_page(), PRODUCTS_DESCRIPTION),
+    }
+    prompts = {snapshot_name(url): description for url, description in testing_site_prompts().items()}
+    for name, html in load_pages(pages_dir).items():
+        pages[f"/{Path(name).stem}"] = (html, prompts.get(name, PRODUCTS_DESCRIPTION))
+    return pages
+
+def make_requests(pages, base_url, count, urls_per_request, output_format, seed=0):
+    """
+    Requests of urls_per_request pages sharing a description, picked at random.
+    """
+    rng = random.Random(seed)
+    by_description = {}
+    for path, (_, description) in pages.items():
+        by_description.setdefault(description, []).append(path)
+    requests = []
+    for _ in range(count):
+        description = rng.choice(sorted(by_description))
+        paths = by_description[description]
+        urls = [base_url + rng.choice(paths) for _ in range(urls_per_request)]
+        requests.append(ScrapeRequest(urls=urls, parse_description=description, output_format=output_format))
+    return requests
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+async def run_requests(requests, concurrency, llm_url):
+    parse.model = ChatGroq(model="mock-model", groq_api_key="test", groq_api_base=llm_url, max_retries=0)
+    limit = asyncio.Semaphore(concurrency)
+    latencies = []
+    stages = {}
+    totals = {"rows": 0, "errors": 0, "calls": 0, "input_tokens": 0, "output_tokens": 0, "retries": 0,
+              "failed_chunks": 0, "skipped_chunks": 0, "skipped_tokens": 0}
+
+    async def one(request):
+        async with limit:
+            start = time.perf_counter()
+            try:
+                response = await main_router.scrape_and_parse(request, trace=True)
+            except Exception:
+                totals["errors"] += 1
+                return
+            finally:
+                latencies.append(time.perf_counter() - start)
+        # Excel responses are a JSONResponse, the other formats a ScrapeResponse.
+        payload = json.loads(response.body) if hasattr(response, "body") else response.model_dump()
+        for key, value in payload["usage"].items():
+            if key in totals:
+                totals[key] += value
+        totals["rows"] += payload["trace"]["stages"].get("merge", {}).get("rows", 0)
+        for stage, summary in payload["trace"]["stages"].items():
+            merged = stages.setdefault(stage, {"count": 0, "seconds": 0.0, "cpu_seconds": 0.0})
+            merged["count"] += summary["count"]
+            merged["seconds"] += summary["seconds"]
+            merged["cpu_seconds"] += summary.get("cpu_seconds", 0.0)
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(request) for request in requests))
+        elapsed = time.perf_counter() - start
+    finally:
+        await fetcher.close_client()
+    return elapsed, latencies, stages, totals
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def print_report(result):
+    summary = result["summary"]
+    print(
+        f"{summary['requests']} requests, {summary['urls']} URLs in {summary['seconds']:.2f}s: "
+        f"{summary['throughput_urls_per_second']:.2f} URLs/s, {summary['throughput_requests_per_second']:.2f} requests/s"
+    )
+    print(f"latency p50 {summary['latency_p50']:.3f}s  p95 {summary['latency_p95']:.3f}s  max {summary['latency_max']:.3f}s")
+    print(f"cpu {summary['cpu_seconds']:.2f}s  peak rss {summary['peak_rss_mb']:.1f} MB  errors {summary['errors']}")
+    print(
+        f"llm calls {summary['calls']}  tokens {summary['input_tokens']} in / {summary['output_tokens']} out  "
+        f"retries {summary['retries']}  failed chunks {summary['failed_chunks']}  rows {summary['rows']}"
+    )
+    print(f"{'stage':<16} {'runs':>6} {'wall s':>9} {'cpu s':>9}")
+    for stage, stats in sorted(result["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        print(f"{stage:<16} {stats['count']:>6} {stats['seconds']:>9.3f} {stats['cpu_seconds']:>9.3f}")
+
+def print_comparison(result, baseline):
+    print(f"\ncompared with {baseline.get('commit', '?')}:")
+    for key, higher_is_better in COMPARED.items():
+        old, new = baseline["summary"].get(key), result["summary"].get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        better = change > 0 if higher_is_better else change < 0
+        verdict = "better" if better else ("worse" if change else "same")
+        print(f"  {key:<28} {old:>12.3f} -> {new:>12.3f} ({change:+.1%}, {verdict})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--urls-per-request", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="mock LLM latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of mock LLM calls failing with a 500")
+    parser.add_argument("--format", default="csv", choices=["csv", "json", "excel", "xml"])
+    parser.add_argument("--pages-dir", default=DEFAULT_PAGES_DIR)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    pages = benchmark_pages(args.pages_dir)
+    server, base_url = start_server({path: html for path, (html, _) in pages.items()})
+    llm_server, llm_url, llm_state = start_mock_llm(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed
+    )
+    requests = make_requests(pages, base_url, args.requests, args.urls_per_request, args.format, args.seed)
+    try:
+        cpu_start = time.process_time()
+        elapsed, latencies, stages, totals = asyncio.run(run_requests(requests, args.concurrency, llm_url))
+        cpu_seconds = time.process_time() - cpu_start
+    finally:
+        server.shutdown()
+        llm_server.shutdown()
+
+    urls = args.requests * args.urls_per_request
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "pages": sorted(pages),
+        "summary": {
+            "requests": args.requests,
+            "urls": urls,
+            "seconds": elapsed,
+            "throughput_urls_per_second": urls / elapsed if elapsed else 0.0,
+            "throughput_requests_per_second": args.requests / elapsed if elapsed else 0.0,
+            "latency_p50": statistics.median(latencies) if latencies else 0.0,
+            "latency_p95": percentile(latencies, 0.95),
+            "latency_max": max(latencies, default=0.0),
+            "cpu_seconds": cpu_seconds,
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "total_tokens": totals["input_tokens"] + totals["output_tokens"],
+            "mock_llm_responses": dict(llm_state.counts),
+            **totals,
+        },
+        "stages": stages,
+    }
+    print_report(result)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"e2e-{result['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"\nsaved {output}")
+    if args.compare:
+        print_comparison(result, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Compare per-call requests.get (the old simple_scrape) against the pooled async fetcher.
+
+    python -m benchmarks.bench_fetcher
+"""
+import asyncio
+import time
+
+import requests
+from fake_useragent import UserAgent
+
+from backend.services import fetcher
+from benchmarks.local_server import sample_page, start_server
+
+def old_fetch(url):
+    # What simple_scrape used to do: a new UserAgent() and a new connection per URL
+    headers = {"User-Agent": UserAgent().random}
+    response = requests.get(url, headers=headers, timeout=15)
+    response.raise_for_status()
+    return response.text
+
+async def new_fetch_all(urls):
+    responses = await asyncio.gather(*(fetcher.fetch(url) for url in urls))
+    return [response.text for response in responses]
+
+async def run_new(urls):
+    try:
+        return await new_fetch_all(urls)
+    finally:
+        await fetcher.close_client()
+
+def main():
+    server, base_url = start_server({"*": sample_page()})
+    fetcher.load_user_agents()
+    try:
+        print(f"{'urls':>6} {'old urls/s':>12} {'new urls/s':>12}")
+        for count in (1, 10, 100):
+            urls = [f"{base_url}/page/{i}" for i in range(count)]
+
+            start = time.perf_counter()
+            for url in urls:
+                old_fetch(url)
+            old_rate = count / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            results = asyncio.run(run_new(urls))
+            new_rate = count / (time.perf_counter() - start)
+            assert all(results)
+
+            print(f"{count:>6} {old_rate:>12.1f} {new_rate:>12.1f}")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
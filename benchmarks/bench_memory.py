@@ -0,0 +1,133 @@
+"""
+Measure the peak memory (RSS) of processing one very large page and rendering
+one very large result, with and without the memory bounds.
+
+    python -m benchmarks.bench_memory [page_mb] [rows]
+
+Each case runs in a fresh interpreter, so the kernel's peak RSS of the process
+(ru_maxrss) is the case's own. Reported: the RSS once the input is ready (the
+page served or the table built), the peak during the work, and the difference.
+
+  - page: a page_mb MB listing fetched from a local server, cleaned and chunked
+    as process_url does, with no body limit and with FETCH_MAX_BYTES=2 MB.
+  - csv / excel: a rows-row result rendered in memory as before (pandas'
+    ExcelWriter and a preview of every row for Excel), and with the bounds on
+    (write-only workbook, EXCEL_PREVIEW_ROWS preview, output spilled to a
+    temporary file and streamed into the JSON body).
+"""
+import asyncio
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("PAGE_CACHE_ENABLED", "0")
+
+CAPPED_BYTES = 2 * 1024 * 1024
+
+def rss_mb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+def peak_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+### CASES (run in the child process)
+
+def page_case(page_mb):
+    from backend.services import fetcher
+    from backend.services.pipeline import chunk_page, fetch_and_clean, fetch_static
+    from benchmarks.local_server import sample_page, start_server
+
+    items = int(page_mb * 1024 * 1024 / len(sample_page(1000)) * 1000)
+    server, base_url = start_server({"/big": sample_page(items)})
+
+    async def run():
+        try:
+            page, _ = await fetch_and_clean(f"{base_url}/big", fetched=await fetch_static(f"{base_url}/big"))
+            return len(chunk_page(page, "Extract the product names and prices").chunks)
+        finally:
+            await fetcher.close_client()
+
+    before = rss_mb()
+    start = time.perf_counter()
+    chunks = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    return before, elapsed, f"{chunks} chunks"
+
+def result_case(output_format, rows, bounded):
+    import pandas as pd
+
+    from backend.services import results
+    from backend.services.results import ResultTable, json_chunks
+
+    table = ResultTable()
+    table.add_rows(("Title", "Price", "Availability", "Rating", "URL"), [
+        (f"Book {i} & friends", f"{i % 50}.99", "In stock", str(i % 5), f"catalogue/book_{i}/index.html")
+        for i in range(rows)
+    ])
+    results.output_modules(excel=True)
+    before = rss_mb()
+    start = time.perf_counter()
+    if bounded:
+        output = table.render(output_format, spill=True)
+        size = sum(len(piece) for piece in json_chunks({"status": "success", **output}))
+    else:
+        # The unbounded path: everything in memory, then encoded into one JSON body
+        if output_format == "excel":
+            import base64
+            excel_file = io.BytesIO()
+            with pd.ExcelWriter(excel_file, engine="openpyxl") as writer:
+                table.to_dataframe().to_excel(writer, index=False)
+            output = {
+                "data": base64.b64encode(excel_file.getvalue()).decode("utf-8"),
+                "preview": table.to_dataframe().to_html(index=False, escape=False),
+            }
+            excel_file = None
+        else:
+            output = table.render(output_format, spill=False)
+        size = len(json.dumps({"status": "success", **output}))
+    elapsed = time.perf_counter() - start
+    return before, elapsed, f"{size / 1024 / 1024:.1f} MB body"
+
+def child(case, size, bounded):
+    bounded = bounded == "1"
+    if case == "page":
+        before, elapsed, detail = page_case(float(size))
+    else:
+        before, elapsed, detail = result_case(case, int(size), bounded)
+    print(json.dumps({"before": before, "peak": peak_mb(), "seconds": elapsed, "detail": detail}))
+
+### DRIVER
+
+def run_case(case, size, bounded):
+    env = dict(os.environ, FETCH_MAX_BYTES=str(CAPPED_BYTES if bounded else 0))
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_memory", "--child", case, str(size), "1" if bounded else "0"],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    if sys.argv[1:2] == ["--child"]:
+        child(*sys.argv[2:5])
+        return
+    page_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 8
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    print(f"{'case':>6} {'size':>9} {'bounded':>8} {'rss before MB':>14} {'peak MB':>8} {'peak - before':>14} {'seconds':>8}  detail")
+    for case, size, label in (("page", page_mb, f"{page_mb:g} MB"), ("csv", rows, f"{rows} rows"), ("excel", rows, f"{rows} rows")):
+        for bounded in (False, True):
+            result = run_case(case, size, bounded)
+            print(
+                f"{case:>6} {label:>9} {'yes' if bounded else 'no':>8} {result['before']:>14.1f} {result['peak']:>8.1f} "
+                f"{result['peak'] - result['before']:>14.1f} {result['seconds']:>8.2f}  {result['detail']}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Run the same URLs through the pipeline repeatedly against a local server that
+serves ETags, and count network requests and LLM calls per pass:
+
+  1. cold cache                     -> full downloads and LLM parses
+  2. within the freshness window    -> no requests at all
+  3. after the window, unchanged    -> 304s, no cleaning or LLM parse
+  4. after the window, pages edited -> full downloads and LLM parses again
+
+    python -m benchmarks.bench_page_cache
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+# Isolate the caches before the services read their settings; the LLM cache is
+# disabled so skipped parses show up as missing LLM calls.
+_tmp = tempfile.TemporaryDirectory()
+os.environ["PAGE_CACHE_PATH"] = os.path.join(_tmp.name, "pages.sqlite3")
+os.environ["LLM_CACHE_ENABLED"] = "0"
+os.environ.setdefault("GROQ_API_KEY", "test")
+# The mock model has no rate limits.
+os.environ.setdefault("GROQ_RPM", "100000")
+os.environ.setdefault("GROQ_TPM", "100000000")
+
+from langchain_groq import ChatGroq
+
+from backend.services import fetcher, parse
+from backend.services.llm_dispatcher import TokenUsage
+from backend.services.page_cache import get_page_cache
+from backend.services.pipeline import run_pipeline
+from benchmarks.local_server import ETagPageHandler, sample_page, start_server
+from benchmarks.mock_llm_server import start_mock_llm
+
+URLS = 20
+
+async def run_pass(urls, llm_url):
+    # A new client per pass: the model's HTTP connections belong to the previous event loop.
+    parse.model = ChatGroq(model="mock-model", groq_api_key="test", groq_api_base=llm_url, max_retries=0)
+    usage = TokenUsage()
+    try:
+        tables = await run_pipeline(urls, "Extract product name and price", usage=usage)
+    finally:
+        await fetcher.close_client()
+    return tables, usage
+
+def main():
+    pages = {"*": sample_page(60)}
+    hits = {"200": 0, "304": 0}
+    server, base_url = start_server(pages, handler=ETagPageHandler, hits=hits)
+    llm_server, llm_url, llm_state = start_mock_llm(latency=0.05)
+    cache = get_page_cache()
+    urls = [f"{base_url}/page/{i}" for i in range(URLS)]
+
+    passes = [
+        ("cold", lambda: None),
+        ("fresh", lambda: None),
+        ("revalidated", lambda: setattr(cache, "freshness", 0)),
+        ("changed", lambda: pages.update({"*": sample_page(61)})),
+    ]
+    try:
+        print(f"{'pass':<12} {'seconds':>8} {'200s':>6} {'304s':>6} {'llm calls':>10} {'rows':>7}")
+        for name, prepare in passes:
+            prepare()
+            before = dict(hits)
+            start = time.perf_counter()
+            tables, usage = asyncio.run(run_pass(urls, llm_url))
+            elapsed = time.perf_counter() - start
+            rows = sum(table.row_count for table in tables if table is not None)
+            print(
+                f"{name:<12} {elapsed:>8.2f} {hits['200'] - before['200']:>6} "
+                f"{hits['304'] - before['304']:>6} {usage.calls:>10} {rows:>7}"
+            )
+        print(cache.stats())
+    finally:
+        server.shutdown()
+        llm_server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measure the relevance pre-filter: chunks and tokens kept away from the LLM, and
+how many of the rows a (mock) extraction finds survive the filter.
+
+    python -m benchmarks.bench_relevance [pages_dir]
+
+Runs on a generated product page padded with the cookie banners, legal text,
+newsletter boxes and related-link blocks that the tag blacklist lets through,
+plus any recorded snapshots.
+"""
+import sys
+import time
+
+from backend.services.parse import estimate_call_tokens, token_aware_split
+from backend.services.relevance import filter_chunks
+from backend.services.scrape import clean_page
+from benchmarks.local_server import sample_page
+from benchmarks.mock_llm_server import csv_from_prompt
+from benchmarks.record_pages import DEFAULT_PAGES_DIR, load_pages
+
+DESCRIPTION = "Extract the product names and prices"
+
+COOKIE_BANNER = (
+    "<div class='consent'>"
+    + "".join(
+        f"<p>We use cookies and similar tracking technologies to improve your experience ({i}). "
+        "By clicking Accept all you consent to our use of cookies. Manage preferences in our "
+        "privacy policy and see how third-party partners use your data for advertising.</p>"
+        for i in range(12)
+    )
+    + "</div>"
+)
+LEGAL = (
+    "<div class='legal'>"
+    + "".join(
+        f"<p>Section {i}. These terms of service govern your use of the site. Copyright 2024, all rights reserved. "
+        "Subscribe to our newsletter to receive updates; you can unsubscribe at any time.</p>"
+        for i in range(30)
+    )
+    + "</div>"
+)
+RELATED = (
+    "<div class='related'><h2>Customers also read</h2>"
+    + "".join(f"<p><a href='/blog/{i}'>How to choose the right gift, part {i}</a></p>" for i in range(80))
+    + "</div>"
+)
+
+def padded_page(items=150):
+    page = sample_page(items)
+    return page.replace("<main>", "<main>" + COOKIE_BANNER).replace("</main>", RELATED + LEGAL + "</main>")
+
+def mock_rows(chunks):
+    rows = set()
+    for chunk in chunks:
+        csv_data = csv_from_prompt(f"HTML DOM content: {chunk}\n\nFollow these instructions")
+        rows.update(csv_data.splitlines()[1:])
+    return rows
+
+def measure(name, html):
+    text = clean_page(html).text
+    chunks = token_aware_split(text, 500)
+    start = time.perf_counter()
+    kept, dropped = filter_chunks(chunks, DESCRIPTION)
+    elapsed = (time.perf_counter() - start) * 1000
+    saved = sum(estimate_call_tokens(chunk, DESCRIPTION) for chunk in dropped)
+    total = sum(estimate_call_tokens(chunk, DESCRIPTION) for chunk in chunks)
+    all_rows = mock_rows(chunks)
+    kept_rows = mock_rows(kept)
+    recall = len(kept_rows & all_rows) / len(all_rows) if all_rows else 1.0
+    print(
+        f"{name[:36]:<36} {len(chunks):>6} {len(dropped):>7} {saved:>7}/{total:<7} "
+        f"{recall:>7.1%} {elapsed:>8.1f}"
+    )
+
+def main():
+    pages_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PAGES_DIR
+    print(f"{'page':<36} {'chunks':>6} {'skipped':>7} {'tokens saved':>15} {'recall':>7} {'ms':>8}")
+    measure("products + boilerplate", padded_page())
+    measure("products only", sample_page(150))
+    for name, html in load_pages(pages_dir).items():
+        measure(name, html)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Count how many pages the old rule (fewer than 100 characters of body text, or any
+fetch error) would send to Selenium, against the render classifier.
+
+    python -m benchmarks.record_pages      # once, to save the testing_sites pages
+    python -m benchmarks.bench_render_detect [pages_dir]
+
+Runs on the recorded snapshots plus a set of synthetic pages with a known answer.
+"""
+import sys
+import time
+
+import httpx
+
+from backend.services.render_detect import browser_may_help, classify_page
+from backend.services.scrape import clean_page
+from benchmarks.local_server import sample_page
+from benchmarks.record_pages import DEFAULT_PAGES_DIR, load_pages
+
+# (name, html, needs a browser)
+SYNTHETIC_PAGES = [
+    ("static listing", sample_page(50), False),
+    ("short static page", "<html><body><h1>Contact</h1><p>mail@example.com</p></body></html>", False),
+    ("empty page", "<html><body></body></html>", False),
+    ("react shell",
+     '<html><body><div id="root"></div><script src="/static/js/main.js"></script></body></html>', True),
+    ("angular shell", "<html><body><app-root></app-root><script src='main.js'></script></body></html>", True),
+    ("noscript warning",
+     "<html><body><noscript>You need to enable JavaScript to run this app.</noscript>"
+     "<div id='app'></div></body></html>", True),
+    ("inline bundle",
+     "<html><body><p>Loading</p><script>" + "var a=1;" * 200 + "</script></body></html>", True),
+    ("next.js with ssr text",
+     "<html><body><div id='__next'>" + sample_page(20) + "</div>"
+     "<script id='__NEXT_DATA__'>{}</script></body></html>", False),
+]
+
+def http_error(status):
+    request = httpx.Request("GET", "http://example.com/")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+# (name, error, worth a browser)
+FETCH_ERRORS = [
+    ("404", http_error(404), False),
+    ("410", http_error(410), False),
+    ("500", http_error(500), False),
+    ("403", http_error(403), True),
+    ("429", http_error(429), True),
+    ("dns failure", httpx.ConnectError("name resolution failed"), False),
+    ("read timeout", httpx.ReadTimeout("timed out"), True),
+]
+
+def main():
+    pages_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PAGES_DIR
+    recorded = [(name, html, None) for name, html in load_pages(pages_dir).items()]
+
+    print(f"{'page':<40} {'text':>6} {'old':>8} {'new':>8}  reason")
+    old_browser = new_browser = wrong = 0
+    start = time.perf_counter()
+    for name, html, expected in SYNTHETIC_PAGES + recorded:
+        text_length = clean_page(html).text_length
+        old = text_length < 100
+        decision = classify_page(html, text_length)
+        old_browser += old
+        new_browser += decision.needs_browser
+        if expected is not None and decision.needs_browser != expected:
+            wrong += 1
+        print(
+            f"{name[:40]:<40} {text_length:>6} {'browser' if old else 'static':>8} "
+            f"{'browser' if decision.needs_browser else 'static':>8}  {decision.reason}"
+        )
+    elapsed = time.perf_counter() - start
+
+    print()
+    print(f"{'fetch error':<40} {'old':>8} {'new':>8}")
+    for name, error, expected in FETCH_ERRORS:
+        new = browser_may_help(error)
+        old_browser += 1
+        new_browser += new
+        if new != expected:
+            wrong += 1
+        print(f"{name:<40} {'browser':>8} {'browser' if new else 'none':>8}")
+
+    total = len(SYNTHETIC_PAGES) + len(recorded) + len(FETCH_ERRORS)
+    print()
+    print(f"Selenium fallbacks: old {old_browser}/{total}, new {new_browser}/{total}; "
+          f"misclassified synthetic cases: {wrong}; classify+clean {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare the old result assembly (pd.read_csv + pd.concat per chunk, iterrows XML)
+with ResultTable at 1k, 100k and 1M rows.
+
+    python -m benchmarks.bench_results [--all]
+
+The old path is quadratic, so it only runs up to 100k rows unless --all is given.
+"""
+import io
+import sys
+import time
+import xml.etree.ElementTree as ET
+import xml.sax.saxutils as saxutils
+
+import pandas as pd
+
+from backend.services.results import ResultTable
+
+ROWS_PER_CHUNK = 25
+
+def make_chunks(rows):
+    """
+    LLM-style CSV chunks of ROWS_PER_CHUNK rows each.
+    """
+    chunks = []
+    for start in range(0, rows, ROWS_PER_CHUNK):
+        lines = ['"Title","Price","Availability","Rating","URL"']
+        for i in range(start, min(start + ROWS_PER_CHUNK, rows)):
+            lines.append(f'"Book {i} & friends","{i % 50}.99","In stock","{i % 5}","catalogue/book_{i}/index.html"')
+        chunks.append("\n".join(lines))
+    return chunks
+
+def old_assemble(chunks):
+    master_df = None
+    for csv_str in chunks:
+        df_chunk = pd.read_csv(io.StringIO(csv_str))
+        if master_df is None:
+            master_df = df_chunk
+        elif len(df_chunk.columns) == len(master_df.columns):
+            df_chunk.columns = master_df.columns
+            master_df = pd.concat([master_df, df_chunk], ignore_index=True)
+    return master_df
+
+def old_xml(master_df):
+    root = ET.Element("data")
+    for _, row in master_df.iterrows():
+        item = ET.SubElement(root, "item")
+        for key, value in row.items():
+            sanitized_key = key.replace(" ", "_").replace("(", "").replace(")", "")
+            ET.SubElement(item, sanitized_key).text = saxutils.escape(str(value))
+    return ET.tostring(root, encoding="unicode", method="xml")
+
+def new_assemble(chunks):
+    table = ResultTable()
+    for csv_str in chunks:
+        table.add_csv(csv_str)
+    table.to_dataframe()
+    return table
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    run_old_everywhere = "--all" in sys.argv
+    print(f"{'rows':>9} {'old merge':>10} {'new merge':>10} {'old xml':>9} {'new xml':>9} {'new csv':>9} {'new json':>9}")
+    for rows in (1_000, 100_000, 1_000_000):
+        chunks = make_chunks(rows)
+        table, new_merge = timed(new_assemble, chunks)
+        _, new_xml = timed(table.render, "xml")
+        _, new_csv = timed(table.render, "csv")
+        _, new_json = timed(table.render, "json")
+        if rows <= 100_000 or run_old_everywhere:
+            master_df, old_merge = timed(old_assemble, chunks)
+            _, old_xml_seconds = timed(old_xml, master_df)
+            old_merge_column, old_xml_column = f"{old_merge:>10.2f}", f"{old_xml_seconds:>9.2f}"
+        else:
+            old_merge_column, old_xml_column = f"{'skipped':>10}", f"{'skipped':>9}"
+        print(f"{rows:>9} {old_merge_column} {new_merge:>10.2f} {old_xml_column} {new_xml:>9.2f} {new_csv:>9.2f} {new_json:>9.2f}")
+
+if __name__ == "__main__":
+    main()
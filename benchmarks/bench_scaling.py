@@ -0,0 +1,111 @@
+"""
+Measure how the CPU-bound stages scale with the CPU worker pool (CPU_WORKERS).
+
+    python -m benchmarks.bench_scaling [pages] [max_workers]
+
+Large generated listings are cleaned and chunked concurrently through the
+pipeline's run_stage, as process_url does (the fetch and LLM stages are left
+out, so only CPU work is measured), first in threads (CPU_WORKERS=0), then with
+pools of 1, 2, 4... processes up to max_workers (default: the number of cores).
+A second pass merges and renders large results concurrently, as build_output does.
+
+For each setting it reports pages (or results) per second, the speedup over
+threads, and the event loop's worst lag while the work runs: in threads the
+stages hold the GIL that request handling also needs.
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+from backend.routers.main import build_output
+from backend.services import pipeline, workers
+from backend.services.pipeline import CHUNK_MAX_TOKENS, CHUNK_MODE, CHUNK_OVERLAP_TOKENS, chunk_page, run_stage, split_page
+from backend.services.results import ResultTable
+from backend.services.scrape import clean_page
+from benchmarks.local_server import sample_page
+
+DESCRIPTION = "Extract the product names and prices"
+MERGES = 8
+MERGE_URLS = 10
+MERGE_ROWS = 2000
+
+async def loop_lag(stop, lags, interval=0.005):
+    # Sleep in short steps and record how late the loop wakes up.
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+async def clean_and_chunk(html):
+    page = await run_stage("clean", clean_page, html, offload=workers.offload(len(html)))
+    content = page.html if CHUNK_MODE == "records" else page.text
+    pieces = None
+    if workers.offload(len(content)):
+        pieces = await run_stage(
+            "chunk", split_page, content, CHUNK_MODE, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, offload=True
+        )
+    page_chunks = await run_stage("chunk", chunk_page, page, DESCRIPTION, None, pieces)
+    return len(page_chunks.chunks)
+
+def result_tables():
+    tables = []
+    for url in range(MERGE_URLS):
+        table = ResultTable()
+        table.add_rows(("Name", "Price", "Stock"), [
+            (f"Product {url}-{i}", f"${i % 97}.99", "In stock") for i in range(MERGE_ROWS)
+        ])
+        tables.append(table)
+    return tables
+
+async def measure(pages, tables):
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.create_task(loop_lag(stop, lags))
+    start = time.perf_counter()
+    chunks = await asyncio.gather(*(clean_and_chunk(html) for html in pages))
+    page_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    await asyncio.gather(*(asyncio.to_thread(build_output, tables, "csv") for _ in range(MERGES)))
+    merge_seconds = time.perf_counter() - start
+    stop.set()
+    await ticker
+    return sum(chunks), page_seconds, merge_seconds, max(lags, default=0.0)
+
+def run(size, pages, tables):
+    workers.shutdown_cpu_pool()
+    workers.CPU_WORKERS = str(size)
+    limit = max(2, size)
+    pipeline.STAGE_LIMITS["clean"] = pipeline.STAGE_LIMITS["chunk"] = limit
+    pool = workers.get_cpu_pool()
+    if pool is not None:
+        # Spawn and warm every worker before timing
+        list(pool.map(clean_page, pages[:size]))
+    return asyncio.run(measure(pages, tables))
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    pages = [sample_page(400 + i) for i in range(count)]
+    tables = result_tables()
+    sizes = [0] + [size for size in (1, 2, 4, 8, 16, 32, 64) if size < max_workers] + [max_workers]
+    print(f"{os.cpu_count()} core(s), {count} pages of ~{len(pages[0]) // 1024} KB, "
+          f"{MERGES} merges of {MERGE_URLS * MERGE_ROWS} rows")
+    print(f"{'cpu workers':>11} {'chunks':>7} {'pages/s':>8} {'speedup':>8} {'merges/s':>9} {'speedup':>8} {'max loop lag ms':>16}")
+    baseline = None
+    try:
+        for size in dict.fromkeys(sizes):
+            chunks, page_seconds, merge_seconds, lag = run(size, pages, tables)
+            rates = (count / page_seconds, MERGES / merge_seconds)
+            baseline = baseline or rates
+            print(
+                f"{size or 'threads':>11} {chunks:>7} {rates[0]:>8.1f} {rates[0] / baseline[0]:>7.2f}x "
+                f"{rates[1]:>9.2f} {rates[1] / baseline[1]:>7.2f}x {lag * 1000:>16.1f}"
+            )
+    finally:
+        workers.shutdown_cpu_pool()
+
+if __name__ == "__main__":
+    main()
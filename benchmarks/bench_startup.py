@@ -0,0 +1,131 @@
+"""
+Measure the API's cold start and check it against an import-time budget.
+
+    python -m benchmarks.bench_startup [runs] [budget_seconds]
+
+Each run starts a fresh interpreter without GROQ_API_KEY, imports backend.app,
+then runs the app's lifespan (the resource registry) through a TestClient and
+times the first /status/resources request and, once the background imports are
+done, the first CSV render (with PRELOAD_OUTPUT_MODULES=0 it pays for importing
+pandas). It reports the median of each, the slowest imports (python -X
+importtime) and the startup time of each resource.
+
+The check fails (exit status 1) when the median import time is over the budget
+(default 1.5s, or IMPORT_BUDGET_SECONDS), when importing the app needs the API
+key, or when it loads a module that only some requests need (pandas, openpyxl,
+langchain, selenium...).
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules the app must not load at import: output formats, the LLM client, the browser.
+LAZY_MODULES = (
+    "pandas", "openpyxl", "langchain_groq", "langchain_core", "groq", "tiktoken",
+    "selenium", "webdriver_manager", "fake_useragent",
+)
+
+CHILD = """
+import json, os, sys, time
+start = time.perf_counter()
+import backend.app
+imported = time.perf_counter() - start
+loaded = [name for name in {lazy!r} if name in sys.modules]
+from fastapi.testclient import TestClient
+from backend.services.results import ResultTable
+start = time.perf_counter()
+with TestClient(backend.app.app) as client:
+    started = time.perf_counter() - start
+    start = time.perf_counter()
+    resources = client.get("/status/resources").json()
+    first_request = time.perf_counter() - start
+    # A first request rarely comes in the same millisecond: let the background imports finish.
+    deadline = time.monotonic() + 10
+    while resources["output_modules"]["state"] == "starting" and time.monotonic() < deadline:
+        time.sleep(0.05)
+        resources = client.get("/status/resources").json()
+    table = ResultTable()
+    table.add_rows(("Name", "Price"), [(f"Product {{i}}", f"{{i}}.99") for i in range(100)])
+    start = time.perf_counter()
+    table.render("csv")
+    first_render = time.perf_counter() - start
+print(json.dumps({{
+    "import": imported, "startup": started, "first_request": first_request,
+    "first_render": first_render, "loaded": loaded, "resources": resources,
+}}))
+"""
+
+def child_env(**extra):
+    env = {key: value for key, value in os.environ.items() if key != "GROQ_API_KEY"}
+    env.update(JOB_WORKERS="0", **extra)
+    return env
+
+def run_child(env):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD.format(lazy=LAZY_MODULES)],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def slowest_imports(count=10):
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.app"],
+        env=child_env(), capture_output=True, text=True, check=True,
+    ).stderr
+    imports = []
+    for line in stderr.splitlines():
+        fields = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or not fields[0].strip().isdigit():
+            continue
+        imports.append((int(fields[1]), fields[2].strip()))
+    return sorted(imports, reverse=True)[:count]
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else float(os.getenv("IMPORT_BUDGET_SECONDS", "1.5"))
+    failures = []
+    import_seconds, resources = 0.0, {}
+    print(f"{'preload':>8} {'import s':>9} {'startup s':>10} {'1st request ms':>15} {'1st render ms':>14}")
+    for preload in ("1", "0"):
+        try:
+            results = [run_child(child_env(PRELOAD_OUTPUT_MODULES=preload)) for _ in range(runs)]
+        except subprocess.CalledProcessError as e:
+            print(e.stderr)
+            failures.append("importing or starting the app without GROQ_API_KEY failed")
+            break
+        median = {key: statistics.median(result[key] for result in results)
+                  for key in ("import", "startup", "first_request", "first_render")}
+        print(
+            f"{preload:>8} {median['import']:>9.3f} {median['startup']:>10.3f} "
+            f"{median['first_request'] * 1000:>15.1f} {median['first_render'] * 1000:>14.1f}"
+        )
+        loaded = sorted({name for result in results for name in result["loaded"]})
+        if loaded:
+            failures.append(f"importing the app loaded {', '.join(loaded)}")
+        if preload == "1":
+            import_seconds = median["import"]
+            resources = results[-1]["resources"]
+
+    if resources:
+        print("\nresource startup (last run):")
+        for name, state in resources.items():
+            if isinstance(state, dict):
+                print(f"  {name:<16} {state['state']:<8} {state['seconds'] * 1000:>8.1f} ms  {state.get('error', '')}")
+
+    print("\nslowest imports (cumulative ms):")
+    for cumulative, name in slowest_imports():
+        print(f"  {cumulative / 1000:>8.1f}  {name}")
+
+    if import_seconds > budget:
+        failures.append(f"import took {import_seconds:.3f}s, over the {budget:.3f}s budget")
+    print()
+    for failure in dict.fromkeys(failures):
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"OK: import {import_seconds:.3f}s within the {budget:.3f}s budget, no lazy module loaded")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Learn a selector template from one LLM extraction and replay it on later pages,
+using the saved HTML fixtures in benchmarks/fixtures:
+
+  books_page1.html / .csv   the page and the rows the LLM extracted from it
+  books_page2.html / .csv   a later page of the same listing, and its expected rows
+  books_redesigned.html     the same site after a layout change (must fall back)
+
+    python -m benchmarks.bench_templates [--pipeline]
+
+--pipeline also serves the fixtures locally and runs them through the pipeline
+with a mock model, counting LLM calls per page.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from backend.services.results import parse_csv_rows
+from backend.services.scrape import clean_page
+from backend.services.selector_templates import apply_template, learn_template
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+def fixture(name):
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+def timed(func, *args, repeat=50):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args)
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+def offline():
+    page1 = clean_page(fixture("books_page1.html")).html
+    page2 = clean_page(fixture("books_page2.html")).html
+    redesigned = clean_page(fixture("books_redesigned.html")).html
+    header, rows = parse_csv_rows(fixture("books_page1.csv"))
+    _, expected2 = parse_csv_rows(fixture("books_page2.csv"))
+
+    template, learn_ms = timed(learn_template, page1, header, rows)
+    if template is None:
+        print("no template learned")
+        return
+    print(f"learned in {learn_ms:.1f} ms: records {template['record']}")
+    for column, field in zip(template["columns"], template["fields"]):
+        print(f"  {column:<14} {field}")
+
+    print(f"{'page':<18} {'ms':>6} {'rows':>5} {'matches expected':>17}")
+    for name, html, expected in (("books_page1", page1, rows), ("books_page2", page2, expected2),
+                                 ("books_redesigned", redesigned, None)):
+        table, apply_ms = timed(apply_template, html, template)
+        if table is None:
+            print(f"{name:<18} {apply_ms:>6.2f} {'-':>5} {'fallback to LLM':>17}")
+            continue
+        matches = expected is not None and table.rows == expected
+        print(f"{name:<18} {apply_ms:>6.2f} {table.row_count:>5} {str(matches):>17}")
+
+def pipeline():
+    os.environ.setdefault("GROQ_API_KEY", "test")
+    from langchain_groq import ChatGroq
+
+    from backend.services import fetcher, llm_cache, page_cache, parse, selector_templates
+    from backend.services.llm_dispatcher import TokenUsage
+    from backend.services.pipeline import process_url
+    from benchmarks.local_server import start_server
+    from benchmarks.mock_llm_server import start_mock_llm
+
+    # The services read their settings at import, so switch them here: a fresh template
+    # store, and no page or LLM cache so every LLM call shows up.
+    tmp = tempfile.TemporaryDirectory()
+    selector_templates.SELECTOR_TEMPLATES_ENABLED = True
+    selector_templates._store = selector_templates.TemplateStore(os.path.join(tmp.name, "templates.sqlite3"))
+    page_cache.PAGE_CACHE_ENABLED = False
+    llm_cache.LLM_CACHE_ENABLED = False
+
+    pages = {f"/{name}": fixture(f"{name}.html") for name in ("books_page1", "books_page2", "books_redesigned")}
+    server, base_url = start_server(pages)
+    llm_server, llm_url, _ = start_mock_llm(latency=0.3)
+
+    async def run():
+        parse.model = ChatGroq(model="mock-model", groq_api_key="test", groq_api_base=llm_url, max_retries=0)
+        try:
+            print(f"{'page':<18} {'seconds':>8} {'llm calls':>10} {'rows':>5}")
+            for index, path in enumerate(pages, start=1):
+                usage = TokenUsage()
+                start = time.perf_counter()
+                table = await process_url(index, base_url + path, "Extract book titles and prices", usage)
+                elapsed = time.perf_counter() - start
+                rows = table.row_count if table is not None else 0
+                print(f"{path[1:]:<18} {elapsed:>8.3f} {usage.calls:>10} {rows:>5}")
+        finally:
+            await fetcher.close_client()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+        llm_server.shutdown()
+        tmp.cleanup()
+
+def main():
+    offline()
+    if "--pipeline" in sys.argv:
+        print()
+        pipeline()
+
+if __name__ == "__main__":
+    main()
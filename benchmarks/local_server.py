@@ -0,0 +1,85 @@
+"""
+Local HTTP stand-in server used by the benchmarks, so nothing touches live sites.
+"""
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class PageHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive
+    protocol_version = "HTTP/1.1"
+    pages = {}
+
+    def do_GET(self):
+        body = self.pages.get(self.path.split("?")[0])
+        if body is None:
+            body = self.pages.get("*")
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class ETagPageHandler(PageHandler):
+    """
+    PageHandler that sends an ETag with every page and answers a matching
+    If-None-Match with 304. Counts full and 304 responses in `hits`.
+    """
+    hits = None
+
+    def do_GET(self):
+        body = self.pages.get(self.path.split("?")[0], self.pages.get("*"))
+        if body is None:
+            return super().do_GET()
+        etag = '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.hits["304"] += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.hits["200"] += 1
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+def start_server(pages, handler=PageHandler, **attributes):
+    """
+    Serve a {path: html} mapping (use "*" as a catch-all) on a free local port.
+    Extra keyword arguments become attributes of the handler class (e.g. hits for ETagPageHandler).
+    Returns (server, base_url); call server.shutdown() when done.
+    """
+    handler_class = type("BoundHandler", (handler,), {"pages": pages, **attributes})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+def sample_page(items=200):
+    """
+    Build a product-listing style HTML page with the given number of records.
+    """
+    cards = "\n".join(
+        f'<div class="product"><h3><a href="/item/{i}" title="Product {i}">Product {i}</a></h3>'
+        f'<p class="price">${i % 97}.99</p><p class="stock">In stock</p></div>'
+        for i in range(items)
+    )
+    return (
+        "<html><head><title>Catalogue</title><script>var x = 1;</script></head>"
+        f"<body><nav>Home | Books</nav><main>{cards}</main><footer>Footer</footer></body></html>"
+    )
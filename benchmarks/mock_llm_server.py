@@ -0,0 +1,123 @@
+"""
+Local stand-in for the Groq chat completions API, with injectable latency, errors and throttling.
+
+Point ChatGroq at it with groq_api_base=<base_url>. Responses are deterministic CSV
+built from the DOM content in the prompt: one row per line that looks like a record.
+"""
+import html
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def csv_from_prompt(prompt):
+    """
+    Deterministic 'extraction': every line containing a price becomes a Name,Price row.
+    """
+    match = re.search(r"HTML DOM content: (.*?)\n\nFollow these instructions", prompt, re.S)
+    content = match.group(1) if match else ""
+    # Chunks may be compact markup: every tag ends a line.
+    content = html.unescape(re.sub(r"<[^>]+>", "\n", content))
+    lines = [line.strip() for line in content.splitlines() if line.strip()]
+    rows = []
+    for previous, line in zip([""] + lines, lines):
+        if re.fullmatch(r"[$£€]\d+(\.\d+)?", line):
+            rows.append(f'"{previous}","{line}"')
+    if not rows:
+        return ""
+    return "\n".join(['"Name","Price"'] + rows)
+
+class MockLLMState:
+    def __init__(self, latency=0.05, jitter=0.02, error_rate=0.0, request_limit=None, limit_window=60.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # Allow at most request_limit requests per limit_window seconds, like Groq's RPM limit.
+        self.request_limit = request_limit
+        self.limit_window = limit_window
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = []
+        self.counts = {"requests": 0, "ok": 0, "throttled": 0, "errors": 0}
+
+    def decide(self):
+        """
+        Return (status code, retry-after seconds) for the next request.
+        """
+        with self.lock:
+            self.counts["requests"] += 1
+            now = time.monotonic()
+            self.window = [t for t in self.window if now - t < self.limit_window]
+            if self.request_limit is not None and len(self.window) >= self.request_limit:
+                self.counts["throttled"] += 1
+                return 429, math.ceil(self.window[0] + self.limit_window - now)
+            self.window.append(now)
+            if self.random.random() < self.error_rate:
+                self.counts["errors"] += 1
+                return 500, None
+            self.counts["ok"] += 1
+            return 200, None
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        state = self.state
+        time.sleep(max(0.0, state.latency + state.random.uniform(-state.jitter, state.jitter)))
+
+        status, retry_after = state.decide()
+        if status == 429:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                            {"retry-after": str(retry_after)})
+            return
+        if status != 200:
+            self._send_json(status, {"error": {"message": "Internal error", "type": "server_error"}})
+            return
+
+        prompt = "\n".join(message.get("content", "") for message in body.get("messages", []))
+        content = csv_from_prompt(prompt)
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        self._send_json(200, {
+            "id": "mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+def start_mock_llm(**options):
+    """
+    Start the mock API on a free local port. Returns (server, base_url, state).
+    """
+    state = MockLLMState(**options)
+    handler_class = type("BoundMockLLMHandler", (MockLLMHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}", state
@@ -0,0 +1,71 @@
+"""
+Save HTML snapshots of the URLs listed in testing_sites, for offline benchmarks.
+
+    python -m benchmarks.record_pages [output_dir]
+"""
+import re
+import sys
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_PAGES_DIR = Path(__file__).resolve().parent / "pages"
+
+def testing_site_urls():
+    """
+    The unique http(s) URLs mentioned in the testing_sites file, in order.
+    """
+    text = (ROOT / "testing_sites").read_text(encoding="utf-8")
+    urls = re.findall(r"https?://[^\s\"']+", text)
+    return list(dict.fromkeys(url.rstrip(".,)") for url in urls))
+
+def testing_site_prompts():
+    """
+    {url: parsing description} for the testing_sites entries that give a concrete URL.
+    """
+    text = (ROOT / "testing_sites").read_text(encoding="utf-8")
+    prompts = {}
+    for match in re.finditer(r"URL:\s*(\S*)[^\n]*\n.*?\"(.+?)\"", text, re.S):
+        url, description = match.groups()
+        if url.startswith("http"):
+            prompts.setdefault(url.rstrip(".,)"), description)
+    return prompts
+
+def snapshot_name(url):
+    """
+    File name used for a URL's snapshot.
+    """
+    parts = urlsplit(url)
+    name = re.sub(r"[^A-Za-z0-9]+", "_", parts.netloc + parts.path).strip("_")
+    return f"{name}.html"
+
+def load_pages(pages_dir=DEFAULT_PAGES_DIR):
+    """
+    Load saved snapshots as {file name: html}. Returns an empty dict if none were recorded.
+    """
+    pages_dir = Path(pages_dir)
+    if not pages_dir.is_dir():
+        return {}
+    return {
+        path.name: path.read_text(encoding="utf-8", errors="replace")
+        for path in sorted(pages_dir.glob("*.html"))
+    }
+
+def main():
+    pages_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PAGES_DIR
+    pages_dir.mkdir(parents=True, exist_ok=True)
+    session = requests.Session()
+    for url in testing_site_urls():
+        try:
+            response = session.get(url, timeout=30, headers={"User-Agent": "Mozilla/5.0"})
+            response.raise_for_status()
+        except Exception as e:
+            print(f"skip {url}: {e}")
+            continue
+        (pages_dir / snapshot_name(url)).write_text(response.text, encoding="utf-8")
+        print(f"saved {url} ({len(response.content)} bytes)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import os
+import re
+
+import pytest
+
+# Tests run against local servers only: keep the disk caches out of them.
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+os.environ.setdefault("PAGE_CACHE_ENABLED", "0")
+
+class FakeEncoding:
+    """
+    Offline stand-in for the tiktoken encoding (tiktoken downloads cl100k_base on
+    first use): one token per word, run of spaces or newline.
+    """
+
+    def encode_ordinary(self, text):
+        return re.findall(r"\n|\S+| +", text)
+
+    encode = encode_ordinary
+
+    def encode_ordinary_batch(self, texts):
+        return [self.encode_ordinary(text) for text in texts]
+
+@pytest.fixture(autouse=True)
+def fake_encoding(monkeypatch):
+    from backend.services import parse
+    monkeypatch.setattr(parse, "get_encoding", lambda encoding_name="cl100k_base": FakeEncoding())
@@ -0,0 +1,69 @@
+"""
+A multi-page fixture site for the crawler tests: a paginated catalogue (PER_PAGE
+products a page, a "next" pager, product links, links back to earlier pages and
+to the first page under a second URL), one detail page per product, and a
+robots.txt disallowing /private/, which every catalogue page links to.
+"""
+import time
+
+from benchmarks.local_server import PageHandler
+
+DESCRIPTION = "Extract the product names and prices"
+PER_PAGE = 20
+LINK_PATTERN = r"/(product|private)/"
+ROBOTS = "User-agent: *\nDisallow: /private/\n"
+
+def catalogue_page(page, pages):
+    products = "".join(
+        f"<article class='product'><h3><a href='/product/{i}.html'>Product {i}</a></h3>"
+        f"<p class='price'>${i % 97}.99</p></article>"
+        for i in range((page - 1) * PER_PAGE, page * PER_PAGE)
+    )
+    pager = "".join(f"<li><a href='/catalogue/page-{n}.html'>{n}</a></li>" for n in range(1, page))
+    if page < pages:
+        pager += f"<li class='next'><a href='/catalogue/page-{page + 1}.html'>next</a></li>"
+    return (
+        "<html><head><title>Catalogue</title></head><body>"
+        "<nav><a href='/catalogue/'>All products</a> <a href='/private/offers.html'>Staff offers</a>"
+        "<a href='#top'>Top</a></nav>"
+        f"<main>{products}</main><ul class='pager'>{pager}</ul></body></html>"
+    )
+
+def product_page(i):
+    return (
+        f"<html><body><h1>Product {i}</h1><p class='price'>${i % 97}.99</p>"
+        f"<p>Description of product {i}, shipped in two days.</p>"
+        f"<a href='/product/{i + 1}.html'>Related product</a> <a href='/catalogue/page-1.html'>Back</a>"
+        "</body></html>"
+    )
+
+def fixture_site(pages):
+    site = {f"/catalogue/page-{n}.html": catalogue_page(n, pages) for n in range(1, pages + 1)}
+    site["/catalogue/"] = site["/catalogue/page-1.html"]
+    site.update({f"/product/{i}.html": product_page(i) for i in range(pages * PER_PAGE)})
+    site["/private/offers.html"] = "<html><body>Staff only</body></html>"
+    site["/robots.txt"] = ROBOTS
+    return site
+
+class LoggingHandler(PageHandler):
+    """
+    PageHandler logging (path, start, end) of every request it serves.
+    """
+    log = None
+
+    def do_GET(self):
+        start = time.monotonic()
+        super().do_GET()
+        self.log.append((self.path, start, time.monotonic()))
+
+def fetch_stats(log):
+    """
+    (smallest gap between the starts of two page fetches, most page fetches in flight at once).
+    """
+    pages = sorted((start, end) for path, start, end in log if path != "/robots.txt")
+    gaps = [b[0] - a[0] for a, b in zip(pages, pages[1:])]
+    in_flight = max(
+        (sum(1 for other_start, other_end in pages if other_start <= start < other_end) for start, _ in pages),
+        default=0,
+    )
+    return min(gaps, default=0.0), in_flight
@@ -0,0 +1,26 @@
+"""
+A chat model for tests that answers without a network call.
+"""
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+
+from benchmarks.mock_llm_server import csv_from_prompt
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering with the mock API's deterministic CSV (see
+    mock_llm_server.csv_from_prompt), recording every prompt it gets.
+    """
+    model_name: str = "fake-model"
+    prompts: list = Field(default_factory=list)
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = messages[-1].content
+        self.prompts.append(prompt)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=csv_from_prompt(prompt)))])
@@ -0,0 +1,138 @@
+import asyncio
+from collections import Counter
+
+import pytest
+from langchain_groq import ChatGroq
+
+from backend.services import crawler, fetcher, llm_dispatcher, parse
+from backend.services.crawler import Frontier, crawl, extract_links, get_robots_cache
+from backend.services.llm_dispatcher import LLMDispatcher
+from benchmarks.local_server import start_server
+from benchmarks.mock_llm_server import start_mock_llm
+from tests.crawl_site import DESCRIPTION, LINK_PATTERN, PER_PAGE, LoggingHandler, fetch_stats, fixture_site
+
+# The crawled pages are chunked: use conftest's offline encoding, not a tiktoken download.
+pytestmark = pytest.mark.usefixtures("fake_encoding")
+
+### FRONTIER
+
+def test_frontier_queues_each_url_once_shallowest_first():
+    frontier = Frontier(concurrency=10, delay=0)
+    assert frontier.add("http://a/2", 1)
+    assert frontier.add("http://a/1", 0)
+    assert not frontier.add("http://a/2", 0)
+    popped = [frontier.pop(0)[0] for _ in range(2)]
+    assert popped == [("http://a/1", 0), ("http://a/2", 1)]
+    assert frontier.pop(0) == (None, None)
+
+def test_frontier_round_robins_domains_within_their_concurrency():
+    frontier = Frontier(concurrency=1, delay=0)
+    for url in ("http://a/1", "http://a/2", "http://b/1"):
+        frontier.add(url, 0)
+    first, second = frontier.pop(0)[0], frontier.pop(0)[0]
+    assert {first[0], second[0]} == {"http://a/1", "http://b/1"}
+    # Both domains have a fetch in flight: nothing more until one is released.
+    assert frontier.pop(0) == (None, None)
+    frontier.release("a")
+    assert frontier.pop(0)[0] == ("http://a/2", 0)
+
+def test_frontier_spaces_fetches_of_a_domain():
+    frontier = Frontier(concurrency=2, delay=0.5)
+    assert frontier.reserve("a", 10.0) == 0
+    assert frontier.reserve("a", 10.1) == pytest.approx(0.4)
+    frontier.set_delay("a", 2)
+    assert frontier.reserve("a", 10.1) == pytest.approx(0.9)
+    assert frontier.reserve("a", 10.1) == pytest.approx(2.9)
+    # Other domains are not held up.
+    assert frontier.reserve("b", 10.1) == 0
+
+### LINKS
+
+def test_extract_links_finds_pagination_and_pattern_links():
+    html = (
+        "<html><head><link rel='next' href='/list?page=2'></head><body>"
+        "<a href='/product/1.html#reviews'>Product 1</a><a href='/about.html'>About</a>"
+        "<a href='#top'>Top</a><a href='mailto:shop@example.com'>Mail</a>"
+        "<ul><li class='next'><a href='/list?page=2'>2</a></li></ul><a href='/list?page=3'>Next »</a>"
+        "</body></html>"
+    )
+    pagination, matched = extract_links(html, "http://Shop.example.com:80/list", r"/product/")
+    assert pagination == ["http://shop.example.com/list?page=2", "http://shop.example.com/list?page=3"]
+    assert matched == ["http://shop.example.com/product/1.html"]
+    assert extract_links(html, "http://shop.example.com/list", follow_pagination=False)[0] == []
+
+### CRAWL
+
+@pytest.fixture
+def site(monkeypatch):
+    """
+    Crawl the crawl_site fixture site against the mock chat API.
+    Returns start(catalogue_pages) -> (base_url, request log).
+    """
+    llm_server, llm_url, _ = start_mock_llm(latency=0.01, jitter=0)
+    monkeypatch.setattr(parse, "model", ChatGroq(model="mock-model", groq_api_key="test", groq_api_base=llm_url, max_retries=0))
+    monkeypatch.setattr(llm_dispatcher, "_dispatcher", LLMDispatcher(rpm=100000, tpm=100_000_000))
+    monkeypatch.setattr(crawler, "CRAWL_DOMAIN_CONCURRENCY", 4)
+    monkeypatch.setattr(crawler, "CRAWL_DOMAIN_DELAY", 0)
+    get_robots_cache().clear()
+    servers = [llm_server]
+
+    def start(catalogue_pages):
+        log = []
+        server, base_url = start_server(fixture_site(catalogue_pages), LoggingHandler, log=log)
+        servers.append(server)
+        return base_url, log
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+def run_crawl(seed, **options):
+    async def run():
+        try:
+            return await crawl([seed], DESCRIPTION, **options)
+        finally:
+            await fetcher.close_client()
+    return asyncio.run(run())
+
+def test_crawl_follows_pagination_and_links_to_max_depth(site):
+    base_url, log = site(2)
+    pages, tables = run_crawl(f"{base_url}/catalogue/page-1.html", link_pattern=LINK_PATTERN, max_depth=1)
+    paths = {page["url"][len(base_url):]: page for page in pages}
+    # Both catalogue pages at depth 0, their products one link deeper, nothing further.
+    assert paths["/catalogue/page-2.html"]["depth"] == 0
+    assert {path for path in paths if path.startswith("/product/")} == {f"/product/{i}.html" for i in range(2 * PER_PAGE)}
+    assert max(page["depth"] for page in pages) == 1
+    assert len(pages) == 2 + 2 * PER_PAGE + 1
+    names = {row[0] for table in tables if table is not None for row in table.rows}
+    assert {f"Product {i}" for i in range(2 * PER_PAGE)} <= names
+
+def test_crawl_honours_robots_txt_and_fetches_each_page_once(site):
+    base_url, log = site(2)
+    pages, _ = run_crawl(f"{base_url}/catalogue/page-1.html", link_pattern=LINK_PATTERN, max_depth=1)
+    fetched = Counter(path for path, _, _ in log)
+    assert fetched["/robots.txt"] == 1
+    assert fetched["/private/offers.html"] == 0
+    assert [page["status"] for page in pages if "/private/" in page["url"]] == ["robots_disallowed"]
+    assert max(fetched.values()) == 1
+
+def test_crawl_stops_at_max_pages(site):
+    base_url, log = site(3)
+    pages, tables = run_crawl(f"{base_url}/catalogue/page-1.html", link_pattern=LINK_PATTERN, max_depth=1, max_pages=5)
+    assert len(pages) == len(tables) == 5
+    assert sum(1 for path, _, _ in log if path != "/robots.txt") <= 5
+
+def test_crawl_without_pagination_stays_on_the_seed(site):
+    base_url, _ = site(3)
+    pages, _ = run_crawl(f"{base_url}/catalogue/page-1.html", follow_pagination=False)
+    assert [page["url"] for page in pages] == [f"{base_url}/catalogue/page-1.html"]
+
+def test_crawl_is_polite_to_a_domain(site, monkeypatch):
+    monkeypatch.setattr(crawler, "CRAWL_DOMAIN_CONCURRENCY", 1)
+    monkeypatch.setattr(crawler, "CRAWL_DOMAIN_DELAY", 0.2)
+    base_url, log = site(4)
+    pages, _ = run_crawl(f"{base_url}/catalogue/page-1.html", max_depth=0)
+    assert len(pages) == 4
+    min_gap, in_flight = fetch_stats(log)
+    assert in_flight == 1
+    assert min_gap >= 0.18
@@ -0,0 +1,66 @@
+import pytest
+
+from backend.services import pipeline
+from backend.services.dedup import ChunkDeduplicator
+from backend.services.pipeline import chunk_page
+from backend.services.scrape import clean_page
+
+# chunk_page counts tokens: use conftest's offline encoding, not a tiktoken download.
+pytestmark = pytest.mark.usefixtures("fake_encoding")
+
+DESCRIPTION = "Extract the product names and prices"
+SIZES = ["Small", "Medium", "Large", "XL", "XXL", "Mini", "Petite", "Tall", "Regular", "Slim", "Wide", "Kids"]
+# Long enough for the cards of one size to be near-duplicates of each other by SimHash.
+CARD_TEXT = (
+    "Soft organic cotton t-shirt with a relaxed fit, ribbed collar and double stitched hem for everyday wear. "
+    "Pre-shrunk fabric keeps its shape wash after wash, the tagless neck label avoids itching, and the breathable "
+    "knit stays cool in summer and layers well under a jumper in winter. Machine washable at forty degrees."
+)
+
+def listing(sizes=SIZES, extra=""):
+    cards = "".join(
+        f"<div class='card'><h3>Cotton crew neck t-shirt, {size}</h3><p class='desc'>{CARD_TEXT}</p>"
+        f"<p class='price'>$19.99</p><p class='stock'>In stock, ships in two days</p></div>"
+        for size in sizes
+    )
+    return clean_page(f"<html><body><main>{cards}</main>{extra}</body></html>")
+
+def test_near_identical_cards_of_one_page_are_all_kept():
+    page_chunks = chunk_page(listing(), DESCRIPTION, ChunkDeduplicator())
+    sent = "\n".join(page_chunks.chunks)
+    assert page_chunks.duplicates == []
+    for size in SIZES:
+        assert f"Cotton crew neck t-shirt, {size}<" in sent
+    assert sent.count("In stock, ships in two days") == len(SIZES)
+
+def test_listing_repeated_on_another_url_is_skipped():
+    dedup = ChunkDeduplicator()
+    chunk_page(listing(), DESCRIPTION, dedup)
+    page_chunks = chunk_page(listing(), DESCRIPTION, dedup)
+    assert page_chunks.chunks == []
+    assert len(page_chunks.duplicates) == len(SIZES)
+
+def test_blocks_dropped_by_the_relevance_filter_are_not_remembered(monkeypatch):
+    banner = "<div class='cookies'>" + "We use cookies to measure traffic and remember your preferences. " * 3 + "</div>"
+
+    def drop_banners(chunks, parse_description):
+        return [c for c in chunks if "cookies" not in c], [c for c in chunks if "cookies" in c]
+
+    monkeypatch.setattr(pipeline, "CHUNK_MAX_TOKENS", 100)
+    monkeypatch.setattr(pipeline, "RELEVANCE_FILTER_ENABLED", True)
+    monkeypatch.setattr(pipeline, "filter_chunks", drop_banners)
+    dedup = ChunkDeduplicator()
+    first = chunk_page(listing(SIZES[:2], banner), DESCRIPTION, dedup)
+    assert any("cookies" in chunk for chunk in first.dropped)
+
+    # The banner was never sent, so on the next URL it is not a "duplicate" of anything
+    monkeypatch.setattr(pipeline, "filter_chunks", lambda chunks, parse_description: (list(chunks), []))
+    second = chunk_page(listing(SIZES[2:4], banner), DESCRIPTION, dedup)
+    assert not any("cookies" in duplicate for duplicate in second.duplicates)
+    assert any("cookies" in chunk for chunk in second.chunks)
+
+def test_text_chunks_repeating_within_a_page_are_kept():
+    dedup = ChunkDeduplicator()
+    chunks = [CARD_TEXT, CARD_TEXT.replace("forty", "thirty")]
+    assert dedup.filter(chunks) == (chunks, [])
+    assert dedup.filter(chunks) == ([], chunks)
@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+import pytest
+from langchain_groq import ChatGroq
+
+from backend.services import llm_dispatcher, parse
+from backend.services.llm_dispatcher import LLMDispatcher, TokenUsage
+from backend.services.parse import estimate_call_tokens, parse_with_groq
+from benchmarks.mock_llm_server import start_mock_llm
+
+DESCRIPTION = "Name and Price of each product"
+
+def make_chunks(count):
+    return [f"Product {i}\n${i}.99\nIn stock" for i in range(count)]
+
+@pytest.fixture
+def mock_llm():
+    servers = []
+
+    def start(**options):
+        server, base_url, state = start_mock_llm(**options)
+        servers.append(server)
+        llm = ChatGroq(model="mock-model", groq_api_key="test", groq_api_base=base_url, max_retries=0)
+        return llm, state
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+@pytest.fixture
+def dispatcher(monkeypatch):
+    def install(**options):
+        options = {"rpm": 1000, "tpm": 10_000_000, "max_concurrency": 8, "backoff_base": 0.05, **options}
+        monkeypatch.setattr(llm_dispatcher, "_dispatcher", LLMDispatcher(**options))
+        return llm_dispatcher._dispatcher
+    return install
+
+def parse_chunks(llm, chunks):
+    usage = TokenUsage()
+
+    async def run():
+        start = time.monotonic()
+        table = await parse_with_groq(chunks, DESCRIPTION, llm=llm, usage=usage)
+        return table, time.monotonic() - start
+
+    table, seconds = asyncio.run(run())
+    return table, usage, seconds
+
+def test_server_errors_are_retried(mock_llm, dispatcher):
+    llm, state = mock_llm(latency=0.01, jitter=0, error_rate=0.3)
+    dispatcher()
+    table, usage, _ = parse_chunks(llm, make_chunks(20))
+    assert table.row_count == 20
+    assert state.counts["errors"] > 0
+    assert usage.retries == state.counts["errors"]
+    assert usage.calls == 20 and usage.failed_chunks == 0
+
+def test_failures_past_the_retries_fail_the_chunk(mock_llm, dispatcher):
+    llm, state = mock_llm(latency=0.01, jitter=0, error_rate=1.0)
+    dispatcher(max_retries=2)
+    table, usage, _ = parse_chunks(llm, make_chunks(3))
+    assert table.row_count == 0 and table.failed_chunks == 3
+    assert state.counts["requests"] == 9
+    assert llm_dispatcher.get_dispatcher().stats()["failures"] == 3
+
+def test_throttling_honours_retry_after_and_halves_concurrency(mock_llm, dispatcher):
+    llm, state = mock_llm(latency=0.01, jitter=0, request_limit=4, limit_window=1)
+    shared = dispatcher()
+    table, usage, seconds = parse_chunks(llm, make_chunks(6))
+    assert table.row_count == 6
+    assert state.counts["throttled"] > 0
+    assert usage.retries == state.counts["throttled"]
+    # Retry-After is a whole second: the retries waited for the server's window.
+    assert seconds >= 1
+    assert shared.stats()["throttled"] == state.counts["throttled"]
+    assert shared.concurrency < 8
+
+def test_rpm_budget_keeps_calls_under_the_server_limit(mock_llm, dispatcher, monkeypatch):
+    monkeypatch.setattr(llm_dispatcher, "WINDOW_SECONDS", 0.5)
+    # The server counts a call when it arrives, a little after the dispatcher does.
+    llm, state = mock_llm(latency=0.01, jitter=0, request_limit=3, limit_window=0.4)
+    dispatcher(rpm=3)
+    table, usage, seconds = parse_chunks(llm, make_chunks(7))
+    assert table.row_count == 7
+    assert state.counts["throttled"] == 0 and usage.retries == 0
+    # 7 calls at 3 per window need three windows.
+    assert seconds >= 1
+
+def test_tpm_budget_spaces_out_large_calls(mock_llm, dispatcher, monkeypatch):
+    monkeypatch.setattr(llm_dispatcher, "WINDOW_SECONDS", 0.3)
+    llm, state = mock_llm(latency=0.01, jitter=0)
+    # Every call is over the budget on its own, so each one gets a window to itself.
+    dispatcher(tpm=1)
+    table, _, seconds = parse_chunks(llm, make_chunks(4))
+    assert table.row_count == 4
+    assert seconds >= 0.9
+
+def test_concurrency_shrinks_when_latency_rises(mock_llm, dispatcher):
+    llm, state = mock_llm(latency=0.02, jitter=0)
+    shared = dispatcher(max_concurrency=4)
+    parse_chunks(llm, make_chunks(8))
+    assert shared.concurrency == 4
+    state.latency = 0.3
+    table, _, _ = parse_chunks(llm, make_chunks(8))
+    assert table.row_count == 8
+    assert shared.concurrency < 4
+
+def test_stats_leave_the_window_alone():
+    shared = LLMDispatcher()
+    shared._window.extend([[time.monotonic() - 120, 50], [time.monotonic(), 30]])
+    shared._window_tokens = 80
+    stats = shared.stats()
+    assert stats["window_requests"] == 1 and stats["window_tokens"] == 30
+    assert len(shared._window) == 2 and shared._window_tokens == 80
+
+def test_estimate_falls_back_to_characters_without_the_encoding(monkeypatch):
+    def unavailable(encoding_name="cl100k_base"):
+        raise OSError("no network")
+
+    monkeypatch.setattr(parse, "get_encoding", unavailable)
+    monkeypatch.setattr(parse, "_encoding_failed_at", float("-inf"))
+    chunk = "Product 1\n$1.99\n" * 50
+    prompt = parse.get_prompt().format(dom_content=chunk, parse_description=DESCRIPTION)
+    expected = len(prompt) // parse.CHARS_PER_TOKEN + parse.LLM_OUTPUT_TOKENS_ESTIMATE
+    assert estimate_call_tokens(chunk, DESCRIPTION) == expected
+    # The failure is remembered, so later chunks don't try to load the encoding again.
+    monkeypatch.setattr(parse, "get_encoding", lambda encoding_name="cl100k_base": pytest.fail("retried"))
+    assert estimate_call_tokens(chunk, DESCRIPTION) == expected
@@ -0,0 +1,74 @@
+import pytest
+from selenium.common.exceptions import InvalidSessionIdException, TimeoutException, WebDriverException
+
+from backend.services.driver_pool import DriverPool
+
+class FakeDriver:
+    def __init__(self):
+        self.urls = []
+        self.quit_called = False
+
+    def get(self, url):
+        self.urls.append(url)
+
+    def delete_all_cookies(self):
+        pass
+
+    def execute_script(self, script):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+@pytest.fixture
+def pool():
+    drivers = []
+
+    def factory():
+        drivers.append(FakeDriver())
+        return drivers[-1]
+
+    pool = DriverPool(size=1, max_pages=10, lease_timeout=1, driver_factory=factory)
+    pool.drivers = drivers
+    return pool
+
+def fail_lease(pool, error):
+    with pytest.raises(type(error)):
+        with pool.lease():
+            raise error
+
+@pytest.mark.parametrize("error", [
+    TimeoutException("page load timed out"),
+    WebDriverException("unknown error: net::ERR_NAME_NOT_RESOLVED"),
+    ValueError("bad page"),
+])
+def test_page_errors_reset_and_reuse_the_driver(pool, error):
+    fail_lease(pool, error)
+    with pool.lease() as driver:
+        pass
+    assert pool.drivers == [driver]
+    assert not driver.quit_called and driver.urls == ["about:blank", "about:blank"]
+    stats = pool.stats()
+    assert stats["crashed"] == 0 and stats["page_errors"] == 1 and stats["created"] == 1
+
+@pytest.mark.parametrize("error", [
+    InvalidSessionIdException("invalid session id"),
+    WebDriverException("chrome not reachable"),
+    ConnectionRefusedError("chromedriver is gone"),
+])
+def test_lost_sessions_discard_the_driver(pool, error):
+    fail_lease(pool, error)
+    with pool.lease() as driver:
+        pass
+    assert len(pool.drivers) == 2 and pool.drivers[0].quit_called
+    assert driver is pool.drivers[1]
+    stats = pool.stats()
+    assert stats["crashed"] == 1 and stats["page_errors"] == 0 and stats["created"] == 2
+
+def test_drivers_are_recycled_after_max_pages(pool):
+    pool.max_pages = 2
+    for _ in range(3):
+        with pool.lease():
+            pass
+    assert len(pool.drivers) == 2 and pool.drivers[0].quit_called
+    assert pool.stats()["recycled"] == 1
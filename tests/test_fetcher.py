@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from backend.services import fetcher, pipeline
+from backend.services.pipeline import PageUnavailable, fetch_and_clean, fetch_static, process_url
+from backend.services.render_detect import browser_may_help
+from benchmarks.local_server import PageHandler, start_server
+
+PAGE = "<html><body>" + "<p>Product é, $9.99</p>" * 2000 + "</body></html>"
+
+class StatusHandler(PageHandler):
+    """
+    PageHandler answering /forbidden with 403, /busy with 429 and /slow after a second,
+    logging (path, client port) of every request.
+    """
+    log = None
+
+    def do_GET(self):
+        self.log.append((self.path, self.client_address[1]))
+        status = {"/forbidden": 403, "/busy": 429}.get(self.path)
+        if self.path == "/slow":
+            time.sleep(1)
+        if status is None:
+            return super().do_GET()
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+@pytest.fixture
+def site():
+    log = []
+    server, base_url = start_server({"/page": PAGE, "/slow": PAGE}, StatusHandler, log=log)
+    yield base_url, log
+    server.shutdown()
+
+def run(coro):
+    async def with_client():
+        try:
+            return await coro
+        finally:
+            await fetcher.close_client()
+    return asyncio.run(with_client())
+
+def test_body_is_decoded_whole_under_the_cap(site):
+    base_url, _ = site
+    response = run(fetcher.fetch(f"{base_url}/page"))
+    assert response.status_code == 200
+    assert response.text == PAGE
+    assert not response.truncated
+
+def test_body_is_cut_at_the_cap(site):
+    base_url, _ = site
+    response = run(fetcher.fetch(f"{base_url}/page", max_bytes=1000))
+    assert response.truncated
+    assert len(response.text.encode("utf-8")) <= 1000
+    assert PAGE.startswith(response.text[:-1])
+
+@pytest.mark.parametrize("path", ["/forbidden", "/busy"])
+def test_bot_walls_are_left_to_the_browser(site, path):
+    base_url, _ = site
+    assert run(fetch_static(f"{base_url}{path}")) is None
+
+def test_timeouts_are_left_to_the_browser(site, monkeypatch):
+    base_url, _ = site
+    monkeypatch.setattr(fetcher, "FETCH_TIMEOUT", 0.2)
+    assert run(fetch_static(f"{base_url}/slow")) is None
+
+def test_missing_pages_fail_for_good(site):
+    base_url, _ = site
+    with pytest.raises(PageUnavailable) as error:
+        run(fetch_static(f"{base_url}/missing"))
+    assert error.value.status == 404
+
+def test_blocked_page_is_fetched_once_then_rendered(site, monkeypatch):
+    base_url, log = site
+    rendered = []
+    monkeypatch.setattr(pipeline, "selenium_scrape", lambda url: rendered.append(url))
+    events = []
+    assert run(process_url(1, f"{base_url}/forbidden", "product names", on_event=events.append)) is None
+    assert [path for path, _ in log] == ["/forbidden"]
+    assert rendered == [f"{base_url}/forbidden"]
+    assert events[-1]["status"] == "fetch_failed"
+
+def test_render_does_not_hold_a_fetch_slot(site, monkeypatch):
+    base_url, _ = site
+    monkeypatch.setitem(pipeline.STAGE_LIMITS, "fetch", 1)
+    rendering, release = threading.Event(), threading.Event()
+
+    def slow_render(url):
+        rendering.set()
+        release.wait(5)
+
+    monkeypatch.setattr(pipeline, "selenium_scrape", slow_render)
+
+    async def render_and_fetch():
+        render = asyncio.create_task(fetch_and_clean(f"{base_url}/forbidden", fetched=None))
+        await asyncio.to_thread(rendering.wait, 5)
+        try:
+            return await asyncio.wait_for(fetch_static(f"{base_url}/page"), 3)
+        finally:
+            release.set()
+            await render
+
+    assert run(render_and_fetch()).html == PAGE
+
+def test_connections_are_reused(site):
+    base_url, log = site
+
+    async def fetch_all():
+        for _ in range(5):
+            await fetcher.fetch(f"{base_url}/page")
+
+    run(fetch_all())
+    assert len(log) == 5
+    assert len({port for _, port in log}) == 1
+
+def test_http_errors_keep_their_response(site):
+    base_url, _ = site
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        run(fetcher.fetch(f"{base_url}/missing"))
+    assert error.value.response.status_code == 404
+
+@pytest.mark.parametrize("error, expected", [
+    (httpx.ReadTimeout("read timed out"), True),
+    (httpx.ConnectTimeout("connect timed out"), True),
+    (httpx.RemoteProtocolError("server disconnected"), True),
+    (httpx.ConnectError("connection refused"), False),
+    (httpx.InvalidURL("bad url"), False),
+    (httpx.UnsupportedProtocol("ftp://"), False),
+    (httpx.TooManyRedirects("redirect loop"), False),
+    (httpx.DecodingError("bad gzip"), False),
+    (UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte"), False),
+])
+def test_only_blocks_and_timeouts_are_left_to_the_browser(error, expected):
+    assert browser_may_help(error) is expected
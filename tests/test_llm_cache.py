@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.services import llm_dispatcher, parse
+from backend.services.llm_cache import LLMCache
+from backend.services.llm_dispatcher import LLMDispatcher, TokenUsage
+from backend.services.parse import parse_with_groq
+from tests.fake_llm import FakeChatModel
+
+DESCRIPTION = "Name and Price of each product"
+
+pytestmark = pytest.mark.usefixtures("fake_encoding")
+
+@pytest.fixture(autouse=True)
+def dispatcher(monkeypatch):
+    monkeypatch.setattr(llm_dispatcher, "_dispatcher", LLMDispatcher(rpm=100000, tpm=100_000_000))
+
+@pytest.fixture
+def make_cache(tmp_path):
+    caches = []
+
+    def make(**options):
+        options = {"memory_entries": 0, **options}
+        caches.append(LLMCache(path=str(tmp_path / "llm.sqlite3"), **options))
+        return caches[-1]
+
+    yield make
+    for cache in caches:
+        cache.close()
+
+def make_chunks(start, count):
+    return [f"Product {i}\n${i}.99\nIn stock" for i in range(start, start + count)]
+
+def parse_chunks(llm, chunks, cache):
+    usage = TokenUsage()
+    table = asyncio.run(parse_with_groq(chunks, DESCRIPTION, llm=llm, usage=usage, cache=cache))
+    return table, usage
+
+def test_miss_calls_the_llm_and_a_hit_skips_it(make_cache):
+    cache, llm = make_cache(), FakeChatModel()
+    first, usage = parse_chunks(llm, make_chunks(0, 3), cache)
+    assert len(llm.prompts) == 3 and usage.calls == 3 and usage.cache_hits == 0
+    second, usage = parse_chunks(llm, make_chunks(0, 3), cache)
+    assert len(llm.prompts) == 3 and usage.calls == 0 and usage.cache_hits == 3
+    assert second.rows == first.rows and first.row_count == 3
+    stats = cache.stats()
+    assert stats["misses"] == 3 and stats["stores"] == 3 and stats["disk_hits"] == 3
+
+def test_memory_tier_answers_repeated_chunks(make_cache):
+    cache, llm = make_cache(memory_entries=10), FakeChatModel()
+    parse_chunks(llm, make_chunks(0, 3), cache)
+    parse_chunks(llm, make_chunks(0, 3), cache)
+    assert len(llm.prompts) == 3
+    assert cache.stats()["memory_hits"] == 3
+
+def test_expired_entries_are_parsed_again(make_cache):
+    cache, llm = make_cache(ttl=0.2, memory_entries=10), FakeChatModel()
+    parse_chunks(llm, make_chunks(0, 2), cache)
+    time.sleep(0.3)
+    _, usage = parse_chunks(llm, make_chunks(0, 2), cache)
+    assert usage.calls == 2 and usage.cache_hits == 0
+    assert cache.stats()["expired"] == 2
+
+def test_least_recently_used_entries_are_evicted_at_the_size_limit(make_cache):
+    cache, llm = make_cache(max_entries=10), FakeChatModel()
+    # Eviction runs every 100 stores; batches in order, so the last batch is the most recently used.
+    for start in range(0, 100, 10):
+        parse_chunks(llm, make_chunks(start, 10), cache)
+    stats = cache.stats()
+    assert stats["disk_entries"] == 10 and stats["evictions"] == 90
+    _, usage = parse_chunks(llm, make_chunks(90, 10), cache)
+    assert usage.cache_hits == 10 and usage.calls == 0
+    _, usage = parse_chunks(llm, make_chunks(0, 10), cache)
+    assert usage.cache_hits == 0 and usage.calls == 10
+
+def test_key_changes_with_the_prompt_version_and_the_model(make_cache, monkeypatch):
+    cache = make_cache()
+    parse_chunks(FakeChatModel(), make_chunks(0, 2), cache)
+
+    _, usage = parse_chunks(FakeChatModel(model_name="other-model"), make_chunks(0, 2), cache)
+    assert usage.calls == 2 and usage.cache_hits == 0
+
+    monkeypatch.setattr(parse, "PROMPT_VERSION", "2")
+    _, usage = parse_chunks(FakeChatModel(), make_chunks(0, 2), cache)
+    assert usage.calls == 2 and usage.cache_hits == 0
+
+    # Whitespace-only changes to a chunk keep its key.
+    _, usage = parse_chunks(FakeChatModel(), [chunk.replace("\n", "\n   ") for chunk in make_chunks(0, 2)], cache)
+    assert usage.calls == 0 and usage.cache_hits == 2
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from langchain_groq import ChatGroq
+
+from backend.services import fetcher, llm_dispatcher, parse, pipeline
+from backend.services.llm_dispatcher import LLMDispatcher
+from backend.services.page_cache import PageCache
+from backend.services.pipeline import process_url
+from benchmarks.local_server import ETagPageHandler, PageHandler, sample_page, start_server
+from benchmarks.mock_llm_server import start_mock_llm
+
+DESCRIPTION = "Extract product name and price"
+
+# The pages are chunked: use conftest's offline encoding, not a tiktoken download.
+pytestmark = pytest.mark.usefixtures("fake_encoding")
+
+class LoggingETagHandler(ETagPageHandler):
+    """
+    ETagPageHandler logging the If-None-Match header of every request.
+    """
+    log = None
+
+    def do_GET(self):
+        self.log.append(self.headers.get("If-None-Match"))
+        super().do_GET()
+
+class LoggingHandler(PageHandler):
+    """
+    PageHandler (no ETags) logging every request.
+    """
+    log = None
+
+    def do_GET(self):
+        self.log.append(self.headers.get("If-None-Match"))
+        super().do_GET()
+
+@pytest.fixture
+def page_cache(tmp_path, monkeypatch):
+    cache = PageCache(path=str(tmp_path / "pages.sqlite3"), freshness=0)
+    monkeypatch.setattr(pipeline, "get_page_cache", lambda: cache)
+    return cache
+
+@pytest.fixture
+def llm(monkeypatch):
+    """
+    Point the pipeline at the mock chat API; returns its request counts.
+    """
+    server, base_url, state = start_mock_llm(latency=0.01, jitter=0)
+    monkeypatch.setattr(parse, "model", ChatGroq(model="mock-model", groq_api_key="test", groq_api_base=base_url, max_retries=0))
+    monkeypatch.setattr(llm_dispatcher, "_dispatcher", LLMDispatcher(rpm=100000, tpm=100_000_000))
+    yield state.counts
+    server.shutdown()
+
+def serve(pages, handler=LoggingETagHandler):
+    log, hits = [], {"200": 0, "304": 0}
+    server, base_url = start_server(pages, handler, log=log, hits=hits)
+    return server, f"{base_url}/catalogue", log, hits
+
+def process(url):
+    async def run():
+        try:
+            return await process_url(1, url, DESCRIPTION)
+        finally:
+            await fetcher.close_client()
+    return asyncio.run(run())
+
+def test_fresh_fetch_then_304_revalidation_skips_the_parse(page_cache, llm):
+    server, url, log, hits = serve({"*": sample_page(30)})
+    try:
+        first = process(url)
+        calls = llm["requests"]
+        assert first.row_count == 30 and calls > 0
+        assert log == [None] and hits == {"200": 1, "304": 0}
+
+        second = process(url)
+    finally:
+        server.shutdown()
+    # The revalidation sent the stored ETag and got a 304: the stored rows were reused.
+    assert log[1] is not None and hits == {"200": 1, "304": 1}
+    assert llm["requests"] == calls
+    assert second.rows == first.rows
+    stats = page_cache.stats()
+    assert stats["misses"] == 1 and stats["not_modified"] == 1 and stats["result_hits"] == 1
+
+def test_unchanged_body_without_etag_short_circuits_on_its_hash(page_cache, llm):
+    server, url, log, _ = serve({"*": sample_page(30)}, LoggingHandler)
+    try:
+        first = process(url)
+        calls = llm["requests"]
+        second = process(url)
+    finally:
+        server.shutdown()
+    # Both requests downloaded the page in full, but its hash matched: no second parse.
+    assert log == [None, None]
+    assert llm["requests"] == calls
+    assert second.rows == first.rows
+    assert page_cache.stats()["unchanged"] == 1
+
+def test_changed_body_is_parsed_again(page_cache, llm):
+    pages = {"*": sample_page(30)}
+    server, url, log, hits = serve(pages)
+    try:
+        process(url)
+        calls = llm["requests"]
+        pages["*"] = sample_page(31)
+        table = process(url)
+    finally:
+        server.shutdown()
+    assert log[1] is not None and hits == {"200": 2, "304": 0}
+    assert llm["requests"] > calls
+    assert table.row_count == 31
+    assert page_cache.stats()["changed"] == 1
+
+def test_fresh_pages_are_not_requested_again(page_cache, llm):
+    page_cache.freshness = 300
+    server, url, log, _ = serve({"*": sample_page(30)})
+    try:
+        first = process(url)
+        second = process(url)
+    finally:
+        server.shutdown()
+    assert len(log) == 1
+    assert second.rows == first.rows
+    assert page_cache.stats()["fresh_hits"] == 1
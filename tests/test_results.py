@@ -0,0 +1,63 @@
+import base64
+import io
+
+import openpyxl
+import pytest
+
+from backend.services import results
+from backend.services.results import ResultTable, SpilledOutput
+
+def make_table():
+    table = ResultTable()
+    table.add_rows(("Name", "Price", "Qty", "Note"), [
+        (f"P/{i} <&>", f"{i}.5" if i % 3 else str(i), str(i), None if i % 4 else 'x"y') for i in range(23)
+    ])
+    # A column only the last rows have, and an integer column with a missing value
+    table.add_rows(("Name", "Qty", "Extra"), [("Late", None, "1")])
+    return table
+
+def data(output):
+    value = output["data"]
+    return value.read() if isinstance(value, SpilledOutput) else value
+
+def sheet_rows(encoded):
+    workbook = openpyxl.load_workbook(io.BytesIO(base64.b64decode(encoded)))
+    return [tuple(cell.value for cell in row) for row in workbook.active.iter_rows()]
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(results, "WRITE_BATCH_ROWS", 5)
+
+@pytest.mark.parametrize("output_format", ["csv", "json", "xml"])
+def test_batched_output_matches_the_whole_dataframe(small_batches, output_format):
+    table = make_table()
+    frame = table.to_dataframe()
+    expected = {
+        "csv": lambda: frame.to_csv(index=False),
+        "json": lambda: frame.to_json(orient="records", indent=4),
+        "xml": lambda: None,
+    }[output_format]()
+    for spill in (False, True):
+        rendered = data(table.render(output_format, spill=spill))
+        if expected is not None:
+            assert rendered == expected
+        assert rendered == data(make_table().render(output_format, spill=not spill))
+
+def test_excel_cells_keep_the_whole_column_types(small_batches):
+    table = make_table()
+    rows = sheet_rows(data(table.render("excel", spill=True)))
+    assert rows[0] == ("Name", "Price", "Qty", "Note", "Extra")
+    # Qty has a missing value, so the whole column is float, as in to_dataframe()
+    assert rows[2] == ("P/1 <&>", 1.5, 1, None, None)
+    assert rows[-1] == ("Late", None, None, None, 1)
+    assert rows == sheet_rows(data(make_table().render("excel", spill=False)))
+
+@pytest.mark.parametrize("output_format", ["csv", "json", "xml", "excel"])
+def test_spilled_render_never_builds_the_whole_dataframe(small_batches, monkeypatch, output_format):
+    table = make_table()
+    monkeypatch.setattr(results, "EXCEL_PREVIEW_ROWS", 3)
+    monkeypatch.setattr(ResultTable, "to_dataframe", lambda self: pytest.fail("whole DataFrame built"))
+    output = table.render(output_format, spill=True)
+    assert isinstance(output["data"], SpilledOutput) and output["data"].size > 0
+    if output_format == "excel":
+        assert output["preview"].count("<tr>") == 3
@@ -0,0 +1,75 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from backend.services import fetcher, llm_dispatcher, parse, pipeline
+from backend.services.llm_dispatcher import LLMDispatcher, TokenUsage
+from backend.services.pipeline import process_url
+from backend.services.results import parse_csv_rows
+from backend.services.scrape import clean_page
+from backend.services.selector_templates import TemplateStore, apply_template, learn_template
+from benchmarks.local_server import start_server
+from tests.fake_llm import FakeChatModel
+
+# Saved pages of one listing (see benchmarks/bench_templates.py) and the rows the LLM extracted.
+FIXTURES = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures"
+DESCRIPTION = "Extract book titles and prices"
+
+def fixture(name):
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+def cleaned(name):
+    return clean_page(fixture(f"{name}.html")).html
+
+@pytest.fixture
+def template():
+    header, rows = parse_csv_rows(fixture("books_page1.csv"))
+    learned = learn_template(cleaned("books_page1"), header, rows)
+    assert learned is not None
+    return learned
+
+def test_template_reproduces_the_page_it_was_learned_from(template):
+    header, rows = parse_csv_rows(fixture("books_page1.csv"))
+    table = apply_template(cleaned("books_page1"), template)
+    assert tuple(table.columns) == tuple(header)
+    assert table.rows == rows
+
+def test_template_extracts_a_later_page_of_the_listing(template):
+    header, expected = parse_csv_rows(fixture("books_page2.csv"))
+    table = apply_template(cleaned("books_page2"), template)
+    assert tuple(table.columns) == tuple(header)
+    assert table.rows == expected
+
+def test_redesigned_page_is_left_to_the_llm(template):
+    assert apply_template(cleaned("books_redesigned"), template) is None
+
+@pytest.mark.usefixtures("fake_encoding")
+def test_pipeline_uses_the_template_and_falls_back_to_the_llm(template, tmp_path, monkeypatch):
+    pages = {f"/{name}": fixture(f"{name}.html") for name in ("books_page2", "books_redesigned")}
+    server, base_url = start_server(pages)
+    store = TemplateStore(str(tmp_path / "templates.sqlite3"))
+    store.put(base_url, DESCRIPTION, template)
+    llm = FakeChatModel()
+    monkeypatch.setattr(pipeline, "get_template_store", lambda: store)
+    monkeypatch.setattr(parse, "model", llm)
+    monkeypatch.setattr(llm_dispatcher, "_dispatcher", LLMDispatcher(rpm=100000, tpm=100_000_000))
+
+    async def run(path):
+        usage = TokenUsage()
+        try:
+            table = await process_url(1, base_url + path, DESCRIPTION, usage)
+        finally:
+            await fetcher.close_client()
+        return table, usage
+
+    try:
+        table, usage = asyncio.run(run("/books_page2"))
+        assert usage.calls == 0 and not llm.prompts
+        assert table.rows == parse_csv_rows(fixture("books_page2.csv"))[1]
+        assert next(iter(store.stats().values()))["hits"] == 1
+
+        _, usage = asyncio.run(run("/books_redesigned"))
+        assert usage.calls > 0 and llm.prompts
+    finally:
+        server.shutdown()
@@ -0,0 +1,33 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.bench_startup import LAZY_MODULES, child_env
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "1.5"))
+
+# Only the modules the import itself loads count, not any preloaded by the interpreter's site hooks.
+CHILD = """
+import json, sys, time
+preloaded = set(sys.modules)
+start = time.perf_counter()
+import backend.app
+imported = time.perf_counter() - start
+loaded = sorted(name.split(".")[0] for name in set(sys.modules) - preloaded)
+print(json.dumps({"import": imported, "loaded": loaded}))
+"""
+
+def import_app():
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=child_env(), capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def test_app_imports_within_budget_without_lazy_modules():
+    runs = [import_app() for _ in range(3)]
+    loaded = {name for run in runs for name in run["loaded"]}
+    assert sorted(loaded & set(LAZY_MODULES)) == []
+    assert statistics.median(run["import"] for run in runs) <= BUDGET_SECONDS
@@ -0,0 +1,16 @@
+import pytest
+
+from backend.services import workers
+
+@pytest.mark.parametrize("cpu_workers, web_workers, expected", [
+    ("auto", 1, 8),
+    ("auto", 4, 2),
+    ("auto", 16, 1),
+    ("3", 4, 3),
+    ("0", 1, 0),
+])
+def test_cpu_pool_size_shares_the_cores_between_web_workers(monkeypatch, cpu_workers, web_workers, expected):
+    monkeypatch.setattr(workers, "CPU_WORKERS", cpu_workers)
+    monkeypatch.setattr(workers, "WEB_WORKERS", web_workers)
+    monkeypatch.setattr(workers.os, "cpu_count", lambda: 8)
+    assert workers.cpu_pool_size() == expected